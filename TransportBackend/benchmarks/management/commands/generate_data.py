@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.synthetic import EMAIL_DOMAIN, PASSWORD, Generator, bench_users, flush
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible synthetic data set (users, vehicles, communities, trips, bookings, ratings)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--communities', type=int, default=50)
+        parser.add_argument('--trips', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rating-ratio', type=float, default=0.7,
+                            help="Share of finished bookings rated by each side")
+        parser.add_argument('--recurring-ratio', type=float, default=0.05,
+                            help="Share of upcoming trips that are recurring")
+        parser.add_argument('--flush', action='store_true',
+                            help="Delete the previously generated data first")
+        parser.add_argument('--flush-only', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['flush'] or options['flush_only']:
+            deleted, _ = flush()
+            self.stdout.write(f"Deleted {deleted} rows of generated data")
+            if options['flush_only']:
+                return
+        if bench_users().exists():
+            raise CommandError("Generated data already exists, use --flush to replace it")
+        if options['users'] < 2 or options['communities'] < 1:
+            raise CommandError("At least 2 users and 1 community are needed")
+
+        started = time.monotonic()
+        counts = Generator(
+            users=options['users'], communities=options['communities'], trips=options['trips'],
+            seed=options['seed'], batch_size=options['batch_size'],
+            rating_ratio=options['rating_ratio'], recurring_ratio=options['recurring_ratio'],
+            log=lambda message: self.stdout.write(f"  {message}"),
+        ).run()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{count} {name}" for name, count in counts.items()) + f" in {elapsed:.1f}s"
+        ))
+        self.stdout.write(f"Users log in as bench-<n>@{EMAIL_DOMAIN} / {PASSWORD}")
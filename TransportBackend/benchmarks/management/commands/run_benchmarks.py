@@ -0,0 +1,91 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from benchmarks.runner import Runner, compare, metadata
+from benchmarks.scenarios import BenchmarkError, Fixtures, Scenario, build_scenarios, covered_url_names
+from benchmarks.synthetic import data_counts
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API endpoint on the generated data set (latency, queries, peak memory)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', action='append', default=[],
+                            help="Scenario or URL name to run (repeatable)")
+        parser.add_argument('--deep-pages', type=int, default=50,
+                            help="Pages followed through `next` links for the deep pagination scenarios")
+        parser.add_argument('--no-cache', action='store_true',
+                            help="Disable the listing and rating stats caches")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+        parser.add_argument('--compare', help="Previous JSON results to check for regressions")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative p95 increase reported as a regression")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="Smaller p95 increases are treated as noise")
+
+    def handle(self, *args, **options):
+        # The test client's 'testserver' host and in-memory email backend
+        setup_test_environment()
+        try:
+            overrides = {'LISTING_CACHE_TIMEOUT': 0, 'RATING_STATS_CACHE_TIMEOUT': 0} if options['no_cache'] else {}
+            with override_settings(**overrides):
+                results = self.run(options)
+        except BenchmarkError as exc:
+            raise CommandError(exc)
+        finally:
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare(
+                results['results'], baseline, options['threshold'], options['min_delta_ms']
+            )
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(f"  {regression}"))
+                raise CommandError(
+                    f"{len(regressions)} regressions against {baseline['meta'].get('commit') or options['compare']}"
+                )
+            self.stdout.write(self.style.SUCCESS("No regression"))
+
+    def run(self, options):
+        fixtures = Fixtures()
+        runner = Runner(iterations=options['iterations'], warmup=options['warmup'])
+        deep_trips = runner.follow_next(
+            Scenario('trip-list', 'trip-list', '/api/trips/', user=fixtures.passenger), options['deep_pages']
+        )
+        scenarios = build_scenarios(fixtures, deep_trips, '/api/communities/?page=last')
+
+        missing = covered_url_names() - {scenario.url_name for scenario in scenarios}
+        if missing:
+            raise BenchmarkError(f"No benchmark scenario for: {', '.join(sorted(missing))}")
+        if options['only']:
+            scenarios = [s for s in scenarios if s.name in options['only'] or s.url_name in options['only']]
+
+        self.stdout.write(
+            f"{'scenario':<26} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'peak KiB':>9} "
+            f"{'ser. ms':>8} {'resp KiB':>9}"
+        )
+        results = []
+        for scenario in scenarios:
+            result = runner.run(scenario)
+            results.append(result)
+            queries = str(result['queries'])
+            if result['queries_min'] != result['queries']:
+                queries = f"{result['queries_min']}-{queries}"
+            self.stdout.write(
+                f"{scenario.name:<26} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                f"{queries:>8} {result['peak_memory_kb']:>9.0f} "
+                f"{result['serialize_p50_ms']:>8.1f} {result['response_bytes'] / 1024:>9.1f}"
+            )
+        return {'meta': metadata(data_counts(), options), 'results': results}
@@ -0,0 +1,140 @@
+import json
+import math
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.utils import timezone
+
+from transport_app import shared_cache
+from users.tokens import UserRefreshToken
+from .scenarios import BenchmarkError
+
+
+class Runner:
+    def __init__(self, iterations=20, warmup=2):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.client = Client()
+        self.tokens = {}
+
+    def request(self, scenario, path=None):
+        headers = {}
+        if scenario.user is not None:
+            if scenario.user.pk not in self.tokens:
+                self.tokens[scenario.user.pk] = str(UserRefreshToken.for_user(scenario.user).access_token)
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {self.tokens[scenario.user.pk]}'
+        method = getattr(self.client, scenario.method)
+        path = path or scenario.path
+        if scenario.data is None:
+            return method(path, **headers)
+        return method(path, data=json.dumps(scenario.data), content_type='application/json', **headers)
+
+    def call(self, scenario):
+        if not scenario.write:
+            return self._checked(scenario, self.request(scenario))
+        with transaction.atomic():
+            response = self._checked(scenario, self.request(scenario))
+            transaction.set_rollback(True)
+        return response
+
+    def _checked(self, scenario, response):
+        if response.status_code not in scenario.statuses:
+            raise BenchmarkError(
+                f"{scenario.name}: {scenario.method.upper()} {scenario.path} returned "
+                f"{response.status_code}: {response.content[:300]!r}"
+            )
+        if not hasattr(response.wsgi_request, 'request_stats'):
+            raise BenchmarkError("InstrumentationMiddleware must be enabled to count queries")
+        return response
+
+    def run(self, scenario):
+        for _ in range(self.warmup):
+            self.call(scenario)
+        latencies, queries, sql_ms, serialize_ms = [], [], [], []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            response = self.call(scenario)
+            latencies.append((time.perf_counter() - started) * 1000)
+            stats = response.wsgi_request.request_stats
+            queries.append(stats.query_count)
+            sql_ms.append(stats.query_ms)
+            # The 'serialize' entry of the Server-Timing header
+            serialize_ms.append(stats.serialize_ms)
+
+        # Separate pass: tracing allocations slows every request down
+        tracemalloc.start()
+        try:
+            self.call(scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+        return {
+            'name': scenario.name,
+            'url_name': scenario.url_name,
+            'method': scenario.method.upper(),
+            'path': scenario.path,
+            'iterations': self.iterations,
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[math.ceil(len(latencies) * 0.95) - 1], 3),
+            'max_ms': round(latencies[-1], 3),
+            # Cache hits make later iterations cheaper: the worst case is what regresses
+            'queries': max(queries),
+            'queries_min': min(queries),
+            'sql_p50_ms': round(statistics.median(sql_ms), 3),
+            'serialize_p50_ms': round(statistics.median(serialize_ms), 3),
+            'response_bytes': len(response.content),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def follow_next(self, scenario, pages):
+        # Path of the page reached by following `next` links, for deep pagination
+        path = scenario.path
+        for _ in range(pages):
+            next_url = self._checked(scenario, self.request(scenario, path)).json().get('next')
+            if not next_url:
+                break
+            path = next_url.split('testserver', 1)[-1]
+        return path
+
+
+def metadata(data_counts, options):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'async_read_views': settings.ASYNC_READ_VIEWS,
+        'listing_cache': not options['no_cache'] and shared_cache.is_shared(),
+        'iterations': options['iterations'],
+        'data': data_counts,
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    # Regressions of the current run against a previous JSON result: slower p95
+    # beyond the relative threshold (and the noise floor), or more queries
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{result['name']}: {before['queries']} -> {result['queries']} queries")
+        delta = result['p95_ms'] - before['p95_ms']
+        if delta > min_delta_ms and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{result['name']}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+    return regressions
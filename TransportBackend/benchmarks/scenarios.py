@@ -0,0 +1,212 @@
+from datetime import timedelta
+
+from django.db.models import Count, Exists, OuterRef
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from communities.models import Community
+from ratings.models import Rating
+from trips.models import Booking, Trip
+from users.models import Vehicle
+from users.tokens import UserRefreshToken
+from .synthetic import EMAIL_DOMAIN, PASSWORD, bench_users
+
+# URL configurations whose every named route must have a scenario
+COVERED_PREFIXES = ('api/auth/', 'api/communities/', 'api/trips/', 'api/ratings/')
+# Long-lived Server-Sent Events stream, not a request/response endpoint
+UNCOVERED_URL_NAMES = {'trip-events'}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Scenario:
+    def __init__(self, name, url_name, path, method='get', user=None, data=None, write=False,
+                 statuses=(200,)):
+        self.name = name
+        self.url_name = url_name
+        self.path = path
+        self.method = method
+        self.user = user
+        self.data = data
+        # Writes run in a transaction rolled back after each request, so every
+        # iteration sees the same data
+        self.write = write
+        self.statuses = statuses
+
+
+def covered_url_names():
+    names = set()
+    for entry in get_resolver().url_patterns:
+        if isinstance(entry, URLResolver) and str(entry.pattern) in COVERED_PREFIXES:
+            names.update(pattern.name for pattern in entry.url_patterns
+                         if isinstance(pattern, URLPattern) and pattern.name)
+    return names - UNCOVERED_URL_NAMES
+
+
+def _first(queryset, description):
+    instance = queryset.first()
+    if instance is None:
+        raise BenchmarkError(f"No {description} in the generated data, run generate_data first")
+    return instance
+
+
+class Fixtures:
+    # Rows of the generated data set the scenarios act on, picked the same way on every run
+    def __init__(self):
+        users = bench_users()
+        now = timezone.now()
+        self.passenger = _first(
+            users.annotate(total=Count('bookings')).order_by('-total', 'pk'), "passenger with bookings"
+        )
+        self.driver = _first(
+            users.filter(vehicles__isnull=False).annotate(total=Count('driven_trips')).order_by('-total', 'pk'),
+            "driver"
+        )
+        self.vehicle = _first(Vehicle.objects.filter(owner=self.driver).order_by('pk'), "vehicle")
+        self.community = _first(
+            Community.objects.filter(membership__user=self.driver).order_by('-member_count', 'pk'),
+            "community of the driver"
+        )
+        self.other_community = _first(
+            Community.objects.filter(is_private=False, creator__in=users)
+            .exclude(membership__user=self.passenger).order_by('pk'),
+            "community to join"
+        )
+        self.member_community = _first(
+            Community.objects.filter(membership__user=self.passenger, membership__role='member').order_by('pk'),
+            "community to leave"
+        )
+        self.trip = _first(
+            Trip.objects.filter(community=self.community).order_by('-booked_seats', 'pk'), "trip"
+        )
+        self.bookable_trip = _first(
+            Trip.objects.available().filter(
+                status='planned', departure_time__gt=now,
+                community__membership__user=self.passenger,
+            ).exclude(driver=self.passenger).exclude(bookings__passenger=self.passenger).order_by('pk'),
+            "trip the passenger can book"
+        )
+        self.pending_booking = _first(
+            Booking.objects.filter(status='pending', trip__departure_time__gt=now, passenger__in=users)
+            .select_related('trip').order_by('pk'),
+            "pending booking"
+        )
+        rated = Rating.objects.filter(
+            trip=OuterRef('trip'), rater=OuterRef('passenger'), rated_user=OuterRef('trip__driver')
+        )
+        self.unrated_booking = _first(
+            Booking.objects.filter(status='completed', trip__status='completed', passenger__in=users)
+            .exclude(Exists(rated)).select_related('trip').order_by('pk'),
+            "unrated finished booking"
+        )
+        self.rated_user_ids = list(
+            users.filter(rating_stats__isnull=False).order_by('pk').values_list('pk', flat=True)[:20]
+        )
+        self.refresh_token = str(UserRefreshToken.for_user(self.passenger))
+
+
+def trip_payload(fixtures, departure):
+    return {
+        'community_id': fixtures.community.pk, 'vehicle_id': fixtures.vehicle.pk,
+        'departure_location': 'Paris', 'departure_latitude': '48.856600', 'departure_longitude': '2.352200',
+        'arrival_location': 'Lyon', 'arrival_latitude': '45.764000', 'arrival_longitude': '4.835700',
+        'departure_time': departure.isoformat(),
+        'estimated_arrival_time': (departure + timedelta(hours=4)).isoformat(),
+        'available_seats': 3, 'price_per_seat': '20.00',
+    }
+
+
+def build_scenarios(fixtures, deep_trip_path, deep_community_path):
+    f = fixtures
+    departure = timezone.now().replace(second=0, microsecond=0) + timedelta(days=45, minutes=7)
+    search = (
+        f'origin_lat={f.trip.departure_latitude}&origin_lng={f.trip.departure_longitude}&origin_radius=20'
+        f'&destination_lat={f.trip.arrival_latitude}&destination_lng={f.trip.arrival_longitude}'
+        f'&destination_radius=20'
+    )
+    booking = f.pending_booking
+    finished = f.unrated_booking
+    return [
+        # users/urls.py
+        Scenario('register', 'register', '/api/auth/register/', 'post', data={
+            'email': f'bench-new@{EMAIL_DOMAIN}', 'username': 'bench-new', 'first_name': 'Nouveau',
+            'last_name': 'Membre', 'password': 'Bench-password-42', 'password_confirm': 'Bench-password-42',
+        }, write=True, statuses=(201,)),
+        Scenario('login', 'login', '/api/auth/login/', 'post',
+                 data={'email': f.passenger.email, 'password': PASSWORD}),
+        Scenario('user-detail', 'user_detail', '/api/auth/user/', user=f.passenger),
+        Scenario('token-refresh', 'token_refresh', '/api/auth/token/refresh/', 'post',
+                 data={'refresh': f.refresh_token}),
+        Scenario('profile', 'profile', '/api/auth/profile/', user=f.passenger),
+        Scenario('profile:update', 'profile', '/api/auth/profile/', 'patch', user=f.passenger,
+                 data={'bio': 'Benchmark'}, write=True),
+        Scenario('vehicle-list', 'vehicle-list', '/api/auth/vehicles/', user=f.driver),
+        Scenario('vehicle-list:create', 'vehicle-list', '/api/auth/vehicles/', 'post', user=f.driver, data={
+            'brand': 'Renault', 'model': 'Zoe', 'year': 2022, 'color': 'blanc', 'license_plate': 'BN-NEW',
+        }, write=True, statuses=(201,)),
+        Scenario('vehicle-detail', 'vehicle-detail', f'/api/auth/vehicles/{f.vehicle.pk}/', user=f.driver),
+
+        # trips/urls.py
+        Scenario('trip-list', 'trip-list', '/api/trips/', user=f.passenger),
+        Scenario('trip-list:community', 'trip-list', f'/api/trips/?community={f.community.pk}',
+                 user=f.passenger),
+        Scenario('trip-list:deep', 'trip-list', deep_trip_path, user=f.passenger),
+        Scenario('trip-list:create', 'trip-list', '/api/trips/', 'post', user=f.driver,
+                 data=trip_payload(f, departure), write=True, statuses=(201,)),
+        Scenario('trip-search', 'trip-search', f'/api/trips/search/?{search}', user=f.passenger),
+        Scenario('trip-bulk-create', 'trip-bulk-create', '/api/trips/bulk/', 'post', user=f.driver,
+                 data=[trip_payload(f, departure + timedelta(days=day)) for day in range(20)],
+                 write=True, statuses=(201,)),
+        Scenario('trip-detail', 'trip-detail', f'/api/trips/{f.trip.pk}/', user=f.passenger),
+        Scenario('book-trip', 'book-trip', f'/api/trips/{f.bookable_trip.pk}/book/', 'post',
+                 user=f.passenger, data={'seats_booked': 1}, write=True, statuses=(201,)),
+        Scenario('confirm-booking', 'confirm-booking', f'/api/trips/bookings/{booking.pk}/confirm/', 'post',
+                 user=booking.trip.driver, write=True),
+        Scenario('cancel-booking', 'cancel-booking', f'/api/trips/bookings/{booking.pk}/cancel/', 'post',
+                 user=booking.passenger, write=True),
+        Scenario('my-trips', 'my-trips', '/api/trips/my-trips/', user=f.passenger),
+        Scenario('my-trips:driver', 'my-trips', '/api/trips/my-trips/?type=driver', user=f.driver),
+        Scenario('trip-bookings', 'trip-bookings', f'/api/trips/{f.trip.pk}/bookings/', user=f.trip.driver),
+        # Compact trip summaries (default) vs full trips: response size and serialize time
+        Scenario('trip-bookings:expand', 'trip-bookings', f'/api/trips/{f.trip.pk}/bookings/?expand=trip',
+                 user=f.trip.driver),
+
+        # communities/urls.py
+        Scenario('community-list', 'community-list', '/api/communities/', user=f.passenger),
+        Scenario('community-list:search', 'community-list', '/api/communities/?search=covoiturage',
+                 user=f.passenger),
+        Scenario('community-list:deep', 'community-list', deep_community_path, user=f.passenger),
+        Scenario('community-list:create', 'community-list', '/api/communities/', 'post', user=f.driver, data={
+            'name': 'Benchmark', 'description': 'Communauté de test', 'community_type': 'other',
+            'location': 'Paris',
+        }, write=True, statuses=(201,)),
+        Scenario('community-detail', 'community-detail', f'/api/communities/{f.community.pk}/',
+                 user=f.passenger),
+        Scenario('join-community', 'join-community', f'/api/communities/{f.other_community.pk}/join/', 'post',
+                 user=f.passenger, write=True, statuses=(201,)),
+        Scenario('leave-community', 'leave-community', f'/api/communities/{f.member_community.pk}/leave/',
+                 'post', user=f.passenger, write=True, statuses=(204,)),
+        Scenario('community-members', 'community-members', f'/api/communities/{f.community.pk}/members/',
+                 user=f.passenger),
+        Scenario('community-stats', 'community-stats', f'/api/communities/{f.community.pk}/stats/',
+                 user=f.driver),
+        Scenario('community-trends', 'community-trends',
+                 f'/api/communities/{f.community.pk}/stats/trends/?days=90', user=f.driver),
+
+        # ratings/urls.py
+        Scenario('rate-user', 'rate-user',
+                 f'/api/ratings/trip/{finished.trip_id}/user/{finished.trip.driver_id}/', 'post',
+                 user=finished.passenger, data={'score': 5, 'comment': 'Parfait'}, write=True,
+                 statuses=(201,)),
+        Scenario('user-ratings', 'user-ratings', f'/api/ratings/user/{f.driver.pk}/', user=f.passenger),
+        Scenario('user-ratings:expand', 'user-ratings', f'/api/ratings/user/{f.driver.pk}/?expand=trip',
+                 user=f.passenger),
+        Scenario('user-rating-stats', 'user-rating-stats', f'/api/ratings/user/{f.driver.pk}/stats/',
+                 user=f.passenger),
+        Scenario('user-rating-stats-batch', 'user-rating-stats-batch',
+                 '/api/ratings/stats/?users=' + ','.join(map(str, f.rated_user_ids)), user=f.passenger),
+        Scenario('my-ratings', 'my-ratings', '/api/ratings/my-ratings/', user=f.driver),
+        Scenario('my-ratings:expand', 'my-ratings', '/api/ratings/my-ratings/?expand=trip', user=f.driver),
+    ]
@@ -0,0 +1,280 @@
+import json
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from communities.models import Community, Membership
+from communities.rollups import rollup_daily_stats
+from ratings.models import Rating
+from trips.models import Booking, Trip
+from trips.recurrence import materialize_recurring_trips
+from users.models import User, Vehicle
+
+# Every generated user has an address on this domain; deleting them removes
+# the whole data set through the cascades
+EMAIL_DOMAIN = 'bench.example.com'
+PASSWORD = 'bench-password'
+
+CITIES = (
+    ('Paris', 48.8566, 2.3522), ('Lyon', 45.7640, 4.8357), ('Marseille', 43.2965, 5.3698),
+    ('Toulouse', 43.6047, 1.4442), ('Nice', 43.7102, 7.2620), ('Nantes', 47.2184, -1.5536),
+    ('Strasbourg', 48.5734, 7.7521), ('Montpellier', 43.6108, 3.8767), ('Bordeaux', 44.8378, -0.5792),
+    ('Lille', 50.6292, 3.0573), ('Rennes', 48.1173, -1.6778), ('Grenoble', 45.1885, 5.7245),
+    ('Dijon', 47.3220, 5.0415), ('Angers', 47.4784, -0.5632), ('Tours', 47.3941, 0.6848),
+    ('Orléans', 47.9030, 1.9093), ('Rouen', 49.4432, 1.0999), ('Reims', 49.2583, 4.0317),
+)
+BRANDS = (('Peugeot', '208'), ('Renault', 'Clio'), ('Citroën', 'C3'), ('Dacia', 'Sandero'),
+          ('Toyota', 'Yaris'), ('Volkswagen', 'Golf'), ('Tesla', 'Model 3'))
+COLORS = ('blanc', 'noir', 'gris', 'bleu', 'rouge')
+COMMUNITY_NAMES = ('Covoiturage', 'Trajets', 'Navette', 'Partage de route', 'Voisins')
+COMMENTS = ('', '', 'Très ponctuel', 'Conduite agréable', 'Sympathique', 'Un peu en retard')
+
+
+def bench_users():
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+def flush():
+    # Trips, bookings, ratings and memberships go with their users
+    return bench_users().delete()
+
+
+def data_counts():
+    users = bench_users()
+    return {
+        'users': users.count(),
+        'vehicles': Vehicle.objects.filter(owner__in=users).count(),
+        'communities': Community.objects.filter(creator__in=users).count(),
+        'memberships': Membership.objects.filter(user__in=users).count(),
+        'trips': Trip.objects.filter(driver__in=users).count(),
+        'bookings': Booking.objects.filter(passenger__in=users).count(),
+        'ratings': Rating.objects.filter(rater__in=users).count(),
+    }
+
+
+def _jitter(rng, value):
+    return Decimal(str(round(value + rng.uniform(-0.05, 0.05), 6)))
+
+
+def _distance_km(origin, destination):
+    lat1, lng1, lat2, lng2 = map(math.radians, (origin[1], origin[2], destination[1], destination[2]))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+class Generator:
+    # Builds a reproducible data set: the same seed and scale always give the
+    # same rows (relative to the current date), so benchmark runs compare.
+    def __init__(self, users=1000, communities=50, trips=5000, seed=42, batch_size=1000,
+                 rating_ratio=0.7, recurring_ratio=0.05, log=print):
+        self.rng = random.Random(seed)
+        self.scale = {'users': users, 'communities': communities, 'trips': trips}
+        self.batch_size = batch_size
+        self.rating_ratio = rating_ratio
+        self.recurring_ratio = recurring_ratio
+        self.log = log
+        # Minute precision keeps departures stable within a run and unique per driver
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def run(self):
+        with transaction.atomic():
+            users = self.create_users()
+            drivers = self.create_vehicles(users)
+            communities = self.create_communities(drivers)
+            members = self.create_memberships(users, communities)
+            trips = self.create_trips(communities, members, drivers)
+            self.create_bookings(trips, members)
+            self.create_ratings()
+        # Derived data, as the workers and maintenance commands would compute it
+        self.finish(communities)
+        return data_counts()
+
+    def create_users(self):
+        password = make_password(PASSWORD)
+        weights = (('passenger', 5), ('driver', 3), ('both', 2))
+        types = [user_type for user_type, weight in weights for _ in range(weight)]
+        User.objects.bulk_create([
+            User(
+                email=f'bench-{i}@{EMAIL_DOMAIN}', username=f'bench-{i}', password=password,
+                first_name=f'Prénom{i}', last_name=f'Nom{i}', user_type=self.rng.choice(types),
+                is_verified=self.rng.random() < 0.6,
+            )
+            for i in range(self.scale['users'])
+        ], batch_size=self.batch_size)
+        users = list(bench_users().order_by('pk').values_list('pk', 'user_type'))
+        self.log(f"{len(users)} users")
+        return users
+
+    def create_vehicles(self, users):
+        driver_ids = [pk for pk, user_type in users if user_type in ('driver', 'both')]
+        vehicles = []
+        for driver_id in driver_ids:
+            brand, model = self.rng.choice(BRANDS)
+            vehicles.append(Vehicle(
+                owner_id=driver_id, brand=brand, model=model, year=self.rng.randint(2008, 2024),
+                color=self.rng.choice(COLORS), license_plate=f'BN-{driver_id:07d}',
+                seats=self.rng.choice((4, 4, 5, 7)),
+            ))
+        Vehicle.objects.bulk_create(vehicles, batch_size=self.batch_size)
+        drivers = {
+            owner_id: (vehicle_id, seats)
+            for vehicle_id, owner_id, seats in Vehicle.objects.filter(owner_id__in=driver_ids)
+            .values_list('pk', 'owner_id', 'seats')
+        }
+        self.log(f"{len(drivers)} vehicles")
+        return drivers
+
+    def create_communities(self, drivers):
+        creators = sorted(drivers)
+        communities = []
+        for i in range(self.scale['communities']):
+            city = self.rng.choice(CITIES)[0]
+            community_type = self.rng.choice(Community.COMMUNITY_TYPES)[0]
+            community = Community(
+                name=f'{self.rng.choice(COMMUNITY_NAMES)} {city} {i}',
+                description=f'Communauté de covoiturage {community_type} autour de {city}',
+                community_type=community_type, location=city, creator_id=self.rng.choice(creators),
+                is_private=self.rng.random() < 0.1, max_members=100000,
+            )
+            # bulk_create skips save(), which builds the search document
+            community.search_document = community.build_search_document()
+            communities.append(community)
+        Community.objects.bulk_create(communities, batch_size=self.batch_size)
+        communities = list(
+            Community.objects.filter(creator__in=bench_users()).order_by('pk').values_list('pk', 'creator_id')
+        )
+        self.log(f"{len(communities)} communities")
+        return communities
+
+    def create_memberships(self, users, communities):
+        # Community sizes follow a long tail: a few large ones, many small ones
+        community_ids = [pk for pk, _ in communities]
+        weights = [1 / (rank + 1) for rank in range(len(community_ids))]
+        members = {pk: {creator_id: 'admin'} for pk, creator_id in communities}
+        for user_id, _ in users:
+            for community_id in set(self.rng.choices(community_ids, weights, k=self.rng.randint(1, 4))):
+                members[community_id].setdefault(user_id, 'member')
+        rows = [
+            Membership(user_id=user_id, community_id=community_id, role=role)
+            for community_id, community_members in members.items()
+            for user_id, role in community_members.items()
+        ]
+        Membership.objects.bulk_create(rows, batch_size=self.batch_size)
+        self.log(f"{len(rows)} memberships")
+        return members
+
+    def create_trips(self, communities, members, drivers):
+        community_drivers = {
+            community_id: [user_id for user_id in community_members if user_id in drivers]
+            for community_id, community_members in members.items()
+        }
+        community_ids = [pk for pk, _ in communities if community_drivers[pk]]
+        weights = [len(members[pk]) for pk in community_ids]
+        trips = []
+        departures = set()
+        for _ in range(self.scale['trips']):
+            community_id = self.rng.choices(community_ids, weights)[0]
+            driver_id = self.rng.choice(community_drivers[community_id])
+            vehicle_id, seats = drivers[driver_id]
+            # Two months of history and one month ahead, on 5 minute slots
+            departure = self.now + timedelta(minutes=5 * self.rng.randint(-60 * 288, 30 * 288))
+            if (driver_id, departure) in departures:
+                continue
+            departures.add((driver_id, departure))
+            origin, destination = self.rng.sample(CITIES, 2)
+            duration = timedelta(minutes=int(_distance_km(origin, destination) / 80 * 60) + 15)
+            recurring = departure > self.now and self.rng.random() < self.recurring_ratio
+            trips.append(Trip(
+                driver_id=driver_id, community_id=community_id, vehicle_id=vehicle_id,
+                departure_location=origin[0], arrival_location=destination[0],
+                departure_latitude=_jitter(self.rng, origin[1]), departure_longitude=_jitter(self.rng, origin[2]),
+                arrival_latitude=_jitter(self.rng, destination[1]),
+                arrival_longitude=_jitter(self.rng, destination[2]),
+                departure_time=departure, estimated_arrival_time=departure + duration,
+                available_seats=self.rng.randint(1, min(seats - 1, 8)),
+                price_per_seat=Decimal(self.rng.randint(5, 60)),
+                recurring=recurring,
+                recurring_days=json.dumps(sorted(self.rng.sample(range(5), 3))) if recurring else '',
+                status=self.trip_status(departure, departure + duration),
+            ))
+        Trip.objects.bulk_create(trips, batch_size=self.batch_size)
+        trips = list(
+            Trip.objects.filter(driver__in=bench_users()).order_by('pk')
+            .values_list('pk', 'community_id', 'driver_id', 'available_seats', 'status')
+        )
+        self.log(f"{len(trips)} trips")
+        return trips
+
+    def trip_status(self, departure, arrival):
+        if self.rng.random() < 0.05:
+            return 'cancelled'
+        if arrival <= self.now:
+            return 'completed'
+        return 'active' if departure <= self.now else 'planned'
+
+    def create_bookings(self, trips, members):
+        community_members = {pk: list(users) for pk, users in members.items()}
+        bookings = []
+        for trip_id, community_id, driver_id, available_seats, trip_status in trips:
+            candidates = [user_id for user_id in community_members[community_id] if user_id != driver_id]
+            count = min(self.rng.randint(0, available_seats), len(candidates))
+            seats_left = available_seats
+            for passenger_id in self.rng.sample(candidates, count):
+                seats = self.rng.randint(1, min(2, seats_left))
+                seats_left -= seats
+                bookings.append(Booking(
+                    trip_id=trip_id, passenger_id=passenger_id, seats_booked=seats,
+                    status=self.booking_status(trip_status),
+                ))
+                if not seats_left:
+                    break
+        Booking.objects.bulk_create(bookings, batch_size=self.batch_size)
+        self.log(f"{len(bookings)} bookings")
+
+    def booking_status(self, trip_status):
+        if trip_status == 'cancelled' or self.rng.random() < 0.08:
+            return 'cancelled'
+        if trip_status == 'completed':
+            return 'completed'
+        return 'confirmed' if trip_status == 'active' or self.rng.random() < 0.6 else 'pending'
+
+    def create_ratings(self):
+        # Part of the finished bookings are left unrated, so rating endpoints have work to do
+        ratings = []
+        completed = (
+            Booking.objects.filter(passenger__in=bench_users(), status='completed')
+            .order_by('pk').values_list('trip_id', 'passenger_id', 'trip__driver_id')
+        )
+        for trip_id, passenger_id, driver_id in completed.iterator(chunk_size=self.batch_size):
+            for rater_id, rated_id, rating_type in ((passenger_id, driver_id, 'driver'),
+                                                     (driver_id, passenger_id, 'passenger')):
+                if self.rng.random() >= self.rating_ratio:
+                    continue
+                score = self.rng.choices((1, 2, 3, 4, 5), (1, 1, 3, 8, 12))[0]
+                ratings.append(Rating(
+                    trip_id=trip_id, rater_id=rater_id, rated_user_id=rated_id, rating_type=rating_type,
+                    score=score, comment=self.rng.choice(COMMENTS), in_stats=True,
+                    punctuality=max(1, min(5, score + self.rng.randint(-1, 1))),
+                    communication=score, cleanliness=score, safety=5,
+                ))
+        Rating.objects.bulk_create(ratings, batch_size=self.batch_size)
+        self.log(f"{len(ratings)} ratings")
+
+    def finish(self, communities):
+        community_ids = [pk for pk, _ in communities]
+        Community.objects.filter(pk__in=community_ids).recount_members()
+        Trip.objects.filter(driver__in=bench_users()).recount_booked_seats()
+        stats = materialize_recurring_trips()
+        self.log(f"{stats['generated']} recurring trip occurrences")
+
+        # Ratings were created already counted (in_stats), the rebuild writes their totals
+        call_command('rebuild_rating_stats', batch_size=self.batch_size, stdout=StringIO())
+        today = timezone.localdate()
+        rollup_daily_stats(today - timedelta(days=61), today + timedelta(days=31), community_ids)
@@ -0,0 +1,21 @@
+from django.contrib import admin, messages
+from transport_app.admin_tools import LargeTableAdmin, in_batches
+from .models import Community
+
+
+@admin.register(Community)
+class CommunityAdmin(LargeTableAdmin, admin.ModelAdmin):
+    list_display = ('name', 'community_type', 'location', 'creator', 'member_count', 'is_private', 'created_at')
+    list_filter = ('community_type', 'is_private')
+    list_select_related = ('creator',)
+    # Also what the trip admin's community autocomplete searches
+    search_fields = ('name', 'location')
+    ordering = ('-created_at',)
+    readonly_fields = ('member_count',)
+    autocomplete_fields = ('creator',)
+    actions = ('recount_members',)
+
+    @admin.action(description="Recalculer le nombre de membres")
+    def recount_members(self, request, queryset):
+        recounted = sum(batch.recount_members() for batch in in_batches(queryset))
+        self.message_user(request, f"{recounted} communauté(s) recalculée(s)", messages.SUCCESS)
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from transport_app.async_views import async_api_view, concurrently
+from .memberships import amembership_roles
+from .models import Community, CommunityDailyStats
+from .serializers import CommunitySerializer, CommunityStatsSerializer
+from .views import (
+    CommunityListCreateView,
+    filter_communities,
+    member_stats,
+    rollup_totals,
+    stats_payload,
+    trend_days,
+    trend_payload
+)
+
+
+@async_api_view(fallback=CommunityListCreateView.as_view())
+async def list_communities(request):
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = await paginator.apaginate_queryset(
+        filter_communities(Community.objects.with_listing_data(), request.query_params), request
+    )
+    await amembership_roles(request)
+    serializer = CommunitySerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@async_api_view
+async def community_stats(request, pk):
+    # Member counts and rollup totals are independent, the two queries run side by side
+    community, totals = await concurrently(
+        lambda: member_stats(pk, request.user).first(),
+        lambda: CommunityDailyStats.objects.filter(community_id=pk).aggregate(**rollup_totals()),
+    )
+    if community is None:
+        raise Http404
+
+    # Check if user is member
+    if not community['is_member']:
+        return Response(
+            {'error': 'Vous devez être membre pour voir les statistiques'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return Response(CommunityStatsSerializer(stats_payload(community, totals)).data)
+
+
+@async_api_view
+async def community_trends(request, pk):
+    days, error = trend_days(request)
+    if error:
+        return error
+
+    if pk not in await amembership_roles(request):
+        if not await Community.objects.filter(pk=pk).aexists():
+            raise Http404
+        return Response(
+            {'error': 'Vous devez être membre pour voir les statistiques'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = [row async for row in CommunityDailyStats.objects.filter(community_id=pk, date__gte=since)]
+    return Response(trend_payload(pk, since, days, rows))
@@ -0,0 +1,7 @@
+from jobs.queue import handler
+from .rollups import rollup_recent_days
+
+
+@handler('communities.rollup_daily_stats', every=900)
+def rollup_daily_stats(payloads):
+    rollup_recent_days()
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from communities.models import Community
+
+
+class Command(BaseCommand):
+    help = "Recompute Community.member_count from the memberships table and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report communities whose counter is out of sync")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        drifted = (
+            Community.objects.with_counted_members()
+            .exclude(member_count=F('counted_members'))
+            .values_list('id', 'member_count', 'counted_members')
+        )
+
+        total = 0
+        batch = []
+        for community_id, member_count, actual in drifted.iterator(chunk_size=batch_size):
+            self.stdout.write(f"Community {community_id}: member_count {member_count} -> {actual}")
+            batch.append(community_id)
+            if len(batch) >= batch_size:
+                total += self._repair(batch, dry_run)
+                batch = []
+        if batch:
+            total += self._repair(batch, dry_run)
+
+        verb = "out of sync" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{total} communities {verb}"))
+
+    def _repair(self, community_ids, dry_run):
+        if not dry_run:
+            Community.objects.filter(id__in=community_ids).recount_members()
+        return len(community_ids)
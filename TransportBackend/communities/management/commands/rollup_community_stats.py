@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from communities.rollups import rollup_daily_stats
+from trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the per-community daily stats (trips, bookings, seats filled) "
+            "that community stats and trends are read from")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-back', type=int, default=2)
+        parser.add_argument('--days-ahead', type=int, default=90)
+        parser.add_argument('--all', action='store_true',
+                            help="Rebuild every day that has trips, month by month "
+                                 "(full history, e.g. after restoring trips or bookings)")
+        parser.add_argument('--community', type=int, action='append', dest='communities')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        today = timezone.localdate()
+        if options['all']:
+            bounds = Trip.objects.aggregate(first=Min('departure_time'), last=Max('departure_time'))
+            if bounds['first'] is None:
+                self.stdout.write("No trips")
+                return
+            start = timezone.localdate(bounds['first'])
+            end = max(timezone.localdate(bounds['last']), today)
+        else:
+            start = today - timedelta(days=options['days_back'])
+            end = today + timedelta(days=options['days_ahead'])
+        if start > end:
+            raise CommandError("Empty date range")
+
+        # Bounded chunks keep each scan and delete/insert transaction short
+        days = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=30), end)
+            days += rollup_daily_stats(chunk_start, chunk_end, options['communities'])
+            chunk_start = chunk_end + timedelta(days=1)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{days} community days rolled up from {start} to {end} in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,46 @@
+from .models import Membership
+
+
+def membership_roles(request):
+    # community_id -> role of the requesting user, loaded with one query and
+    # kept on the request so every serializer rendering it shares the same map
+    if request is None or not request.user.is_authenticated:
+        return {}
+    roles = getattr(request, '_membership_roles', None)
+    if roles is None:
+        roles = dict(
+            Membership.objects.filter(user=request.user).values_list('community_id', 'role')
+        )
+        request._membership_roles = roles
+    return roles
+
+
+async def amembership_roles(request):
+    # Async views load the map up front; serializers then read it without a query
+    if request is None or not request.user.is_authenticated:
+        return {}
+    if getattr(request, '_membership_roles', None) is None:
+        request._membership_roles = {
+            community_id: role
+            async for community_id, role in Membership.objects.filter(
+                user=request.user
+            ).values_list('community_id', 'role')
+        }
+    return request._membership_roles
+
+
+def forget_membership_roles(request):
+    # Call after the request itself changes the user's memberships
+    if request is not None:
+        request._membership_roles = None
+
+
+def strip_membership(community):
+    # Serialized community without the requesting user's membership fields
+    community['is_member'] = False
+    community['user_role'] = None
+
+
+def add_membership(community, roles):
+    community['is_member'] = community['id'] in roles
+    community['user_role'] = roles.get(community['id'])
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+from communities.search import normalize_text
+
+
+def backfill_search_document(apps, schema_editor):
+    Community = apps.get_model('communities', 'Community')
+    batch = []
+    for community in Community.objects.only('name', 'description', 'location').iterator(chunk_size=1000):
+        community.search_document = normalize_text(
+            ' '.join((community.name, community.description, community.location))
+        )
+        batch.append(community)
+        if len(batch) >= 1000:
+            Community.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    Community.objects.bulk_update(batch, ['search_document'])
+
+
+def create_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX community_search_ft ON communities_community (search_document)'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX community_search_ft ON communities_community')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0002_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
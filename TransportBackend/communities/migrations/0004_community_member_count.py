@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_member_count(apps, schema_editor):
+    Community = apps.get_model('communities', 'Community')
+    Membership = apps.get_model('communities', 'Membership')
+    members = Membership.objects.filter(community=OuterRef('pk')).values('community').annotate(
+        total=Count('id')
+    ).values('total')
+    Community.objects.update(member_count=Coalesce(Subquery(members), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0003_community_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_member_count, migrations.RunPython.noop),
+    ]
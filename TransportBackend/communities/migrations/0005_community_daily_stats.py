@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0004_community_member_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommunityDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('trips_count', models.PositiveIntegerField(default=0)),
+                ('bookings_count', models.PositiveIntegerField(default=0)),
+                ('seats_filled', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('community', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='communities.community')),
+            ],
+            options={
+                'verbose_name_plural': 'Community daily stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='communitydailystats',
+            constraint=models.UniqueConstraint(fields=('community', 'date'), name='community_daily_stats_unique_day'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+SEAT_HOLDING_STATUSES = ('pending', 'confirmed', 'completed')
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # Same grouped scans as communities.rollups.rollup_daily_stats, over every
+    # departure day, so stats and trends are complete before the first job run
+    Trip = apps.get_model('trips', 'Trip')
+    Booking = apps.get_model('trips', 'Booking')
+    CommunityDailyStats = apps.get_model('communities', 'CommunityDailyStats')
+
+    rows = {}
+    per_day = (
+        Trip.objects.annotate(day=TruncDate('departure_time'))
+        .values('community_id', 'day')
+        .annotate(trips_count=Count('id'), seats_filled=Sum('booked_seats'))
+        .order_by()
+    )
+    for row in per_day.iterator():
+        rows[row['community_id'], row['day']] = CommunityDailyStats(
+            community_id=row['community_id'], date=row['day'],
+            trips_count=row['trips_count'], seats_filled=row['seats_filled'] or 0
+        )
+    booked_per_day = (
+        Booking.objects.filter(status__in=SEAT_HOLDING_STATUSES)
+        .annotate(day=TruncDate('trip__departure_time'))
+        .values('trip__community_id', 'day')
+        .annotate(bookings_count=Count('id'))
+        .order_by()
+    )
+    for row in booked_per_day.iterator():
+        stats = rows.get((row['trip__community_id'], row['day']))
+        if stats is not None:
+            stats.bookings_count = row['bookings_count']
+
+    # Rows already written by the rollup job are at least as fresh, keep them
+    CommunityDailyStats.objects.bulk_create(rows.values(), batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0005_community_daily_stats'),
+        ('trips', '0007_trip_status_arrival_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
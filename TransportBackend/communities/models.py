@@ -1,5 +1,44 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from transport_app.listing_cache import invalidate
+from .search import SearchRank, normalize_text
+
+
+class CommunityQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        # Membership fields come from communities.memberships.membership_roles
+        return self.select_related('creator')
+
+    def add_member(self):
+        # Conditional increment: matches no row once the community is full
+        return self.filter(member_count__lt=F('max_members')).update(member_count=F('member_count') + 1)
+
+    def remove_member(self):
+        return self.update(member_count=F('member_count') - 1)
+
+    def with_counted_members(self):
+        # Members actually recorded in the memberships table
+        return self.annotate(counted_members=counted_members_expression())
+
+    def recount_members(self):
+        repaired = self.update(member_count=counted_members_expression())
+        # Queryset updates send no signal; communities are also nested in trips
+        invalidate('communities', 'trips')
+        return repaired
+
+    def search(self, query):
+        return self.filter(search_document__fulltext=query).annotate(
+            search_rank=SearchRank(F('search_document'), query)
+        )
+
+
+def counted_members_expression():
+    members = Membership.objects.filter(community=OuterRef('pk')).values('community').annotate(
+        total=Count('id')
+    ).values('total')
+    return Coalesce(Subquery(members), 0)
 
 
 class Community(models.Model):
@@ -20,18 +59,30 @@ class Community(models.Model):
     members = models.ManyToManyField(settings.AUTH_USER_MODEL, through='Membership', related_name='communities')
     is_private = models.BooleanField(default=False)
     max_members = models.IntegerField(default=100)
+    # Number of Membership rows, maintained by the join/leave views
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    # Accent-free lowercase copy of name, description and location, FULLTEXT indexed on MySQL
+    search_document = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommunityQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Communities"
 
     def __str__(self):
         return self.name
 
-    @property
-    def member_count(self):
-        return self.members.count()
+    def save(self, *args, **kwargs):
+        self.search_document = self.build_search_document()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'search_document' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'search_document']
+        super().save(*args, **kwargs)
+
+    def build_search_document(self):
+        return normalize_text(' '.join((self.name, self.description, self.location)))
 
 
 class Membership(models.Model):
@@ -49,6 +100,28 @@ class Membership(models.Model):
 
     class Meta:
         unique_together = ('user', 'community')
+        indexes = [
+            models.Index(fields=['community', 'is_active'], name='membership_community_act_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.community.name} ({self.role})"
+
+
+class CommunityDailyStats(models.Model):
+    # Per community and departure day, rebuilt by communities.rollups
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    trips_count = models.PositiveIntegerField(default=0)
+    bookings_count = models.PositiveIntegerField(default=0)
+    seats_filled = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Community daily stats"
+        constraints = [
+            models.UniqueConstraint(fields=['community', 'date'], name='community_daily_stats_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.community.name} - {self.date}"
@@ -0,0 +1,69 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from trips.models import Trip, Booking
+from .models import CommunityDailyStats
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rollup_daily_stats(start, end, community_ids=None):
+    # Recompute the CommunityDailyStats rows of departure days start..end
+    # (inclusive) from trips and bookings: two grouped scans, one upsert.
+    # Local day bounds as datetimes, so the range stays on the departure_time index
+    since, until = day_start(start), day_start(end + timedelta(days=1))
+    trips = Trip.objects.filter(departure_time__gte=since, departure_time__lt=until)
+    bookings = Booking.objects.filter(
+        trip__departure_time__gte=since,
+        trip__departure_time__lt=until,
+        status__in=Booking.SEAT_HOLDING_STATUSES
+    )
+    if community_ids is not None:
+        trips = trips.filter(community_id__in=community_ids)
+        bookings = bookings.filter(trip__community_id__in=community_ids)
+
+    rows = {}
+    per_day = (
+        trips.annotate(day=TruncDate('departure_time'))
+        .values('community_id', 'day')
+        .annotate(trips_count=Count('id'), seats_filled=Sum('booked_seats'))
+        .order_by()
+    )
+    for row in per_day:
+        rows[row['community_id'], row['day']] = CommunityDailyStats(
+            community_id=row['community_id'], date=row['day'],
+            trips_count=row['trips_count'], seats_filled=row['seats_filled'] or 0
+        )
+    booked_per_day = (
+        bookings.annotate(day=TruncDate('trip__departure_time'))
+        .values('trip__community_id', 'day')
+        .annotate(bookings_count=Count('id'))
+        .order_by()
+    )
+    for row in booked_per_day:
+        stats = rows.get((row['trip__community_id'], row['day']))
+        if stats is not None:
+            stats.bookings_count = row['bookings_count']
+
+    existing = CommunityDailyStats.objects.filter(date__gte=start, date__lte=end)
+    if community_ids is not None:
+        existing = existing.filter(community_id__in=community_ids)
+    with transaction.atomic():
+        # Replace the range: days that lost all their trips disappear too.
+        # A plain insert, MySQL has no upsert on a given unique constraint.
+        existing.delete()
+        CommunityDailyStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def rollup_recent_days(days_back=2, days_ahead=90):
+    # Trips are published ahead of time and booked until they leave, so the
+    # rolling window covers the recent past and the upcoming departures
+    today = timezone.localdate()
+    return rollup_daily_stats(today - timedelta(days=days_back), today + timedelta(days=days_ahead))
@@ -0,0 +1,72 @@
+import re
+import unicodedata
+
+from django.db.models import FloatField, Func, Lookup, TextField, Value
+
+# InnoDB ignores shorter words in FULLTEXT indexes (innodb_ft_min_token_size)
+FULLTEXT_MIN_TOKEN_SIZE = 3
+
+
+def normalize_text(value):
+    # Lowercase without accents, so "Événement" and "evenement" index and match alike
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def search_terms(query):
+    return re.findall(r'\w+', normalize_text(query))
+
+
+def boolean_query(terms):
+    # Every word required, each one matched as a prefix
+    return ' '.join(f'+{term}*' for term in terms if len(term) >= FULLTEXT_MIN_TOKEN_SIZE)
+
+
+@TextField.register_lookup
+class FullTextSearch(Lookup):
+    # column__fulltext='query': MATCH ... AGAINST on MySQL, one LIKE per word elsewhere.
+    # The column is expected to hold normalize_text() output.
+    lookup_name = 'fulltext'
+
+    def as_mysql(self, compiler, connection):
+        terms = search_terms(self.rhs)
+        query = boolean_query(terms)
+        if not query:
+            return self.as_sql(compiler, connection)
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        sql, params = f'MATCH ({lhs}) AGAINST (%s IN BOOLEAN MODE)', [*lhs_params, query]
+        # Words under the index token size are checked on the rows MATCH selected
+        short_terms = [term for term in terms if len(term) < FULLTEXT_MIN_TOKEN_SIZE]
+        if short_terms:
+            like_sql, like_params = self.like_terms(lhs, lhs_params, short_terms, connection)
+            sql, params = f'{sql} AND {like_sql}', [*params, *like_params]
+        return sql, params
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return self.like_terms(lhs, lhs_params, search_terms(self.rhs) or [''], connection)
+
+    def like_terms(self, lhs, lhs_params, terms, connection):
+        clauses, params = [], []
+        for term in terms:
+            clauses.append(f"{lhs} {connection.operators['contains'] % '%s'}")
+            params.extend([*lhs_params, f'%{connection.ops.prep_for_like_query(term)}%'])
+        return ' AND '.join(clauses), params
+
+
+class SearchRank(Func):
+    # Relevance of the column for the query: MySQL's natural language score, 0 elsewhere
+    output_field = FloatField()
+
+    def __init__(self, expression, query):
+        super().__init__(expression, Value(' '.join(search_terms(query))))
+
+    def as_mysql(self, compiler, connection):
+        column, query = self.source_expressions
+        column_sql, column_params = compiler.compile(column)
+        query_sql, query_params = compiler.compile(query)
+        return (f'MATCH ({column_sql}) AGAINST ({query_sql} IN NATURAL LANGUAGE MODE)',
+                [*column_params, *query_params])
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return '0', []
@@ -1,9 +1,11 @@
 from rest_framework import serializers
-from .models import Community, Membership
+from transport_app.serializers import TimedSerializerMixin
+from .models import Community, Membership, CommunityDailyStats
+from .memberships import membership_roles
 from users.serializers import UserSerializer
 
 
-class CommunitySerializer(serializers.ModelSerializer):
+class CommunitySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     creator = UserSerializer(read_only=True)
     member_count = serializers.ReadOnlyField()
     is_member = serializers.SerializerMethodField()
@@ -17,23 +19,13 @@ class CommunitySerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'creator', 'created_at', 'updated_at')
 
     def get_is_member(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.members.filter(id=request.user.id).exists()
-        return False
+        return obj.id in membership_roles(self.context.get('request'))
 
     def get_user_role(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            membership = Membership.objects.filter(
-                user=request.user,
-                community=obj
-            ).first()
-            return membership.role if membership else None
-        return None
+        return membership_roles(self.context.get('request')).get(obj.id)
 
 
-class MembershipSerializer(serializers.ModelSerializer):
+class MembershipSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     community = CommunitySerializer(read_only=True)
 
@@ -43,8 +35,16 @@ class MembershipSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'joined_at')
 
 
-class CommunityStatsSerializer(serializers.Serializer):
+class CommunityStatsSerializer(TimedSerializerMixin, serializers.Serializer):
     total_members = serializers.IntegerField()
     total_trips = serializers.IntegerField()
     active_members = serializers.IntegerField()
     recent_trips = serializers.IntegerField()
+    total_bookings = serializers.IntegerField()
+    seats_filled = serializers.IntegerField()
+
+
+class CommunityDailyStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = CommunityDailyStats
+        fields = ('date', 'trips_count', 'bookings_count', 'seats_filled')
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from transport_app.listing_cache import invalidate
+from trips.models import invalidate_trip_listings
+from .models import Community, Membership
+
+
+@receiver([post_save, post_delete], sender=Community)
+def community_changed(sender, instance, **kwargs):
+    # Trips embed their community
+    invalidate('communities')
+    invalidate_trip_listings(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    # member_count is part of the community, also nested in trips
+    invalidate('communities')
+    invalidate_trip_listings(instance.community_id)
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from trips.models import Booking, Trip
+from users.models import User, Vehicle
+from users.tokens import UserRefreshToken
+from .models import Community, CommunityDailyStats, Membership
+from .rollups import day_start, rollup_recent_days
+
+
+def create_user(name, **fields):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, password='password', first_name=name, last_name='Test',
+        **fields
+    )
+
+
+@override_settings(LISTING_CACHE_TIMEOUT=0)
+class CommunityRollupTests(TestCase):
+    # Community stats and trends are read from the daily rollup only
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_user('driver', user_type='driver')
+        cls.passengers = [create_user(f'passenger{index}') for index in range(3)]
+        cls.community = Community.objects.create(
+            name='Bureau', description='Trajets du bureau', community_type='work', location='Paris',
+            creator=cls.driver
+        )
+        for user in [cls.driver, *cls.passengers]:
+            Membership.objects.create(user=user, community=cls.community)
+        Community.objects.filter(pk=cls.community.pk).recount_members()
+        vehicle = Vehicle.objects.create(owner=cls.driver, brand='Renault', model='Clio', year=2020,
+                                         color='bleu', license_plate='AA-001-AA')
+        cls.today = timezone.localdate()
+
+        def trip(days_ago, hour):
+            departure = day_start(cls.today - timedelta(days=days_ago)) + timedelta(hours=hour)
+            return Trip.objects.create(
+                driver=cls.driver, vehicle=vehicle, community=cls.community,
+                departure_location='Paris', arrival_location='Lyon', departure_time=departure,
+                estimated_arrival_time=departure + timedelta(hours=4), available_seats=4
+            )
+
+        # Two trips 10 days ago, one 60 days ago (outside the recent window)
+        morning, evening, old = trip(10, 8), trip(10, 18), trip(60, 8)
+        Booking.objects.create(trip=morning, passenger=cls.passengers[0], seats_booked=2, status='confirmed')
+        Booking.objects.create(trip=morning, passenger=cls.passengers[1], status='pending')
+        Booking.objects.create(trip=evening, passenger=cls.passengers[2], status='cancelled')
+        Booking.objects.create(trip=old, passenger=cls.passengers[0], status='completed')
+        Trip.objects.recount_booked_seats()
+
+    def setUp(self):
+        self.client = APIClient()
+        token = UserRefreshToken.for_user(self.passengers[0]).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def assert_stats(self):
+        stats = self.get(f'/api/communities/{self.community.pk}/stats/')
+        self.assertEqual(stats['total_members'], 4)
+        self.assertEqual(stats['total_trips'], 3)
+        self.assertEqual(stats['recent_trips'], 2)
+        self.assertEqual(stats['total_bookings'], 3)
+        self.assertEqual(stats['seats_filled'], 4)
+
+        trends = self.get(f'/api/communities/{self.community.pk}/stats/trends/?days=30')
+        self.assertEqual(len(trends['series']), 30)
+        busy_day = str(self.today - timedelta(days=10))
+        points = {point['date']: point for point in trends['series']}
+        self.assertEqual(points[busy_day], {
+            'date': busy_day, 'trips_count': 2, 'bookings_count': 2, 'seats_filled': 3,
+        })
+        self.assertEqual(sum(point['trips_count'] for point in trends['series']), 2)
+
+    def test_rebuild_command(self):
+        call_command('rollup_community_stats', '--all', stdout=StringIO())
+        self.assert_stats()
+
+    def test_rollup_is_rerunnable(self):
+        call_command('rollup_community_stats', '--all', stdout=StringIO())
+        # The periodic job replaces the days it covers, including the old ones
+        # rebuilt above, without duplicating them
+        rollup_recent_days(days_back=90, days_ahead=1)
+        self.assertEqual(CommunityDailyStats.objects.filter(community=self.community).count(), 2)
+        self.assert_stats()
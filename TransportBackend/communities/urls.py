@@ -1,11 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+if settings.ASYNC_READ_VIEWS:
+    community_list = async_views.list_communities
+    community_stats = async_views.community_stats
+    community_trends = async_views.community_trends
+else:
+    community_list = views.CommunityListCreateView.as_view()
+    community_stats = views.community_stats
+    community_trends = views.community_trends
 
 urlpatterns = [
-    path('', views.CommunityListCreateView.as_view(), name='community-list'),
+    path('', community_list, name='community-list'),
     path('<int:pk>/', views.CommunityDetailView.as_view(), name='community-detail'),
     path('<int:pk>/join/', views.join_community, name='join-community'),
     path('<int:pk>/leave/', views.leave_community, name='leave-community'),
     path('<int:pk>/members/', views.CommunityMembersView.as_view(), name='community-members'),
-    path('<int:pk>/stats/', views.community_stats, name='community-stats'),
+    path('<int:pk>/stats/', community_stats, name='community-stats'),
+    path('<int:pk>/stats/trends/', community_trends, name='community-trends'),
 ]
@@ -2,47 +2,74 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
-from .models import Community, Membership
-from .serializers import CommunitySerializer, MembershipSerializer, CommunityStatsSerializer
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import timedelta
+from transport_app.listing_cache import CachedListMixin
+from .models import Community, Membership, CommunityDailyStats
+from .memberships import add_membership, forget_membership_roles, membership_roles, strip_membership
+from .serializers import (
+    CommunitySerializer,
+    MembershipSerializer,
+    CommunityStatsSerializer,
+    CommunityDailyStatsSerializer
+)
 
+TREND_PERIODS = (30, 90, 365)
 
-class CommunityListCreateView(generics.ListCreateAPIView):
+
+class CommunityListCreateView(CachedListMixin, generics.ListCreateAPIView):
     serializer_class = CommunitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_namespace = 'communities'
+    cache_params = ('search', 'type', 'location', 'page', 'page_size')
 
-    def get_queryset(self):
-        queryset = Community.objects.all()
-        search = self.request.query_params.get('search', None)
-        community_type = self.request.query_params.get('type', None)
-        location = self.request.query_params.get('location', None)
-
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search)
-            )
-
-        if community_type:
-            queryset = queryset.filter(community_type=community_type)
+    def strip_user_fields(self, results):
+        for community in results:
+            strip_membership(community)
 
-        if location:
-            queryset = queryset.filter(location__icontains=location)
+    def add_user_fields(self, results):
+        roles = membership_roles(self.request)
+        for community in results:
+            add_membership(community, roles)
 
-        return queryset.order_by('-created_at')
+    def get_queryset(self):
+        return filter_communities(Community.objects.with_listing_data(), self.request.query_params)
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        community = serializer.save(creator=self.request.user)
+        community = serializer.save(creator=self.request.user, member_count=1)
         # Automatically make creator an admin
         Membership.objects.create(
             user=self.request.user,
             community=community,
             role='admin'
         )
+        forget_membership_roles(self.request)
+
+
+def filter_communities(queryset, params):
+    search = params.get('search', None)
+    community_type = params.get('type', None)
+    location = params.get('location', None)
+
+    if community_type:
+        queryset = queryset.filter(community_type=community_type)
+
+    if location:
+        queryset = queryset.filter(location__icontains=location)
+
+    if search:
+        # FULLTEXT match on the normalized name/description/location, best matches first
+        return queryset.search(search).order_by('-search_rank', '-created_at')
+
+    return queryset.order_by('-created_at')
 
 
 class CommunityDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Community.objects.all()
+    queryset = Community.objects.with_listing_data()
     serializer_class = CommunitySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -66,20 +93,33 @@ def join_community(request, pk):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    full_response = Response(
+        {'error': 'Cette communauté a atteint sa capacité maximale'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
     # Check if community is full
     if community.member_count >= community.max_members:
+        return full_response
+
+    try:
+        with transaction.atomic():
+            # Take the seat with a conditional increment so parallel joins can't exceed max_members
+            if not Community.objects.filter(pk=community.pk).add_member():
+                return full_response
+            # Create membership
+            membership = Membership.objects.create(
+                user=user,
+                community=community,
+                role='member'
+            )
+    except IntegrityError:
         return Response(
-            {'error': 'Cette communauté a atteint sa capacité maximale'},
+            {'error': 'Vous êtes déjà membre de cette communauté'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Create membership
-    membership = Membership.objects.create(
-        user=user,
-        community=community,
-        role='member'
-    )
-
+    community.refresh_from_db(fields=['member_count'])
     return Response(
         MembershipSerializer(membership).data,
         status=status.HTTP_201_CREATED
@@ -107,7 +147,11 @@ def leave_community(request, pk):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        membership.delete()
+        with transaction.atomic():
+            # Only the request that actually deleted the row releases the place
+            deleted, _ = Membership.objects.filter(pk=membership.pk).delete()
+            if deleted:
+                Community.objects.filter(pk=community.pk).remove_member()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     except Membership.DoesNotExist:
@@ -126,32 +170,95 @@ class CommunityMembersView(generics.ListAPIView):
         return Membership.objects.filter(
             community_id=community_id,
             is_active=True
-        ).select_related('user', 'community')
+        ).select_related('user', 'community__creator').order_by('joined_at', 'pk')
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def community_stats(request, pk):
-    community = get_object_or_404(Community, pk=pk)
+    community = get_object_or_404(member_stats(pk, request.user))
 
     # Check if user is member
-    if not Membership.objects.filter(user=request.user, community=community).exists():
+    if not community['is_member']:
         return Response(
             {'error': 'Vous devez être membre pour voir les statistiques'},
             status=status.HTTP_403_FORBIDDEN
         )
 
-    stats = {
-        'total_members': community.member_count,
-        'total_trips': community.trips.count(),
-        'active_members': Membership.objects.filter(
-            community=community,
-            is_active=True
-        ).count(),
-        'recent_trips': community.trips.filter(
-            departure_time__gte=timezone.now() - timedelta(days=30)
-        ).count()
+    totals = CommunityDailyStats.objects.filter(community_id=pk).aggregate(**rollup_totals())
+    serializer = CommunityStatsSerializer(stats_payload(community, totals))
+    return Response(serializer.data)
+
+
+def member_stats(pk, user):
+    # Existence, the requesting user's membership and the member counts, in one query
+    return Community.objects.filter(pk=pk).annotate(
+        active_members=Count('membership', filter=Q(membership__is_active=True)),
+        is_member=Count('membership', filter=Q(membership__user=user)),
+    ).values('member_count', 'active_members', 'is_member')
+
+
+def rollup_totals():
+    # Trip figures come from the daily rollup, in one conditional aggregation
+    since = timezone.localdate() - timedelta(days=30)
+    return {
+        'total_trips': Coalesce(Sum('trips_count'), 0),
+        'recent_trips': Coalesce(Sum('trips_count', filter=Q(date__gte=since)), 0),
+        'total_bookings': Coalesce(Sum('bookings_count'), 0),
+        'seats_filled': Coalesce(Sum('seats_filled'), 0),
     }
 
-    serializer = CommunityStatsSerializer(stats)
-    return Response(serializer.data)
+
+def stats_payload(community, totals):
+    return {
+        'total_members': community['member_count'],
+        'active_members': community['active_members'],
+        **totals,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def community_trends(request, pk):
+    days, error = trend_days(request)
+    if error:
+        return error
+
+    if pk not in membership_roles(request):
+        get_object_or_404(Community, pk=pk)
+        return Response(
+            {'error': 'Vous devez être membre pour voir les statistiques'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = CommunityDailyStats.objects.filter(community_id=pk, date__gte=since)
+    return Response(trend_payload(pk, since, days, rows))
+
+
+def trend_days(request):
+    # (days, None) or (None, error response) for ?days=30|90|365
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        days = None
+    if days not in TREND_PERIODS:
+        return None, Response(
+            {'error': 'La période doit être de 30, 90 ou 365 jours'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return days, None
+
+
+def trend_payload(pk, since, days, rows):
+    # One point per day, days without trips included
+    by_date = {row.date: row for row in rows}
+    series = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        series.append(by_date.get(day) or CommunityDailyStats(community_id=pk, date=day))
+    return {
+        'days': days,
+        'since': since,
+        'series': CommunityDailyStatsSerializer(series, many=True).data,
+    }
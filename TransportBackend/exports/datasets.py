@@ -0,0 +1,113 @@
+import csv
+import json
+from datetime import datetime, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from communities.rollups import day_start
+from ratings.models import Rating
+from trips.models import Booking, Trip
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+class Dataset:
+    def __init__(self, model, columns, date_field, community_field):
+        self.model = model
+        # values_list() paths; related ones are joined in the same query
+        self.columns = columns
+        self.date_field = date_field
+        self.community_field = community_field
+
+    @property
+    def header(self):
+        return [column.replace('__', '_') for column in self.columns]
+
+    def queryset(self, since=None, until=None, community_ids=None):
+        # since / until are local dates, both included
+        queryset = self.model._base_manager.all()
+        if since:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': day_start(since)})
+        if until:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': day_start(until + timedelta(days=1))})
+        if community_ids:
+            queryset = queryset.filter(**{f'{self.community_field}__in': community_ids})
+        return queryset
+
+    def rows(self, queryset, chunk_size=2000):
+        # Keyset batches on the primary key: every query reads at most
+        # chunk_size rows whatever the size of the export. MySQLdb buffers a
+        # whole result set client side, so one iterator() over the full
+        # table would not keep memory flat.
+        last_id = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', *self.columns)[:chunk_size]
+            )
+            if not batch:
+                return
+            for row in batch:
+                yield row[1:]
+            if len(batch) < chunk_size:
+                return
+            last_id = batch[-1][0]
+
+
+DATASETS = {
+    'trips': Dataset(
+        Trip,
+        ('id', 'status', 'community_id', 'community__name', 'driver_id', 'driver__email',
+         'vehicle__license_plate', 'departure_location', 'departure_latitude', 'departure_longitude',
+         'arrival_location', 'arrival_latitude', 'arrival_longitude', 'departure_time',
+         'estimated_arrival_time', 'available_seats', 'booked_seats', 'price_per_seat',
+         'recurring', 'template_id', 'created_at'),
+        date_field='departure_time', community_field='community_id',
+    ),
+    'bookings': Dataset(
+        Booking,
+        ('id', 'status', 'trip_id', 'trip__community_id', 'trip__departure_time', 'passenger_id',
+         'passenger__email', 'seats_booked', 'pickup_location', 'dropoff_location', 'created_at',
+         'updated_at'),
+        date_field='created_at', community_field='trip__community_id',
+    ),
+    'ratings': Dataset(
+        Rating,
+        ('id', 'trip_id', 'trip__community_id', 'rater_id', 'rated_user_id', 'rating_type', 'score',
+         'punctuality', 'communication', 'cleanliness', 'safety', 'comment', 'created_at'),
+        date_field='created_at', community_field='trip__community_id',
+    ),
+}
+
+
+class _Line:
+    # csv.writer target that hands back each written line
+    def write(self, value):
+        return value
+
+
+def encode(dataset, rows, output):
+    # One text line per row, header first for CSV
+    if output == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(dataset.header)
+        for row in rows:
+            # Same ISO 8601 dates as the API and the NDJSON export
+            yield writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+    else:
+        header = dataset.header
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def in_chunks(lines, size=500):
+    # Fewer, larger writes to the client or file
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from exports.datasets import DATASETS, FORMATS, encode, in_chunks
+
+
+class Command(BaseCommand):
+    help = "Stream trips, bookings or ratings as CSV or NDJSON to a file or stdout, in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS)
+        parser.add_argument('--output', choices=FORMATS, default='csv')
+        parser.add_argument('--since', type=date.fromisoformat, help="First day included (YYYY-MM-DD)")
+        parser.add_argument('--until', type=date.fromisoformat, help="Last day included (YYYY-MM-DD)")
+        parser.add_argument('--community', type=int, action='append', dest='communities')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--database', default='default', help="Alias to read from, e.g. a replica")
+        parser.add_argument('--file', help="Write here instead of stdout")
+
+    def handle(self, *args, **options):
+        export = DATASETS[options['dataset']]
+        queryset = export.queryset(
+            options['since'], options['until'], options['communities']
+        ).using(options['database'])
+        chunks = in_chunks(encode(export, export.rows(queryset, options['chunk_size']), options['output']))
+
+        started = time.monotonic()
+        if not options['file']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['file'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(f"{options['dataset']} written to {options['file']} in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from .datasets import FORMATS
+
+
+class ExportParamsSerializer(serializers.Serializer):
+    # `output` rather than `format`, which DRF keeps for content negotiation
+    output = serializers.ChoiceField(choices=FORMATS, default='csv')
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    community = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+
+    def validate(self, attrs):
+        if attrs.get('since') and attrs.get('until') and attrs['since'] > attrs['until']:
+            raise serializers.ValidationError("La date de début doit précéder la date de fin.")
+        return attrs
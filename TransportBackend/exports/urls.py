@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('<slug:dataset>/', views.export_dataset, name='export'),
+]
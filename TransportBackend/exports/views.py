@@ -0,0 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .datasets import CONTENT_TYPES, DATASETS, encode, in_chunks
+from .serializers import ExportParamsSerializer
+
+
+async def _async_chunks(chunks):
+    # Under ASGI a synchronous iterator would be read to the end before
+    # sending anything; each chunk is produced in a worker thread instead
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(lambda: next(iterator, None))
+    while (chunk := await next_chunk()) is not None:
+        yield chunk
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_dataset(request, dataset):
+    export = DATASETS.get(dataset)
+    if export is None:
+        return Response(
+            {'error': f"Export inconnu, choisir parmi : {', '.join(DATASETS)}"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    params = ExportParamsSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    options = params.validated_data
+
+    # Rows are read while the response streams, after the routing middleware
+    # has returned: the database is chosen now
+    queryset = export.queryset(
+        options.get('since'), options.get('until'), options.get('community')
+    ).using(router.db_for_read(export.model))
+    rows = export.rows(queryset, chunk_size=settings.EXPORT_CHUNK_SIZE)
+    chunks = in_chunks(encode(export, rows, options['output']))
+    if isinstance(request._request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[options['output']])
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{options['output']}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
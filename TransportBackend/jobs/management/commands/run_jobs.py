@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = ("Process queued jobs. Start one process per worker; "
+            "workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED and can run side by side")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Jobs claimed per round trip")
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the due jobs and exit")
+        parser.add_argument('--name', action='append', dest='names',
+                            help="Only process jobs with this name (repeatable)")
+        parser.add_argument('--lock-timeout', type=int, default=300,
+                            help="Seconds after which a running job is considered abandoned")
+        parser.add_argument('--keep-days', type=int, default=7,
+                            help="Days to keep finished jobs (and their idempotency keys)")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            batch_size=options['batch_size'],
+            names=options['names'],
+            lock_timeout=options['lock_timeout'],
+        )
+        self.stdout.write(f"Worker {worker.worker_id} started")
+        try:
+            stats = worker.run(sleep=options['sleep'], once=options['once'], keep_days=options['keep_days'])
+        except KeyboardInterrupt:
+            stats = worker.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['done']} done, {stats['retried']} retried, {stats['failed']} failed"
+        ))
@@ -0,0 +1,53 @@
+from django.utils import timezone
+from .models import Job
+
+_handlers = {}
+
+
+class JobHandler:
+    def __init__(self, name, func, batch_size, every, atomic=True):
+        self.name = name
+        self.func = func
+        self.batch_size = batch_size
+        self.every = every
+        self.atomic = atomic
+
+    def __call__(self, payloads):
+        return self.func(payloads)
+
+
+def handler(name, batch_size=100, every=None, atomic=True):
+    # Register func(payloads) for jobs called `name`. A handler receives the
+    # payloads of up to batch_size jobs at once and runs in the transaction that
+    # marks them done. With atomic=False it manages its own transactions
+    # instead and must be safe to run again. With `every` (seconds) the worker
+    # also enqueues it periodically.
+    def register(func):
+        _handlers[name] = JobHandler(name, func, batch_size, every, atomic)
+        return func
+    return register
+
+
+def get_handler(name):
+    return _handlers.get(name)
+
+
+def periodic_handlers():
+    return [h for h in _handlers.values() if h.every]
+
+
+def enqueue(name, payload=None, key=None, run_at=None, max_attempts=5):
+    # Meant to be called inside the caller's transaction, so the job exists
+    # exactly when the change that requires it was committed
+    job = Job(
+        name=name,
+        payload=payload or {},
+        idempotency_key=key,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+    if key is None:
+        job.save()
+    else:
+        Job.objects.bulk_create([job], ignore_conflicts=True)
+    return job
@@ -0,0 +1,149 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from .queue import enqueue, get_handler, periodic_handlers
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    def __init__(self, batch_size=100, names=None, lock_timeout=300, retry_delay=10, max_retry_delay=3600):
+        self.batch_size = batch_size
+        self.names = names
+        self.lock_timeout = lock_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stats = {'done': 0, 'retried': 0, 'failed': 0}
+
+    def schedule_periodic(self, now=None):
+        # One job per period: the idempotency key makes concurrent workers agree
+        now = now or timezone.now()
+        for job_handler in periodic_handlers():
+            if self.names and job_handler.name not in self.names:
+                continue
+            slot = int(now.timestamp()) // job_handler.every
+            enqueue(job_handler.name, key=f"{job_handler.name}:{slot}", max_attempts=1)
+
+    def release_stale(self, now=None):
+        # Jobs left running by a worker that died go back to the queue
+        now = now or timezone.now()
+        return Job.objects.filter(
+            status='running',
+            locked_at__lt=now - timedelta(seconds=self.lock_timeout)
+        ).update(status='pending', locked_by='', locked_at=None, run_at=now)
+
+    def claim(self):
+        now = timezone.now()
+        queryset = Job.objects.filter(status='pending', run_at__lte=now)
+        if self.names:
+            queryset = queryset.filter(name__in=self.names)
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        with transaction.atomic():
+            ids = list(
+                queryset.order_by('run_at', 'id')
+                .select_for_update(skip_locked=skip_locked)
+                .values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return []
+            # status='pending' again: without SKIP LOCKED another worker may have won the race
+            Job.objects.filter(id__in=ids, status='pending').update(
+                status='running',
+                locked_by=self.worker_id,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+        return list(Job.objects.filter(id__in=ids, status='running', locked_by=self.worker_id, locked_at=now))
+
+    def run_once(self):
+        jobs = self.claim()
+        by_name = {}
+        for job in jobs:
+            by_name.setdefault(job.name, []).append(job)
+        for name, group in by_name.items():
+            job_handler = get_handler(name)
+            if job_handler is None:
+                self.fail(group, f"No handler registered for {name}", retry=False)
+                continue
+            for start in range(0, len(group), job_handler.batch_size):
+                self.run_batch(job_handler, group[start:start + job_handler.batch_size])
+        return len(jobs)
+
+    def run_batch(self, job_handler, jobs):
+        try:
+            if job_handler.atomic:
+                # Handler work and completion commit together, so a retry never applies it twice
+                with transaction.atomic():
+                    job_handler([job.payload for job in jobs])
+                    self.mark_done(jobs)
+            else:
+                # The handler commits as it goes, e.g. one transaction per batch of rows
+                job_handler([job.payload for job in jobs])
+                self.mark_done(jobs)
+            self.stats['done'] += len(jobs)
+            return
+        except Exception:
+            error = traceback.format_exc()
+
+        if len(jobs) > 1:
+            # Isolate the failing job(s) instead of retrying the whole batch
+            for job in jobs:
+                self.run_batch(job_handler, [job])
+            return
+        logger.error("Job %s failed\n%s", jobs[0], error)
+        self.fail(jobs, error)
+
+    def mark_done(self, jobs):
+        Job.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='done', locked_by='', locked_at=None, last_error='', updated_at=timezone.now()
+        )
+
+    def fail(self, jobs, error, retry=True):
+        now = timezone.now()
+        for job in jobs:
+            if retry and job.attempts < job.max_attempts:
+                delay = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+                Job.objects.filter(id=job.id).update(
+                    status='pending', locked_by='', locked_at=None, last_error=error,
+                    run_at=now + timedelta(seconds=delay), updated_at=now
+                )
+                self.stats['retried'] += 1
+            else:
+                Job.objects.filter(id=job.id).update(
+                    status='failed', locked_by='', locked_at=None, last_error=error, updated_at=now
+                )
+                self.stats['failed'] += 1
+
+    def purge(self, keep_days):
+        cutoff = timezone.now() - timedelta(days=keep_days)
+        deleted, _ = Job.objects.filter(status='done', updated_at__lt=cutoff).delete()
+        return deleted
+
+    def run(self, sleep=1.0, once=False, keep_days=7):
+        last_purge = 0
+        while True:
+            try:
+                self.schedule_periodic()
+                self.release_stale()
+                processed = self.run_once()
+                if time.monotonic() - last_purge > 3600:
+                    self.purge(keep_days)
+                    last_purge = time.monotonic()
+            except Exception:
+                # The database being slow or briefly away must not kill the worker
+                logger.exception("Job worker loop failed")
+                connection.close()
+                processed = 0
+            if once and not processed:
+                return self.stats
+            if not processed:
+                time.sleep(sleep)
@@ -1,18 +1,72 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from transport_app.admin_tools import LargeTableAdmin, RelatedIdFilter, in_batches
 from .models import Rating, UserRatingStats
 
+
+class RatedUserFilter(RelatedIdFilter):
+    title = 'utilisateur évalué'
+    parameter_name = 'rated_user_id'
+
+
+class RaterFilter(RelatedIdFilter):
+    title = 'auteur'
+    parameter_name = 'rater_id'
+
+
+class TripFilter(RelatedIdFilter):
+    title = 'trajet'
+    parameter_name = 'trip_id'
+
+
+class ScoreFilter(admin.SimpleListFilter):
+    # Fixed choices: the default filter of a plain integer field runs
+    # SELECT DISTINCT over the whole ratings table
+    title = 'note'
+    parameter_name = 'score'
+
+    def lookups(self, request, model_admin):
+        return [(str(score), f'{score}/5') for score in range(1, 6)]
+
+    def queryset(self, request, queryset):
+        if self.value() in dict(self.lookup_choices):
+            return queryset.filter(score=self.value())
+        return queryset
+
+
+class RatingStatsAdmin(LargeTableAdmin, admin.ModelAdmin):
+    def recompute(self, request, stats):
+        recomputed = sum(batch.recompute() for batch in in_batches(stats))
+        self.message_user(request, f"{recomputed} statistique(s) recalculée(s)", messages.SUCCESS)
+
+
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(RatingStatsAdmin):
     list_display = ('rater', 'rated_user', 'rating_type', 'score', 'trip', 'created_at')
-    list_filter = ('rating_type', 'score', 'created_at')
+    list_filter = ('rating_type', ScoreFilter, 'created_at', RatedUserFilter, RaterFilter, TripFilter)
+    list_select_related = ('rater', 'rated_user', 'trip')
     search_fields = ('rater__email', 'rated_user__email')
-    ordering = ('-created_at',)
+    # Same order as created_at, read from the primary key instead of sorting the table
+    ordering = ('-id',)
+    autocomplete_fields = ('trip', 'rater', 'rated_user')
+    actions = ('recompute_stats',)
+
+    @admin.action(description="Recalculer les statistiques des utilisateurs évalués")
+    def recompute_stats(self, request, queryset):
+        self.recompute(request, UserRatingStats.objects.filter(user_id__in=queryset.values('rated_user_id')))
+
 
 @admin.register(UserRatingStats)
-class UserRatingStatsAdmin(admin.ModelAdmin):
+class UserRatingStatsAdmin(RatingStatsAdmin):
     list_display = ('user', 'overall_average_rating', 'total_ratings',
                    'driver_average_rating', 'passenger_average_rating')
+    list_select_related = ('user',)
     search_fields = ('user__email', 'user__username')
-    readonly_fields = ('driver_average_rating', 'driver_total_ratings',
-                      'passenger_average_rating', 'passenger_total_ratings',
+    readonly_fields = ('driver_score_sum', 'driver_average_rating', 'driver_total_ratings',
+                      'passenger_score_sum', 'passenger_average_rating', 'passenger_total_ratings',
                       'overall_average_rating', 'total_ratings')
+    autocomplete_fields = ('user',)
+    actions = ('recompute_stats',)
+
+    @admin.action(description="Recalculer les statistiques sélectionnées")
+    def recompute_stats(self, request, queryset):
+        self.recompute(request, queryset)
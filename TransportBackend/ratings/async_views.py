@@ -0,0 +1,22 @@
+from django.http import Http404
+from rest_framework.response import Response
+from transport_app.async_views import async_api_view
+from .cache import aget_stats_entries
+from .views import UserRatingStatsBatchView, batch_user_ids, stats_response
+
+
+@async_api_view
+async def user_rating_stats(request, user_id):
+    entry = (await aget_stats_entries([user_id])).get(user_id)
+    if entry is None:
+        raise Http404
+    return stats_response(request, entry)
+
+
+@async_api_view
+async def user_rating_stats_batch(request):
+    user_ids, error = batch_user_ids(request, UserRatingStatsBatchView.max_users)
+    if error:
+        return error
+    entries = await aget_stats_entries(user_ids)
+    return Response([entries[user_id]['data'] for user_id in user_ids if user_id in entries])
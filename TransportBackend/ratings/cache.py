@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from transport_app import shared_cache
+
+
+def stats_cache_key(user_id):
+    return f'ratings:stats:{user_id}'
+
+
+def invalidate_stats(*user_ids):
+    cache.delete_many([stats_cache_key(user_id) for user_id in user_ids])
+
+
+def _build_entry(stats):
+    from .serializers import UserRatingStatsSerializer
+
+    # The payload embeds the user, so a profile edit changes the validators too
+    changes = [stats.updated_at, stats.user.updated_at]
+    versions = [int(changed.timestamp() * 1_000_000) if changed else 0 for changed in changes]
+    last_modified = max((changed for changed in changes if changed), default=None)
+    return {
+        'data': UserRatingStatsSerializer(stats).data,
+        'etag': f'"{stats.user_id}-{versions[0]}-{versions[1]}"',
+        'last_modified': int(last_modified.timestamp()) if last_modified else None,
+    }
+
+
+def get_stats_entries(user_ids):
+    # Serialized stats plus their ETag/Last-Modified for each user id, read from the
+    # cache and filled from the database for the misses. Unknown users are left out.
+    # Ratings are recorded by the job worker, whose invalidations only reach the
+    # web processes through a shared cache: without one, always read the database.
+    from .models import UserRatingStats
+
+    keys = {stats_cache_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(keys) if shared_cache.is_shared() else {}
+    entries = {keys[key]: entry for key, entry in cached.items()}
+    missing = [user_id for user_id in user_ids if user_id not in entries]
+    if not missing:
+        return entries
+
+    found = {
+        stats.user_id: stats
+        for stats in UserRatingStats.objects.select_related('user').filter(user_id__in=missing)
+    }
+    # Users nobody has rated yet get empty stats, without writing a row on a GET
+    unrated = [user_id for user_id in missing if user_id not in found]
+    if unrated:
+        for user in get_user_model().objects.filter(id__in=unrated):
+            found[user.id] = UserRatingStats(user=user)
+
+    fresh = {user_id: _build_entry(stats) for user_id, stats in found.items()}
+    if shared_cache.is_shared():
+        cache.set_many(_cache_items(fresh), timeout=settings.RATING_STATS_CACHE_TIMEOUT)
+    entries.update(fresh)
+    return entries
+
+
+async def aget_stats_entries(user_ids):
+    # get_stats_entries for async views, through the async cache and ORM APIs
+    from .models import UserRatingStats
+
+    keys = {stats_cache_key(user_id): user_id for user_id in user_ids}
+    cached = await cache.aget_many(keys) if shared_cache.is_shared() else {}
+    entries = {keys[key]: entry for key, entry in cached.items()}
+    missing = [user_id for user_id in user_ids if user_id not in entries]
+    if not missing:
+        return entries
+
+    found = {
+        stats.user_id: stats
+        async for stats in UserRatingStats.objects.select_related('user').filter(user_id__in=missing)
+    }
+    unrated = [user_id for user_id in missing if user_id not in found]
+    if unrated:
+        async for user in get_user_model().objects.filter(id__in=unrated):
+            found[user.id] = UserRatingStats(user=user)
+
+    fresh = {user_id: _build_entry(stats) for user_id, stats in found.items()}
+    if shared_cache.is_shared():
+        await cache.aset_many(_cache_items(fresh), timeout=settings.RATING_STATS_CACHE_TIMEOUT)
+    entries.update(fresh)
+    return entries
+
+
+def _cache_items(entries):
+    return {stats_cache_key(user_id): entry for user_id, entry in entries.items()}
@@ -0,0 +1,7 @@
+from jobs.queue import handler
+from .models import UserRatingStats
+
+
+@handler('ratings.record_rating', batch_size=500)
+def record_ratings(payloads):
+    UserRatingStats.record_ratings([payload['rating_id'] for payload in payloads])
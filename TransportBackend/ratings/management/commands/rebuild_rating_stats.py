@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.utils import timezone
+from ratings.cache import invalidate_stats
+from ratings.models import Rating, UserRatingStats
+
+COUNTER_FIELDS = ('driver_score_sum', 'driver_total_ratings',
+                  'passenger_score_sum', 'passenger_total_ratings')
+
+
+class Command(BaseCommand):
+    help = "Rebuild every UserRatingStats row from the ratings table and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report users whose counters are out of sync")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        # One grouped scan over the ratings table; ratings still queued for the job worker are left to it
+        expected = {}
+        totals = (
+            Rating.objects.filter(in_stats=True).values('rated_user_id', 'rating_type')
+            .annotate(score_sum=Sum('score'), count=Count('id'))
+            .order_by()
+        )
+        for row in totals.iterator(chunk_size=batch_size):
+            counters = expected.setdefault(row['rated_user_id'], dict.fromkeys(COUNTER_FIELDS, 0))
+            counters[f"{row['rating_type']}_score_sum"] = row['score_sum']
+            counters[f"{row['rating_type']}_total_ratings"] = row['count']
+
+        drifted = []
+        seen = set()
+        for stats in UserRatingStats.objects.only('user_id', *COUNTER_FIELDS).iterator(chunk_size=batch_size):
+            seen.add(stats.user_id)
+            counters = expected.get(stats.user_id, dict.fromkeys(COUNTER_FIELDS, 0))
+            current = {field: getattr(stats, field) for field in COUNTER_FIELDS}
+            if current != counters:
+                self.stdout.write(f"User {stats.user_id}: {current} -> {counters}")
+                for field, value in counters.items():
+                    setattr(stats, field, value)
+                stats.updated_at = timezone.now()
+                drifted.append(stats)
+
+        missing = [
+            UserRatingStats(user_id=user_id, **counters)
+            for user_id, counters in expected.items() if user_id not in seen
+        ]
+
+        if not dry_run:
+            UserRatingStats.objects.bulk_update(
+                drifted, COUNTER_FIELDS + ('updated_at',), batch_size=batch_size
+            )
+            UserRatingStats.objects.bulk_create(missing, batch_size=batch_size)
+            invalidate_stats(*[stats.user_id for stats in drifted + missing])
+
+        verb = "out of sync" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(drifted)} stats rows {verb}, {len(missing)} missing rows "
+            f"{'to create' if dry_run else 'created'}"
+        ))
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:40
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_score_sums(apps, schema_editor):
+    Rating = apps.get_model('ratings', 'Rating')
+    UserRatingStats = apps.get_model('ratings', 'UserRatingStats')
+    totals = (
+        Rating.objects.values('rated_user_id', 'rating_type')
+        .annotate(score_sum=Sum('score'), count=Count('id'))
+        .order_by()
+    )
+    for row in totals.iterator():
+        prefix = row['rating_type']
+        UserRatingStats.objects.update_or_create(
+            user_id=row['rated_user_id'],
+            defaults={
+                f'{prefix}_score_sum': row['score_sum'],
+                f'{prefix}_total_ratings': row['count'],
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ratings', '0002_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userratingstats',
+            name='driver_score_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userratingstats',
+            name='passenger_score_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='userratingstats',
+            name='driver_total_ratings',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='userratingstats',
+            name='passenger_total_ratings',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_score_sums, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userratingstats',
+            name='driver_average_rating',
+        ),
+        migrations.RemoveField(
+            model_name='userratingstats',
+            name='overall_average_rating',
+        ),
+        migrations.RemoveField(
+            model_name='userratingstats',
+            name='passenger_average_rating',
+        ),
+        migrations.RemoveField(
+            model_name='userratingstats',
+            name='total_ratings',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ratings', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        # Existing ratings were counted inline by rate_user
+        migrations.AddField(
+            model_name='rating',
+            name='in_stats',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='in_stats',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
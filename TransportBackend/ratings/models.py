@@ -1,7 +1,13 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Count, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from trips.models import Trip
+from .cache import invalidate_stats
 
 
 class Rating(models.Model):
@@ -24,66 +30,106 @@ class Rating(models.Model):
     cleanliness = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], null=True, blank=True)
     safety = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], null=True, blank=True)
 
+    # Set by the ratings.record_rating job once the score is added to UserRatingStats
+    in_stats = models.BooleanField(default=False, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('trip', 'rater', 'rated_user')
+        indexes = [
+            models.Index(fields=['rated_user', 'rating_type'], name='rating_rated_user_type_idx'),
+            models.Index(fields=['rated_user', 'created_at'], name='rating_rated_user_created_idx'),
+            models.Index(fields=['rater', 'created_at'], name='rating_rater_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.rater.username} → {self.rated_user.username} ({self.score}/5)"
 
 
+def rating_totals_expression(rating_type, total):
+    ratings = Rating.objects.filter(
+        rated_user=OuterRef('user_id'), rating_type=rating_type, in_stats=True
+    ).values('rated_user').annotate(total=total).values('total')
+    return Coalesce(Subquery(ratings), 0)
+
+
+class UserRatingStatsQuerySet(models.QuerySet):
+    def recompute(self):
+        # Counters rebuilt from the counted ratings for every row, in one UPDATE
+        # (the rebuild_rating_stats command does the same for the whole table)
+        user_ids = list(self.values_list('user_id', flat=True))
+        recomputed = self.model.objects.filter(user_id__in=user_ids).update(
+            updated_at=timezone.now(),
+            **{
+                f'{rating_type}_{field}': rating_totals_expression(rating_type, total)
+                for rating_type, _ in Rating.RATING_TYPES
+                for field, total in (('score_sum', Sum('score')), ('total_ratings', Count('id')))
+            }
+        )
+        transaction.on_commit(lambda: invalidate_stats(*user_ids))
+        return recomputed
+
+
 class UserRatingStats(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='rating_stats')
 
-    # Driver stats
-    driver_average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    driver_total_ratings = models.IntegerField(default=0)
+    # Running sums and counts per rating type, averages are derived from them
+    driver_score_sum = models.PositiveIntegerField(default=0)
+    driver_total_ratings = models.PositiveIntegerField(default=0)
 
-    # Passenger stats
-    passenger_average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    passenger_total_ratings = models.IntegerField(default=0)
-
-    # Overall stats
-    overall_average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    total_ratings = models.IntegerField(default=0)
+    passenger_score_sum = models.PositiveIntegerField(default=0)
+    passenger_total_ratings = models.PositiveIntegerField(default=0)
 
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = UserRatingStatsQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username} - Rating Stats"
 
-    def update_stats(self):
-        from django.db.models import Avg, Count
-
-        # Driver ratings
-        driver_ratings = Rating.objects.filter(rated_user=self.user, rating_type='driver')
-        driver_stats = driver_ratings.aggregate(
-            avg_rating=Avg('score'),
-            total_count=Count('id')
-        )
-
-        self.driver_average_rating = driver_stats['avg_rating'] or 0.00
-        self.driver_total_ratings = driver_stats['total_count']
-
-        # Passenger ratings
-        passenger_ratings = Rating.objects.filter(rated_user=self.user, rating_type='passenger')
-        passenger_stats = passenger_ratings.aggregate(
-            avg_rating=Avg('score'),
-            total_count=Count('id')
-        )
-
-        self.passenger_average_rating = passenger_stats['avg_rating'] or 0.00
-        self.passenger_total_ratings = passenger_stats['total_count']
-
-        # Overall stats
-        all_ratings = Rating.objects.filter(rated_user=self.user)
-        overall_stats = all_ratings.aggregate(
-            avg_rating=Avg('score'),
-            total_count=Count('id')
-        )
-
-        self.overall_average_rating = overall_stats['avg_rating'] or 0.00
-        self.total_ratings = overall_stats['total_count']
-
-        self.save()
+    @staticmethod
+    def _average(score_sum, count):
+        if not count:
+            return Decimal('0.00')
+        return (Decimal(score_sum) / count).quantize(Decimal('0.01'))
+
+    @property
+    def driver_average_rating(self):
+        return self._average(self.driver_score_sum, self.driver_total_ratings)
+
+    @property
+    def passenger_average_rating(self):
+        return self._average(self.passenger_score_sum, self.passenger_total_ratings)
+
+    @property
+    def total_ratings(self):
+        return self.driver_total_ratings + self.passenger_total_ratings
+
+    @property
+    def overall_average_rating(self):
+        return self._average(self.driver_score_sum + self.passenger_score_sum, self.total_ratings)
+
+    @classmethod
+    def record_ratings(cls, rating_ids):
+        # Add not yet counted ratings to the counters, one UPDATE per rated user.
+        # Must run inside a transaction; in_stats makes it safe to call twice for a rating.
+        # F() expressions keep concurrent updates of the same user from clobbering each other.
+        ratings = Rating.objects.select_for_update().filter(id__in=rating_ids, in_stats=False)
+        totals = {}
+        for user_id, rating_type, score in ratings.values_list('rated_user_id', 'rating_type', 'score'):
+            user_totals = totals.setdefault(user_id, {})
+            user_totals[f'{rating_type}_score_sum'] = user_totals.get(f'{rating_type}_score_sum', 0) + score
+            user_totals[f'{rating_type}_total_ratings'] = user_totals.get(f'{rating_type}_total_ratings', 0) + 1
+        if not totals:
+            return
+
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in totals], ignore_conflicts=True)
+        now = timezone.now()
+        for user_id, user_totals in totals.items():
+            cls.objects.filter(user_id=user_id).update(
+                updated_at=now,
+                **{field: F(field) + value for field, value in user_totals.items()}
+            )
+        Rating.objects.filter(id__in=rating_ids, in_stats=False).update(in_stats=True)
+        transaction.on_commit(lambda: invalidate_stats(*totals))
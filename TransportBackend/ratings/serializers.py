@@ -1,13 +1,16 @@
 from rest_framework import serializers
 from .models import Rating, UserRatingStats
-from users.serializers import UserSerializer
-from trips.serializers import TripSerializer
+from users.serializers import UserSerializer, UserSummarySerializer
+from trips.serializers import TripSerializer, TripSummarySerializer
+from transport_app.serializers import ExpandableFieldsMixin, TimedSerializerMixin
 
 
-class RatingSerializer(serializers.ModelSerializer):
-    rater = UserSerializer(read_only=True)
-    rated_user = UserSerializer(read_only=True)
-    trip = TripSerializer(read_only=True)
+class RatingSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'trip': (TripSummarySerializer, TripSerializer),
+        'rater': (UserSummarySerializer, UserSerializer),
+        'rated_user': (UserSummarySerializer, UserSerializer),
+    }
 
     class Meta:
         model = Rating
@@ -17,7 +20,7 @@ class RatingSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'rater', 'created_at')
 
 
-class RatingCreateSerializer(serializers.ModelSerializer):
+class RatingCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Rating
         fields = ('score', 'comment', 'punctuality', 'communication',
@@ -29,8 +32,12 @@ class RatingCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class UserRatingStatsSerializer(serializers.ModelSerializer):
+class UserRatingStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    driver_average_rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    passenger_average_rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    overall_average_rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    total_ratings = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = UserRatingStats
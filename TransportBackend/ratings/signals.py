@@ -0,0 +1,13 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .cache import invalidate_stats
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, **kwargs):
+    # Cached stats embed the user's profile
+    if not created:
+        user_id = instance.pk
+        transaction.on_commit(lambda: invalidate_stats(user_id))
@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from communities.models import Community
+from trips.models import Trip
+from users.models import User, Vehicle
+from users.tokens import UserRefreshToken
+from .cache import _build_entry, stats_cache_key
+from .models import Rating, UserRatingStats
+
+
+def create_user(name, **fields):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, password='password', first_name=name, last_name='Test',
+        **fields
+    )
+
+
+class RatingAPITestCase(TestCase):
+    # A passenger of a completed trip, authenticated, and its driver
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_user('driver', user_type='driver')
+        cls.passenger = create_user('passenger')
+        community = Community.objects.create(
+            name='Bureau', description='Trajets du bureau', community_type='work', location='Paris',
+            creator=cls.driver
+        )
+        vehicle = Vehicle.objects.create(owner=cls.driver, brand='Renault', model='Clio', year=2020,
+                                         color='bleu', license_plate='AA-001-AA')
+        departure = timezone.now() - timedelta(days=1)
+        cls.trip = Trip.objects.create(
+            driver=cls.driver, vehicle=vehicle, community=community,
+            departure_location='Paris', arrival_location='Lyon', departure_time=departure,
+            estimated_arrival_time=departure + timedelta(hours=4), available_seats=4, status='completed'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = UserRefreshToken.for_user(self.passenger).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+class RatingStatsTests(RatingAPITestCase):
+
+    def get_stats(self):
+        response = self.client.get(f'/api/ratings/user/{self.driver.pk}/stats/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_recorded_rating_is_served_without_a_shared_cache(self):
+        self.assertEqual(self.get_stats().json()['driver_total_ratings'], 0)
+        # The job worker records ratings in its own process: its invalidation
+        # never reaches an entry another process kept in its local memory cache
+        cache.set(stats_cache_key(self.driver.pk), _build_entry(UserRatingStats(user=self.driver)))
+        rating = Rating.objects.create(
+            trip=self.trip, rater=self.passenger, rated_user=self.driver, rating_type='driver', score=4
+        )
+        with transaction.atomic():
+            UserRatingStats.record_ratings([rating.pk])
+
+        stats = self.get_stats().json()
+        self.assertEqual(stats['driver_total_ratings'], 1)
+        self.assertEqual(stats['driver_average_rating'], '4.00')
+
+    def test_profile_edit_changes_the_validators(self):
+        etag = self.get_stats()['ETag']
+        self.assertEqual(self.client.get(
+            f'/api/ratings/user/{self.driver.pk}/stats/', HTTP_IF_NONE_MATCH=etag
+        ).status_code, 304)
+
+        self.driver.first_name = 'Renamed'
+        self.driver.save()
+        response = self.client.get(f'/api/ratings/user/{self.driver.pk}/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['user']['first_name'], 'Renamed')
+
+
+class RatingShapeTests(RatingAPITestCase):
+    # Ratings embed compact trip and user summaries unless ?expand= asks for more
+
+    def test_compact_by_default(self):
+        Rating.objects.create(
+            trip=self.trip, rater=self.passenger, rated_user=self.driver, rating_type='driver', score=4
+        )
+        response = self.client.get('/api/ratings/my-ratings/?type=given')
+        self.assertEqual(response.status_code, 200, response.content)
+        rating, = response.json()['results']
+        self.assertEqual(set(rating['trip']), {
+            'id', 'driver', 'vehicle', 'departure_location', 'arrival_location', 'departure_time',
+            'estimated_arrival_time', 'available_seats', 'remaining_seats', 'price_per_seat', 'status',
+        })
+        user_summary = {'id', 'username', 'first_name', 'last_name', 'profile_picture'}
+        self.assertEqual(set(rating['rater']), user_summary)
+        self.assertEqual(set(rating['rated_user']), user_summary)
+
+        expanded = self.client.get('/api/ratings/my-ratings/?type=given&expand=trip')
+        self.assertIn('community', expanded.json()['results'][0]['trip'])
+        self.assertLess(len(response.content), len(expanded.content))
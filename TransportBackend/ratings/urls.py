@@ -1,9 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+if settings.ASYNC_READ_VIEWS:
+    user_rating_stats = async_views.user_rating_stats
+    user_rating_stats_batch = async_views.user_rating_stats_batch
+else:
+    user_rating_stats = views.UserRatingStatsView.as_view()
+    user_rating_stats_batch = views.UserRatingStatsBatchView.as_view()
 
 urlpatterns = [
     path('trip/<int:trip_id>/user/<int:user_id>/', views.rate_user, name='rate-user'),
     path('user/<int:user_id>/', views.UserRatingsView.as_view(), name='user-ratings'),
-    path('user/<int:user_id>/stats/', views.UserRatingStatsView.as_view(), name='user-rating-stats'),
+    path('user/<int:user_id>/stats/', user_rating_stats, name='user-rating-stats'),
+    path('stats/', user_rating_stats_batch, name='user-rating-stats-batch'),
     path('my-ratings/', views.MyRatingsView.as_view(), name='my-ratings'),
 ]
@@ -1,18 +1,35 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from django.contrib.auth import get_user_model
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db import IntegrityError, transaction
 from django.db.models import Q
-from .models import Rating, UserRatingStats
+from .cache import get_stats_entries
+from .models import Rating
 from .serializers import RatingSerializer, RatingCreateSerializer, UserRatingStatsSerializer
-from trips.models import Trip, Booking
+from trips.models import Trip, Booking, with_trip
+from jobs.queue import enqueue
+from transport_app.serializers import expanded_fields
+from transport_app.pagination import CreatedKeysetPagination
+
+
+def with_ratings_relations(queryset, request):
+    return with_trip(
+        queryset.select_related('rater', 'rated_user'),
+        request.user,
+        full='trip' in expanded_fields(request)
+    )
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def rate_user(request, trip_id, user_id):
     trip = get_object_or_404(Trip, pk=trip_id)
-    rated_user = get_object_or_404('users.User', pk=user_id)
+    rated_user = get_object_or_404(get_user_model(), pk=user_id)
     rater = request.user
 
     # Check if trip is completed
@@ -51,16 +68,21 @@ def rate_user(request, trip_id, user_id):
 
     serializer = RatingCreateSerializer(data=request.data)
     if serializer.is_valid():
-        rating = serializer.save(
-            trip=trip,
-            rater=rater,
-            rated_user=rated_user,
-            rating_type=rating_type
-        )
-
-        # Update user rating stats
-        stats, created = UserRatingStats.objects.get_or_create(user=rated_user)
-        stats.update_stats()
+        try:
+            with transaction.atomic():
+                rating = serializer.save(
+                    trip=trip,
+                    rater=rater,
+                    rated_user=rated_user,
+                    rating_type=rating_type
+                )
+                # Stats are updated by the job worker, committed together with the rating
+                enqueue('ratings.record_rating', {'rating_id': rating.id}, key=f'rating:{rating.id}')
+        except IntegrityError:
+            return Response(
+                {'error': 'Vous avez déjà évalué cette personne pour ce trajet'},
+                status=status.HTTP_409_CONFLICT
+            )
 
         return Response(
             RatingSerializer(rating).data,
@@ -73,6 +95,7 @@ def rate_user(request, trip_id, user_id):
 class UserRatingsView(generics.ListAPIView):
     serializer_class = RatingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedKeysetPagination
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
@@ -83,30 +106,78 @@ class UserRatingsView(generics.ListAPIView):
         if rating_type in ['driver', 'passenger']:
             queryset = queryset.filter(rating_type=rating_type)
 
-        return queryset.order_by('-created_at')
+        return with_ratings_relations(queryset, self.request).order_by('-created_at')
 
 
 class UserRatingStatsView(generics.RetrieveAPIView):
     serializer_class = UserRatingStatsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_object(self):
+    def retrieve(self, request, *args, **kwargs):
         user_id = self.kwargs['user_id']
-        stats, created = UserRatingStats.objects.get_or_create(user_id=user_id)
-        if created:
-            stats.update_stats()
-        return stats
+        entry = get_stats_entries([user_id]).get(user_id)
+        if entry is None:
+            raise Http404
+        return stats_response(request, entry)
+
+
+def stats_response(request, entry):
+    response = Response(entry['data'])
+    response['ETag'] = entry['etag']
+    if entry['last_modified'] is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = 'private, no-cache'
+    # 304 straight from the cached validators, without touching the database
+    return get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+        response=response
+    )
+
+
+class UserRatingStatsBatchView(generics.GenericAPIView):
+    serializer_class = UserRatingStatsSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_users = 100
+
+    def get(self, request, *args, **kwargs):
+        user_ids, error = batch_user_ids(request, self.max_users)
+        if error:
+            return error
+        entries = get_stats_entries(user_ids)
+        return Response([entries[user_id]['data'] for user_id in user_ids if user_id in entries])
+
+
+def batch_user_ids(request, max_users):
+    # (user ids, None) or (None, error response) for ?users=1,2,3
+    try:
+        user_ids = [int(value) for value in request.query_params.get('users', '').split(',') if value]
+    except ValueError:
+        return None, Response(
+            {'error': 'Le paramètre users doit être une liste d\'identifiants séparés par des virgules'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    user_ids = list(dict.fromkeys(user_ids))
+    if len(user_ids) > max_users:
+        return None, Response(
+            {'error': f'Au maximum {max_users} utilisateurs par requête'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return user_ids, None
 
 
 class MyRatingsView(generics.ListAPIView):
     serializer_class = RatingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
         rating_type = self.request.query_params.get('type', 'received')
 
         if rating_type == 'given':
-            return Rating.objects.filter(rater=user).order_by('-created_at')
+            queryset = Rating.objects.filter(rater=user)
         else:
-            return Rating.objects.filter(rated_user=user).order_by('-created_at')
+            queryset = Rating.objects.filter(rated_user=user)
+        return with_ratings_relations(queryset, self.request).order_by('-created_at')
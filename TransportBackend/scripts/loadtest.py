@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""Compare the WSGI and ASGI deployments on the async read endpoints.
+
+Start both servers against the same database, e.g.
+
+    gunicorn transport_app.wsgi -w 4 -b :8000
+    ASYNC_READ_VIEWS=true uvicorn transport_app.asgi:application --workers 4 --port 8001
+
+then run
+
+    python scripts/loadtest.py --target wsgi=http://localhost:8000 --target asgi=http://localhost:8001 \\
+        --email driver@example.com --password secret --community 1 --user 1
+
+Only the standard library is used; each concurrency level keeps that many
+requests in flight for --duration seconds per endpoint.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def login(base_url, email, password):
+    request = urllib.request.Request(
+        f"{base_url}/api/auth/login/",
+        data=json.dumps({'email': email, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)['access']
+
+
+def endpoints(args):
+    paths = {
+        'trip-search': f"/api/trips/search/?origin_lat={args.lat}&origin_lng={args.lng}&origin_radius=20",
+        'my-trips': "/api/trips/my-trips/",
+        'community-list': "/api/communities/",
+        'rating-stats': f"/api/ratings/user/{args.user}/stats/",
+    }
+    if args.community:
+        paths['community-stats'] = f"/api/communities/{args.community}/stats/"
+    return paths
+
+
+def run_level(url, token, concurrency, duration):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        nonlocal errors
+        request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                failed = False
+            except (urllib.error.URLError, TimeoutError):
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+
+    latencies.sort()
+    result = {'requests': len(latencies), 'errors': errors, 'rps': len(latencies) / duration}
+    if latencies:
+        result['p50_ms'] = statistics.median(latencies) * 1000
+        result['p95_ms'] = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True,
+                        help="name=base_url, repeat for each deployment to compare")
+    parser.add_argument('--token', help="Access token (otherwise --email/--password log in on each target)")
+    parser.add_argument('--email')
+    parser.add_argument('--password')
+    parser.add_argument('--concurrency', default='1,10,50,100',
+                        help="Comma separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per endpoint and level")
+    parser.add_argument('--lat', type=float, default=48.8566)
+    parser.add_argument('--lng', type=float, default=2.3522)
+    parser.add_argument('--user', type=int, default=1, help="User whose rating stats are requested")
+    parser.add_argument('--community', type=int, help="Community for the stats endpoint (caller must be a member)")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    results = []
+    print(f"{'target':<8} {'endpoint':<16} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for target in args.target:
+        name, base_url = target.split('=', 1)
+        base_url = base_url.rstrip('/')
+        token = args.token or login(base_url, args.email, args.password)
+        for endpoint, path in endpoints(args).items():
+            for concurrency in levels:
+                result = run_level(base_url + path, token, concurrency, args.duration)
+                result.update(target=name, endpoint=endpoint, concurrency=concurrency)
+                results.append(result)
+                print(f"{name:<8} {endpoint:<16} {concurrency:>5} {result['rps']:>9.1f} "
+                      f"{result.get('p50_ms', 0):>9.1f} {result.get('p95_ms', 0):>9.1f} {result['errors']:>7}")
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
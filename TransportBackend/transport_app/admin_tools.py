@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_rows(model, using):
+    # Row count from the table statistics, None where the database keeps none
+    connection = connections[using]
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] else None
+
+
+class EstimatedCountPaginator(Paginator):
+    # Counts at most ADMIN_EXACT_COUNT_LIMIT rows. Past that, an unfiltered
+    # list shows the table statistics and a filtered one stops at the limit,
+    # instead of a COUNT(*) over millions of rows on every page.
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        counted = queryset.order_by().values('pk')[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate and estimate > limit:
+                return estimate
+        return limit
+
+
+class LargeTableAdmin:
+    # Mixin for the ModelAdmin of tables expected to hold millions of rows
+    paginator = EstimatedCountPaginator
+    # The "N total" link runs an unbounded COUNT(*) of the whole table
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class RelatedIdFilter(admin.SimpleListFilter):
+    # Filter on a foreign key typed in as an id: the default related filter
+    # renders every row of the related table in the sidebar. Subclasses set
+    # title and parameter_name, the lookup of the id (e.g. 'trip__community_id').
+    template = 'admin/related_id_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def value(self):
+        value = super().value()
+        return int(value) if value and value.isdigit() else None
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(**{self.parameter_name: self.value()})
+
+    def choices(self, changelist):
+        yield {
+            'parameter_name': self.parameter_name,
+            'value': self.value() or '',
+            'hidden': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+            'reset_url': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+
+def in_batches(queryset, batch_size=1000):
+    # Querysets of at most batch_size rows covering an admin selection, which
+    # "select all" can make as large as the table. Keyset walk on the primary key.
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield queryset.model._default_manager.filter(pk__in=ids)
+        if len(ids) < batch_size:
+            return
+        last_id = ids[-1]
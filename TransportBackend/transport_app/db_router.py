@@ -0,0 +1,159 @@
+import contextvars
+import hashlib
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import shared_cache
+
+# Database the reads of the current request may use. Only set by
+# ReplicaRoutingMiddleware, so jobs, commands and the shell always use the primary.
+_read_database = contextvars.ContextVar('read_database', default=None)
+# Whether the current request comes from a client pinned to the primary
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+
+PIN_COOKIE = 'replica_pin'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_aliases():
+    return [alias for alias in connections if alias != 'default']
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from the database their parent was read from
+            return instance._state.db
+        alias = _read_database.get()
+        # Inside a transaction (select_for_update, read-then-write) reads stay on the primary
+        if alias is None or connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def reads_pinned():
+    # Pinned clients must not be served data cached from a replica read either
+    return _pinned.get()
+
+
+def _pin_key(request):
+    # Clients are told apart by their credentials: the middleware runs before
+    # the view has authenticated the user
+    header = request.headers.get('Authorization')
+    if not header:
+        return None
+    return 'replica:pin:' + hashlib.sha256(header.encode()).hexdigest()[:32]
+
+
+def _url_name(request):
+    try:
+        return resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    # GET requests to REPLICA_READ_URL_NAMES read from a random replica, unless
+    # the client wrote less than REPLICA_PIN_SECONDS ago: it then stays on the
+    # primary so it sees its own writes. The pin travels in a signed cookie,
+    # and is also kept in the cache when it is shared between processes, for
+    # clients that send no cookies.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replicas = replica_aliases()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.replicas:
+            return self.get_response(request)
+        pin_key = _pin_key(request)
+        pinned = self.may_use_replica(request) and (
+            self.pinned_by_cookie(request) or bool(self.cached_pin_key(pin_key) and cache.get(pin_key))
+        )
+        tokens = _read_database.set(self.read_database(request, pinned)), _pinned.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_database.reset(tokens[0])
+            _pinned.reset(tokens[1])
+        if self.wrote(request, response):
+            self.pin_cookie(response)
+            if self.cached_pin_key(pin_key):
+                cache.set(pin_key, True, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not self.replicas:
+            return await self.get_response(request)
+        pin_key = _pin_key(request)
+        pinned = self.may_use_replica(request) and (
+            self.pinned_by_cookie(request) or bool(self.cached_pin_key(pin_key) and await cache.aget(pin_key))
+        )
+        tokens = _read_database.set(self.read_database(request, pinned)), _pinned.set(pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_database.reset(tokens[0])
+            _pinned.reset(tokens[1])
+        if self.wrote(request, response):
+            self.pin_cookie(response)
+            if self.cached_pin_key(pin_key):
+                await cache.aset(pin_key, True, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def may_use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        if not hasattr(request, '_replica_url_name'):
+            request._replica_url_name = _url_name(request)
+        return request._replica_url_name in settings.REPLICA_READ_URL_NAMES
+
+    def read_database(self, request, pinned):
+        if pinned or not self.may_use_replica(request):
+            return None
+        return random.choice(self.replicas)
+
+    def cached_pin_key(self, pin_key):
+        # A per-process cache would lose the pin whenever the next request
+        # lands on another worker
+        return pin_key if pin_key and shared_cache.is_shared() else None
+
+    def pinned_by_cookie(self, request):
+        return request.get_signed_cookie(
+            PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=settings.REPLICA_PIN_SECONDS
+        ) is not None
+
+    def pin_cookie(self, response):
+        samesite = settings.REPLICA_PIN_COOKIE_SAMESITE
+        response.set_signed_cookie(
+            PIN_COOKIE, '1', salt=PIN_COOKIE, max_age=settings.REPLICA_PIN_SECONDS,
+            # Browsers drop SameSite=None cookies that are not Secure
+            secure=not settings.DEBUG or samesite == 'None', httponly=True, samesite=samesite
+        )
+
+    def wrote(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400
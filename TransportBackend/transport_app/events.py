@@ -0,0 +1,158 @@
+import asyncio
+import functools
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Events are published on named channels (e.g. 'trip:12', 'user:3') and
+# streamed to the clients subscribed to them as Server-Sent Events. Without
+# REDIS_URL they only reach the clients connected to the publishing process;
+# with it every process relays the events of the Redis channel below.
+REDIS_CHANNEL = 'transport:events'
+# Milliseconds EventSource waits before reconnecting
+RETRY_MS = 3000
+
+
+def format_event(event_type, data):
+    # Serialized once, whatever the number of clients it is sent to
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'event: {event_type}\ndata: {payload}\n\n'
+
+
+def publish(events):
+    # events: (channels, event type, data) tuples. Sent once the transaction
+    # commits, so clients never hear of a change that is rolled back.
+    items = [(list(channels), format_event(event_type, data)) for channels, event_type, data in events]
+    if items:
+        transaction.on_commit(lambda: _send(items))
+
+
+@functools.lru_cache(maxsize=None)
+def _redis_client():
+    import redis
+
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def _send(items):
+    if not settings.REDIS_URL:
+        broker.dispatch(items)
+        return
+    try:
+        _redis_client().publish(REDIS_CHANNEL, json.dumps(items))
+    except Exception:
+        # Clients catch up when they reconnect, the write itself succeeded
+        logger.exception("Could not publish %s events to Redis", len(items))
+
+
+class Subscription:
+    def __init__(self, channels):
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            # Too slow to keep up: the stream ends rather than buffering
+            # without bound, EventSource reconnects and the client reloads
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = None
+        self.queue.put_nowait(message)
+
+
+class Broker:
+    # In-process fan-out: publishing costs one dict lookup per channel, and
+    # idle clients nothing but their keepalive
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._relay = None
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        if settings.REDIS_URL and (self._relay is None or self._relay.done()):
+            self._relay = asyncio.ensure_future(self._relay_from_redis())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._channels.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._channels[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._channels.values()))
+
+    def dispatch(self, items):
+        # May be called from any thread
+        for channels, message in items:
+            with self._lock:
+                subscriptions = {
+                    subscription for channel in channels for subscription in self._channels.get(channel, ())
+                }
+            for subscription in subscriptions:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+                except RuntimeError:
+                    # Its event loop is closed
+                    self.unsubscribe(subscription)
+
+    async def _relay_from_redis(self):
+        import redis.asyncio as redis
+
+        client = redis.from_url(settings.REDIS_URL)
+        while True:
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(REDIS_CHANNEL)
+                async for item in pubsub.listen():
+                    if item['type'] == 'message':
+                        self.dispatch(json.loads(item['data']))
+            except Exception:
+                logger.exception("Event relay from Redis interrupted, resubscribing")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+
+broker = Broker()
+
+
+async def stream(channels):
+    # Server-Sent Events body for the given channels. Ends after
+    # EVENTS_STREAM_SECONDS: Django 4.2 does not notice a client that went
+    # away, this bounds how long its subscription outlives it.
+    subscription = broker.subscribe(channels)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENTS_STREAM_SECONDS
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), min(settings.EVENTS_KEEPALIVE_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,315 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+from .listing_cache import cache_metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets (Prometheus 'le' labels)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Stats of the request being served. Context variables follow the request into
+# sync_to_async() threads, so queries run by concurrently() are counted too.
+_current = contextvars.ContextVar('request_stats', default=None)
+# Set while a serializer is being timed, so nested serializers are not counted twice
+_serializing = contextvars.ContextVar('serializing', default=False)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_ms = 0.0
+        self.serialize_ms = 0.0
+        self.render_ms = 0.0
+        self.queries = Counter()
+        self.lock = threading.Lock()
+
+    def add_query(self, sql, duration_ms):
+        with self.lock:
+            self.query_count += 1
+            self.query_ms += duration_ms
+            self.queries[sql] += 1
+
+    def add_serialize(self, duration_ms):
+        with self.lock:
+            self.serialize_ms += duration_ms
+
+    def add_render(self, duration_ms):
+        with self.lock:
+            self.render_ms += duration_ms
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # Parameters are left out so the same query with other values is grouped
+        stats.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_wrapper, dispatch_uid='instrumentation_query_wrapper')
+
+
+@contextmanager
+def timed_serialization():
+    # Time spent building the response data (serializer.data). Queries run by
+    # lazy relations meanwhile are left out: they are already counted in sql.
+    stats = _current.get()
+    if stats is None or _serializing.get():
+        yield
+        return
+    token = _serializing.set(True)
+    query_ms = stats.query_ms
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _serializing.reset(token)
+        stats.add_serialize(max(elapsed_ms - (stats.query_ms - query_ms), 0.0))
+
+
+def record_render(duration_ms):
+    stats = _current.get()
+    if stats is not None:
+        stats.add_render(duration_ms)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+
+    def samples(self):
+        # Cumulative counts as Prometheus expects them
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield str(bound), cumulative
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_ms = 0.0
+        self.serialize_ms = 0.0
+        self.render_ms = 0.0
+        self.slow = 0
+
+
+# Aggregated per process: every worker exposes its own numbers
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _observe(endpoint, stats, total_ms, slow):
+    with _metrics_lock:
+        metrics = _metrics.get(endpoint)
+        if metrics is None:
+            metrics = _metrics[endpoint] = EndpointMetrics()
+        metrics.latency.observe(total_ms)
+        metrics.queries.observe(stats.query_count)
+        metrics.query_ms += stats.query_ms
+        metrics.serialize_ms += stats.serialize_ms
+        metrics.render_ms += stats.render_ms
+        if slow:
+            metrics.slow += 1
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.url_name or 'unnamed'
+
+
+def server_timing(stats, total_ms):
+    app_ms = max(total_ms - stats.query_ms - stats.serialize_ms - stats.render_ms, 0.0)
+    return ', '.join([
+        f'sql;dur={stats.query_ms:.1f};desc="{stats.query_count} queries"',
+        f'app;dur={app_ms:.1f}',
+        f'serialize;dur={stats.serialize_ms:.1f}',
+        f'render;dur={stats.render_ms:.1f}',
+        f'total;dur={total_ms:.1f}',
+    ])
+
+
+def is_slow(stats, total_ms):
+    return (
+        total_ms >= settings.SLOW_REQUEST_MS
+        or stats.query_count >= settings.SLOW_REQUEST_QUERIES
+    )
+
+
+def log_slow_request(request, endpoint, stats, total_ms):
+    repeated = [(sql, count) for sql, count in stats.queries.most_common(5) if count > 1]
+    lines = [
+        f'Slow request {request.method} {request.path} ({endpoint}): '
+        f'{total_ms:.0f} ms, {stats.query_count} queries in {stats.query_ms:.0f} ms, '
+        f'serialize {stats.serialize_ms:.0f} ms, render {stats.render_ms:.0f} ms'
+    ]
+    lines += [f'  {count}x {sql[:300]}' for sql, count in repeated]
+    logger.warning('\n'.join(lines))
+
+
+class InstrumentationMiddleware:
+    # Outermost middleware: measures the whole request, including the other
+    # middlewares, and labels it with the URL name it resolved to.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            _install_wrapper(None, connection)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = self.start(request)
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = self.start(request)
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def start(self, request):
+        # Also kept on the request for callers of the test client (benchmarks)
+        request.request_stats = RequestStats()
+        return request.request_stats
+
+    def finish(self, request, response, stats):
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        endpoint = endpoint_name(request)
+        slow = is_slow(stats, total_ms)
+        if endpoint != 'metrics':
+            _observe(endpoint, stats, total_ms, slow)
+        if slow:
+            log_slow_request(request, endpoint, stats, total_ms)
+        if settings.SERVER_TIMING_HEADER:
+            # Streamed bodies are produced after this point and are not included
+            response['Server-Timing'] = server_timing(stats, total_ms)
+        return response
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_metrics():
+    lines = []
+
+    def histogram(name, help_text, attribute, scale):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, metrics in snapshot:
+            label = _escape(endpoint)
+            hist = getattr(metrics, attribute)
+            for bound, count in hist.samples():
+                le = bound if bound == '+Inf' else f'{float(bound) * scale:g}'
+                lines.append(f'{name}_bucket{{endpoint="{label}",le="{le}"}} {count}')
+            lines.append(f'{name}_sum{{endpoint="{label}"}} {hist.total * scale:g}')
+            lines.append(f'{name}_count{{endpoint="{label}"}} {sum(hist.counts)}')
+
+    def counter(name, help_text, value_of):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, metrics in snapshot:
+            lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {value_of(metrics):g}')
+
+    with _metrics_lock:
+        snapshot = sorted(
+            (endpoint, _copy(metrics)) for endpoint, metrics in _metrics.items()
+        )
+
+    histogram('http_request_duration_seconds', 'Request latency by URL name.', 'latency', 0.001)
+    histogram('http_request_sql_queries', 'SQL queries per request by URL name.', 'queries', 1)
+    counter('http_request_sql_seconds_total', 'Time spent in SQL by URL name.', lambda m: m.query_ms / 1000)
+    counter('http_request_serialize_seconds_total', 'Time spent in serializers outside SQL by URL name.', lambda m: m.serialize_ms / 1000)
+    counter('http_request_render_seconds_total', 'Time spent encoding responses by URL name.', lambda m: m.render_ms / 1000)
+    counter('http_slow_requests_total', 'Requests over the slow request thresholds.', lambda m: m.slow)
+
+    listing = cache_metrics()
+    lines.append('# HELP listing_cache_requests_total Listing cache lookups by outcome.')
+    lines.append('# TYPE listing_cache_requests_total counter')
+    for namespace, values in listing.items():
+        for outcome in ('hits', 'misses'):
+            lines.append(
+                f'listing_cache_requests_total{{namespace="{namespace}",outcome="{outcome}"}} {values[outcome]}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def _copy(metrics):
+    copied = EndpointMetrics()
+    for attribute in ('latency', 'queries'):
+        source, target = getattr(metrics, attribute), getattr(copied, attribute)
+        target.counts = list(source.counts)
+        target.total = source.total
+    copied.query_ms = metrics.query_ms
+    copied.serialize_ms = metrics.serialize_ms
+    copied.render_ms = metrics.render_ms
+    copied.slow = metrics.slow
+    return copied
+
+
+def metrics_view(request):
+    # Prometheus scrape endpoint. Without METRICS_TOKEN it is only served in DEBUG.
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            raise Http404
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,133 @@
+import copy
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from . import shared_cache
+from .db_router import reads_pinned
+
+# Listings are cached under keys that embed the current version of every scope
+# they depend on. Invalidating bumps a version: old entries are never read
+# again and simply expire. A scope is e.g. 'trips' (every trip listing),
+# 'trips:community:3' or 'communities'.
+METRICS_NAMESPACES = ('trips', 'communities')
+
+
+def _version_key(scope):
+    return f'listing:version:{scope}'
+
+
+def _metric_key(namespace, outcome):
+    return f'listing:metrics:{namespace}:{outcome}'
+
+
+def get_versions(scopes):
+    keys = {_version_key(scope): scope for scope in scopes}
+    versions = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    for scope in scopes:
+        if scope not in versions:
+            # Start from the clock so a version lost to eviction never comes back
+            cache.add(_version_key(scope), time.time_ns(), timeout=None)
+            versions[scope] = cache.get(_version_key(scope))
+    return [versions[scope] for scope in scopes]
+
+
+def invalidate(*scopes):
+    # Bumped once the transaction commits, so a listing can't be cached from
+    # data the write is still about to change
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.add(_version_key(scope), time.time_ns(), timeout=None)
+
+
+def normalized_params(request, names):
+    # Only the parameters the view understands, stripped and in a fixed order,
+    # so spelling variants and junk parameters share one entry
+    params = {}
+    for name in names:
+        value = request.query_params.get(name, '').strip()
+        if value:
+            params[name] = value.lower() if value.lower() in ('true', 'false') else value
+    return params
+
+
+def _record(namespace, outcome):
+    try:
+        cache.incr(_metric_key(namespace, outcome))
+    except ValueError:
+        cache.add(_metric_key(namespace, outcome), 0, timeout=None)
+        cache.incr(_metric_key(namespace, outcome))
+
+
+def cache_metrics():
+    # {namespace: {'hits': n, 'misses': n, 'hit_ratio': r}}
+    keys = [_metric_key(ns, outcome) for ns in METRICS_NAMESPACES for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    metrics = {}
+    for namespace in METRICS_NAMESPACES:
+        hits = values.get(_metric_key(namespace, 'hits'), 0)
+        misses = values.get(_metric_key(namespace, 'misses'), 0)
+        total = hits + misses
+        metrics[namespace] = {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+    return metrics
+
+
+def reset_cache_metrics():
+    cache.delete_many([_metric_key(ns, outcome) for ns in METRICS_NAMESPACES for outcome in ('hits', 'misses')])
+
+
+class CachedListMixin:
+    # Caches the list response of a generic view per normalized query. The cached
+    # copy has the user-specific fields cleared by strip_user_fields(); every
+    # response is completed for the requesting user by add_user_fields().
+    cache_namespace = None
+    cache_params = ()
+
+    def get_cache_scopes(self, params):
+        return [self.cache_namespace]
+
+    def strip_user_fields(self, results):
+        raise NotImplementedError
+
+    def add_user_fields(self, results):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        timeout = settings.LISTING_CACHE_TIMEOUT
+        # The versions only reach every worker through a shared cache: with the
+        # local memory cache a write in one worker would leave the others' pages
+        # stale. A client pinned to the primary after a write could otherwise get
+        # a page cached from a replica that had not caught up with it.
+        if timeout <= 0 or not shared_cache.is_shared() or reads_pinned():
+            return super().list(request, *args, **kwargs)
+
+        params = normalized_params(request, self.cache_params)
+        scopes = self.get_cache_scopes(params)
+        # The versions are read before the database so a concurrent write can
+        # only leave a stale entry under a version that is already outdated
+        identity = json.dumps([request.get_host(), params, scopes, get_versions(scopes)], sort_keys=True)
+        key = f'listing:{self.cache_namespace}:{hashlib.md5(identity.encode()).hexdigest()}'
+
+        data = cache.get(key)
+        if data is not None:
+            _record(self.cache_namespace, 'hits')
+            self.add_user_fields(data['results'] if isinstance(data, dict) else data)
+            return Response(data)
+
+        _record(self.cache_namespace, 'misses')
+        response = super().list(request, *args, **kwargs)
+        shared = copy.deepcopy(response.data)
+        self.strip_user_fields(shared['results'] if isinstance(shared, dict) else shared)
+        cache.set(key, shared, timeout=timeout)
+        return response
@@ -0,0 +1,171 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination as BasePageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from .async_views import concurrently
+
+
+class PageNumberPagination(BasePageNumberPagination):
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # DRF's page number pagination for async views. For a numeric page the
+        # COUNT and the page query run concurrently.
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = request.query_params.get(self.page_query_param) or 1
+        rows = None
+        if str(page_number).isdigit() and int(page_number) > 0:
+            offset = (int(page_number) - 1) * page_size
+            paginator.count, rows = await concurrently(
+                queryset.count, lambda: list(queryset[offset:offset + page_size])
+            )
+        else:
+            # "last" needs the count first
+            paginator.count, = await concurrently(queryset.count)
+            page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        if rows is None:
+            rows = [row async for row in self.page.object_list]
+        self.page.object_list = rows
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return rows
+
+
+class KeysetPagination(BasePagination):
+    # Cursor pagination on (ordering field, id): every page is an index range
+    # scan with a LIMIT, so page 5000 costs the same as page 1. Unlike DRF's
+    # CursorPagination the id tiebreaker is part of the key, no OFFSET is ever used.
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    # ?count=false skips the COUNT(*) over the whole filtered set
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.page_queryset(queryset, request)
+        if self.wants_count(request):
+            self.count = queryset.count()
+        return self.finish_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same page for async views; the COUNT and the page query run concurrently
+        page = self.page_queryset(queryset, request)
+        if self.wants_count(request):
+            self.count, rows = await concurrently(queryset.count, lambda: list(page))
+        else:
+            rows = [row async for row in page]
+        return self.finish_page(rows)
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, 'true').lower() != 'false'
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field = self.ordering[0].lstrip('-')
+        self.descending = self.ordering[0].startswith('-')
+        self.count = None
+
+        self.current_position, self.backwards = self.decode_cursor(request, queryset.model)
+        descending = self.descending != self.backwards
+        if self.current_position is not None:
+            queryset = queryset.filter(self.after(self.current_position, descending))
+        return queryset.order_by(*self.order_by(descending))[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.backwards:
+            rows.reverse()
+
+        if self.backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, self.current_position is not None
+        self.next_position = self.position(rows[-1]) if rows and has_next else None
+        self.previous_position = self.position(rows[0]) if rows and has_previous else None
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.build_link(self.next_position, backwards=False)
+        payload['previous'] = self.build_link(self.previous_position, backwards=True)
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def after(self, position, descending):
+        value, pk = position
+        op = 'lt' if descending else 'gt'
+        # The leading inclusive range keeps the predicate sargable on (field, id) indexes
+        return (
+            Q(**{f'{self.field}__{op}e': value})
+            & (Q(**{f'{self.field}__{op}': value}) | Q(**{f'id__{op}': pk}))
+        )
+
+    def order_by(self, descending):
+        prefix = '-' if descending else ''
+        return (f'{prefix}{self.field}', f'{prefix}id')
+
+    def position(self, instance):
+        value = getattr(instance, self.field)
+        return (value.isoformat() if hasattr(value, 'isoformat') else value, instance.pk)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            value = model._meta.get_field(self.field).to_python(data['v'])
+            return (value, int(data['id'])), bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Curseur invalide.')
+
+    def build_link(self, position, backwards):
+        if position is None:
+            return None
+        value, pk = position
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({'v': value, 'id': pk, 'r': backwards}).encode()
+        ).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class DepartureKeysetPagination(KeysetPagination):
+    ordering = ('departure_time', 'id')
+
+
+class RecentDepartureKeysetPagination(KeysetPagination):
+    ordering = ('-departure_time', '-id')
+
+
+class CreatedKeysetPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,16 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from .instrumentation import record_render
+
+
+class TimedJSONRenderer(JSONRenderer):
+    # Reports the time spent encoding the response body to the instrumentation
+    # middleware (Server-Timing 'render' and the per-endpoint render totals)
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            record_render((time.perf_counter() - started) * 1000)
@@ -0,0 +1,36 @@
+from .instrumentation import timed_serialization
+
+
+class TimedSerializerMixin:
+    # Reports the time spent turning instances into response data to the
+    # instrumentation middleware (Server-Timing 'serialize'). Also used as a
+    # ListSerializer child, so many=True lists are timed item by item.
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class ExpandableFieldsMixin:
+    # Nested relations rendered compact by default and in full when listed in ?expand=,
+    # e.g. /api/ratings/my-ratings/?expand=trip.
+    # expandable_fields = {'field': (SummarySerializer, FullSerializer)}
+    expandable_fields = {}
+    expand_query_param = 'expand'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expanded = self.get_expanded_fields()
+        for name, (summary_class, full_class) in self.expandable_fields.items():
+            serializer_class = full_class if name in expanded else summary_class
+            fields[name] = serializer_class(read_only=True)
+        return fields
+
+    def get_expanded_fields(self):
+        return expanded_fields(self.context.get('request'), self.expand_query_param)
+
+
+def expanded_fields(request, query_param='expand'):
+    if request is None:
+        return set()
+    value = request.query_params.get(query_param, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
@@ -28,9 +28,14 @@ INSTALLED_APPS = [
     'communities',
     'trips',
     'ratings',
+    'jobs',
+    'benchmarks',
+    'exports',
 ]
 
 MIDDLEWARE = [
+    'transport_app.instrumentation.InstrumentationMiddleware',
+    'transport_app.db_router.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -46,7 +51,7 @@ ROOT_URLCONF = 'transport_app.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'transport_app' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -60,24 +65,120 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'transport_app.wsgi.application'
+ASGI_APPLICATION = 'transport_app.asgi.application'
+
+# Route trip search, my-trips, the community list/stats and rating stats to their
+# async implementations. Enable when serving transport_app.asgi (e.g. uvicorn);
+# under WSGI the DRF views are faster.
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
 
 # Database
-DATABASES = {
-    'default': {
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse.
+# DB_ENGINE=sqlite (DB_NAME being a file path) is meant for local routing tests.
+DB_ENGINE = config('DB_ENGINE', default='mysql')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+
+def database(host=None, port=None, name=None):
+    if DB_ENGINE == 'sqlite':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name or config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    return {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': config('DB_NAME', default='transport_db'),
+        'NAME': name or config('DB_NAME', default='transport_db'),
         'USER': config('DB_USER', default='root'),
         'PASSWORD': config('DB_PASSWORD', default=''),
-        'HOST': config('DB_HOST', default='localhost'),
-        'PORT': config('DB_PORT', default='3306'),
+        'HOST': host or config('DB_HOST', default='localhost'),
+        'PORT': port or config('DB_PORT', default='3306'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'sql_mode': 'traditional',
             'charset': 'utf8mb4',
             'init_command': "SET foreign_key_checks = 0;",
         }
     }
+
+
+DATABASES = {
+    'default': database()
+}
+
+# Read replicas, comma separated: host[:port][/name] for MySQL, file paths for
+# SQLite. transport_app.db_router sends the reads of REPLICA_READ_URL_NAMES to them.
+for index, replica in enumerate(filter(None, config('DB_REPLICAS', default='').split(',')), start=1):
+    if DB_ENGINE == 'sqlite':
+        replica_settings = database(name=replica.strip())
+    else:
+        address, _, replica_name = replica.strip().partition('/')
+        replica_host, _, replica_port = address.partition(':')
+        replica_settings = database(replica_host, replica_port or None, replica_name or None)
+    DATABASES[f'replica{index}'] = {**replica_settings, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['transport_app.db_router.ReplicaRouter']
+
+# Read-only endpoints whose GET requests may be served by a replica
+REPLICA_READ_URL_NAMES = (
+    'trip-list', 'trip-search', 'trip-detail', 'my-trips',
+    'community-list', 'community-detail', 'community-members', 'community-stats', 'community-trends',
+    'user-ratings', 'user-rating-stats', 'user-rating-stats-batch', 'my-ratings',
+    'export',
+)
+# Seconds a client that just wrote reads from the primary, longer than the replication lag.
+# The pin is a signed cookie, and is also kept in the cache when it is Redis (REDIS_URL).
+# The frontend sends it with its API calls (withCredentials, CORS_ALLOW_CREDENTIALS);
+# when it is served from another site than the API the cookie must be SameSite=None.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+REPLICA_PIN_COOKIE_SAMESITE = config('REPLICA_PIN_COOKIE_SAMESITE', default='Lax')
+
+# Cache: local memory by default, Redis when REDIS_URL is set
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'transport-app',
+    }
 }
 
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Seconds a user's rating stats stay cached (they are also invalidated on every new rating).
+# Only cached in Redis (REDIS_URL): ratings are recorded by the job worker process.
+RATING_STATS_CACHE_TIMEOUT = config('RATING_STATS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds a cached trip/community listing page is kept (0 disables the cache). Only cached
+# in Redis (REDIS_URL), where writes from any process invalidate it right away; the
+# timeout only bounds staleness of nested user/vehicle data.
+LISTING_CACHE_TIMEOUT = config('LISTING_CACHE_TIMEOUT', default=60, cast=int)
+
+# Requests slower than this, or running at least this many queries, are logged
+# with their most repeated queries by the instrumentation middleware
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=500, cast=int)
+SLOW_REQUEST_QUERIES = config('SLOW_REQUEST_QUERIES', default=50, cast=int)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+# Bearer token Prometheus sends to /metrics (left empty, the endpoint is DEBUG-only)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Rows read per query by the streaming exports (exports app)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Server-Sent Events (GET /api/trips/events/, transport_app.events): events a slow
+# client may have pending before it is disconnected, seconds between keepalives,
+# seconds before a stream is closed (EventSource reconnects), trips per stream
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int)
+EVENTS_KEEPALIVE_SECONDS = config('EVENTS_KEEPALIVE_SECONDS', default=15, cast=int)
+EVENTS_STREAM_SECONDS = config('EVENTS_STREAM_SECONDS', default=300, cast=int)
+EVENTS_MAX_TRIPS = config('EVENTS_MAX_TRIPS', default=50, cast=int)
+
+# Admin change lists count rows exactly up to this limit (transport_app.admin_tools)
+ADMIN_EXACT_COUNT_LIMIT = config('ADMIN_EXACT_COUNT_LIMIT', default=10000, cast=int)
+
 # Set the custom user model BEFORE any migrations
 AUTH_USER_MODEL = 'users.User'
 
@@ -116,12 +217,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': (
+        'transport_app.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'transport_app.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
 
@@ -131,8 +236,19 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
 }
 
+# Users authenticated from token claims load their other fields through a
+# per-process cache: entries live this many seconds, at most this many users.
+# Token revocations are shared through the cache when it is Redis (REDIS_URL);
+# with the local memory cache the token version is read from the database at most
+# every AUTH_TOKEN_CHECK_SECONDS per user, which bounds how long a token revoked
+# in another process is still accepted.
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=30, cast=int)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+AUTH_TOKEN_CHECK_SECONDS = config('AUTH_TOKEN_CHECK_SECONDS', default=5, cast=int)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -0,0 +1,9 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared():
+    # Whether what one process writes to the default cache is seen by the
+    # others: not with the local memory cache (no REDIS_URL)
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
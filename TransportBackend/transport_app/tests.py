@@ -0,0 +1,126 @@
+import sqlite3
+import tempfile
+from contextlib import ExitStack
+from datetime import timedelta
+from pathlib import Path
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from communities.models import Community
+from trips.models import Booking, Trip
+from users.models import User, Vehicle
+from users.principals import token_state, token_states, users
+from users.tokens import UserRefreshToken
+from .db_router import PIN_COOKIE
+
+REPLICA = 'replica1'
+
+
+@skipUnless(connection.vendor == 'sqlite', "The replica is a copy of the SQLite test database")
+class ReplicaRoutingTests(TransactionTestCase):
+    # Which database serves each step of a read / write / read sequence. The
+    # replica is a second SQLite alias holding a copy of the test database,
+    # added once the test runner has set up the configured ones.
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA] = {
+            **connections.settings['default'],
+            'NAME': str(Path(cls.replica_dir.name) / 'replica.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        users.clear()
+        token_states.clear()
+        self.user = User.objects.create_user(
+            email='passenger@example.com', username='passenger', password='password',
+            first_name='Passenger', last_name='Test'
+        )
+        driver = User.objects.create_user(
+            email='driver@example.com', username='driver', password='password', user_type='driver'
+        )
+        community = Community.objects.create(
+            name='Bureau', description='Trajets du bureau', community_type='work', location='Paris',
+            creator=driver
+        )
+        vehicle = Vehicle.objects.create(owner=driver, brand='Renault', model='Clio', year=2020,
+                                         color='bleu', license_plate='AA-001-AA')
+        departure = timezone.now() + timedelta(days=1)
+        trip = Trip.objects.create(
+            driver=driver, vehicle=vehicle, community=community,
+            departure_location='Paris', arrival_location='Lyon', departure_time=departure,
+            estimated_arrival_time=departure + timedelta(hours=4), available_seats=4
+        )
+        Booking.objects.create(trip=trip, passenger=self.user)
+        self.replicate()
+
+        self.client = APIClient()
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        # The token version check always reads the primary, it is not a routed read
+        self.revocation_sql = token_state(self.user.pk).query.sql_with_params()[0]
+
+    def replicate(self):
+        connections[REPLICA].close()
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(connections.settings[REPLICA]['NAME'])
+        try:
+            connections['default'].connection.backup(replica)
+        finally:
+            replica.close()
+
+    def databases_used(self, method, path, **kwargs):
+        used = set()
+
+        def record(execute, sql, params, many, context, alias):
+            if sql != self.revocation_sql:
+                used.add(alias)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(
+                    lambda *args, alias=alias: record(*args, alias=alias)
+                ))
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return used
+
+    def assert_reads(self, path, database):
+        self.assertEqual(self.databases_used('get', path), {database}, path)
+
+    def write(self):
+        used = self.databases_used('patch', '/api/auth/profile/', data={'bio': 'Nouvelle bio'}, format='json')
+        self.assertEqual(used, {'default'})
+
+    def test_reads_use_the_replica(self):
+        for path in ('/api/trips/my-trips/', '/api/trips/', '/api/ratings/my-ratings/'):
+            self.assert_reads(path, REPLICA)
+
+    def test_other_reads_stay_on_the_primary(self):
+        self.assert_reads('/api/auth/vehicles/', 'default')
+
+    def test_writes_pin_reads_to_the_primary(self):
+        self.write()
+        for path in ('/api/trips/my-trips/', '/api/trips/', '/api/ratings/my-ratings/'):
+            self.assert_reads(path, 'default')
+
+    def test_pin_expires(self):
+        self.write()
+        # The signed cookie is all that pins the client without a shared cache
+        self.client.cookies.pop(PIN_COOKIE)
+        self.assert_reads('/api/trips/my-trips/', REPLICA)
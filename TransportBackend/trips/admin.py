@@ -1,18 +1,74 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from transport_app.admin_tools import LargeTableAdmin, RelatedIdFilter, in_batches
 from .models import Trip, Booking
 
+
+class CommunityFilter(RelatedIdFilter):
+    title = 'communauté'
+    parameter_name = 'community_id'
+
+
+class DriverFilter(RelatedIdFilter):
+    title = 'conducteur'
+    parameter_name = 'driver_id'
+
+
+class TripFilter(RelatedIdFilter):
+    title = 'trajet'
+    parameter_name = 'trip_id'
+
+
+class PassengerFilter(RelatedIdFilter):
+    title = 'passager'
+    parameter_name = 'passenger_id'
+
+
+class TripCommunityFilter(CommunityFilter):
+    parameter_name = 'trip__community_id'
+
+
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('departure_location', 'arrival_location', 'driver', 'departure_time',
                    'available_seats', 'remaining_seats', 'status')
-    list_filter = ('status', 'departure_time', 'community')
+    list_filter = ('status', 'departure_time', CommunityFilter, DriverFilter)
+    list_select_related = ('driver',)
     search_fields = ('departure_location', 'arrival_location', 'driver__email')
     ordering = ('-departure_time',)
     readonly_fields = ('remaining_seats',)
+    autocomplete_fields = ('driver', 'community', 'vehicle', 'template')
+    actions = ('cancel_trips', 'recount_booked_seats')
+
+    @admin.action(description="Annuler les trajets planifiés sélectionnés")
+    def cancel_trips(self, request, queryset):
+        cancelled = 0
+        for batch in in_batches(queryset):
+            with transaction.atomic():
+                cancelled += batch.cancel()
+        self.message_user(request, f"{cancelled} trajet(s) annulé(s)", messages.SUCCESS)
+
+    @admin.action(description="Recalculer les places réservées")
+    def recount_booked_seats(self, request, queryset):
+        recounted = sum(batch.recount_booked_seats() for batch in in_batches(queryset))
+        self.message_user(request, f"{recounted} trajet(s) recalculé(s)", messages.SUCCESS)
+
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('passenger', 'trip', 'seats_booked', 'status', 'created_at')
-    list_filter = ('status', 'created_at')
+    list_filter = ('status', 'created_at', TripCommunityFilter, TripFilter, PassengerFilter)
+    list_select_related = ('passenger', 'trip')
     search_fields = ('passenger__email', 'trip__departure_location')
-    ordering = ('-created_at',)
+    # Same order as created_at, read from the primary key instead of sorting the table
+    ordering = ('-id',)
+    autocomplete_fields = ('trip', 'passenger')
+    actions = ('confirm_bookings',)
+
+    @admin.action(description="Confirmer les réservations en attente sélectionnées")
+    def confirm_bookings(self, request, queryset):
+        confirmed = 0
+        for batch in in_batches(queryset):
+            with transaction.atomic():
+                confirmed += batch.confirm()
+        self.message_user(request, f"{confirmed} réservation(s) confirmée(s)", messages.SUCCESS)
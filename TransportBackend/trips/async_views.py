@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from communities.memberships import amembership_roles
+from transport_app import events
+from transport_app.async_views import async_api_view
+from users.authentication import QueryTokenAuthentication
+from .events import trip_channel, user_channel
+from transport_app.pagination import RecentDepartureKeysetPagination
+from .models import Trip
+from .search import search_candidates, rank_candidates, with_distances
+from .serializers import TripSerializer, TripSearchSerializer, TripSearchResultSerializer
+from .views import booked_trip_ids, my_trips
+
+
+@async_api_view
+async def search_trips(request):
+    params = TripSearchSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+
+    candidates = [row async for row in search_candidates(params.validated_data)]
+    ranked = rank_candidates(candidates, params.validated_data)
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(ranked, request)
+
+    # Only the trips on the requested page are fully loaded and serialized
+    trips = {
+        trip.id: trip
+        async for trip in Trip.objects.with_listing_data(request.user).filter(
+            id__in=[trip_id for _, trip_id, _, _ in page]
+        )
+    }
+    await amembership_roles(request)
+    serializer = TripSearchResultSerializer(with_distances(trips, page), many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@async_api_view
+async def list_my_trips(request):
+    user = request.user
+    trip_type = request.query_params.get('type', 'all')
+    booked_trips = []
+    if trip_type != 'driver':
+        booked_trips = [trip_id async for trip_id in booked_trip_ids(user)]
+
+    paginator = RecentDepartureKeysetPagination()
+    page = await paginator.apaginate_queryset(my_trips(user, trip_type, booked_trips), request)
+    await amembership_roles(request)
+    serializer = TripSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@async_api_view(authentication_classes=[QueryTokenAuthentication])
+async def trip_events(request):
+    # Server-Sent Events for ?trips=<id>,<id>... plus the bookings of the user,
+    # as passenger or driver. Clients reload a trip or booking from its event
+    # rather than polling the listings.
+    if not isinstance(request._request, ASGIRequest):
+        # Under WSGI every open stream would hold a worker thread
+        return Response(
+            {'error': "Le flux d'événements n'est disponible qu'avec le serveur ASGI"},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    trips = [trip_id for trip_id in request.query_params.get('trips', '').split(',') if trip_id]
+    if not all(trip_id.isdigit() for trip_id in trips):
+        return Response({'error': 'Identifiants de trajets invalides'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(trips) > settings.EVENTS_MAX_TRIPS:
+        return Response(
+            {'error': f'Au plus {settings.EVENTS_MAX_TRIPS} trajets par flux'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    channels = [user_channel(request.user.id), *(trip_channel(int(trip_id)) for trip_id in trips)]
+    response = StreamingHttpResponse(events.stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sent as they come, not buffered by nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,52 @@
+from django.db import transaction
+from transport_app.events import publish
+
+# Fields of a 'trip' event; a 'booking' event goes to the passenger and the
+# driver only
+TRIP_FIELDS = ('id', 'status', 'available_seats', 'booked_seats')
+BOOKING_FIELDS = ('id', 'trip_id', 'status', 'seats_booked')
+
+
+def trip_channel(trip_id):
+    return f'trip:{trip_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def trip_event(trip):
+    return {field: getattr(trip, field) for field in TRIP_FIELDS}
+
+
+def publish_trips(trips):
+    # trips: dicts with the id and the fields that changed
+    publish(([trip_channel(trip['id'])], 'trip', trip) for trip in trips)
+
+
+def publish_trip_seats(trip_ids):
+    # booked_seats moves through conditional UPDATEs: the value sent is read
+    # once the transaction has committed
+    from .models import Trip
+
+    def send():
+        publish_trips(Trip.objects.filter(id__in=trip_ids).values(*TRIP_FIELDS))
+
+    transaction.on_commit(send)
+
+
+def publish_bookings(bookings):
+    # bookings: dicts with BOOKING_FIELDS, passenger_id and driver_id
+    publish(
+        (
+            [user_channel(booking['passenger_id']), user_channel(booking['driver_id'])],
+            'booking',
+            {field: booking[field] for field in BOOKING_FIELDS}
+        )
+        for booking in bookings
+    )
+
+
+def booking_event(booking, driver_id):
+    event = {field: getattr(booking, field) for field in BOOKING_FIELDS}
+    return {**event, 'passenger_id': booking.passenger_id, 'driver_id': driver_id}
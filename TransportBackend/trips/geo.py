@@ -0,0 +1,37 @@
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def bounding_box(latitude, longitude, radius_km):
+    # (min_lat, max_lat, min_lng, max_lng) of the square enclosing the search circle
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    # Longitude degrees shrink towards the poles, clamp to avoid dividing by ~0
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lng_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180)
+    return (
+        max(latitude - lat_delta, -90),
+        min(latitude + lat_delta, 90),
+        longitude - lng_delta,
+        longitude + lng_delta,
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def within_box(prefix, latitude, longitude, radius_km):
+    # Q() restricting <prefix>_latitude/<prefix>_longitude to the bounding box
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    condition = Q(**{f'{prefix}_latitude__range': (min_lat, max_lat)})
+    # A box crossing the antimeridian cannot be expressed as one range, the
+    # haversine pass filters those candidates instead
+    if min_lng >= -180 and max_lng <= 180:
+        condition &= Q(**{f'{prefix}_longitude__range': (min_lng, max_lng)})
+    return condition
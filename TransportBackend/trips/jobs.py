@@ -0,0 +1,9 @@
+from jobs.queue import handler
+from .lifecycle import sweep_trip_statuses
+
+
+# Not atomic: each batch of the sweep commits on its own, so its row locks are
+# released and its events sent without waiting for the whole sweep
+@handler('trips.advance_statuses', every=60, atomic=False)
+def advance_statuses(payloads):
+    sweep_trip_statuses()
@@ -0,0 +1,71 @@
+import time
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import BOOKING_FIELDS, TRIP_FIELDS, publish_bookings, publish_trips
+from .models import Trip, Booking, held_seats_expression, invalidate_trip_listings
+
+
+def _batches(queryset, order_field, batch_size):
+    # Ids of the next batch, read through the (status, <time>) index.
+    # Each UPDATE touches at most batch_size rows so locks are held briefly.
+    while True:
+        ids = list(queryset.order_by(order_field, 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        if len(ids) < batch_size:
+            return
+
+
+def start_departed_trips(now, batch_size):
+    started = 0
+    due = Trip.objects.filter(status='planned', departure_time__lte=now)
+    for ids in _batches(due, 'departure_time', batch_size):
+        # status is checked again in case the trip was cancelled meanwhile
+        started += Trip.objects.filter(id__in=ids, status='planned').update(status='active')
+        publish_trips(Trip.objects.filter(id__in=ids).values('id', 'status'))
+    return {'trips_started': started}
+
+
+def complete_arrived_trips(now, batch_size):
+    completed = bookings = expired = 0
+    due = Trip.objects.filter(status='active', estimated_arrival_time__lte=now)
+    for ids in _batches(due, 'estimated_arrival_time', batch_size):
+        with transaction.atomic():
+            # Requests the driver never confirmed expire with the trip. Locked
+            # first, so a confirmation racing the sweep is not reported as cancelled.
+            pending = Booking.objects.filter(trip_id__in=ids, status='pending')
+            released = list(
+                pending.select_for_update(of=('self',))
+                .values(*BOOKING_FIELDS, 'passenger_id', driver_id=F('trip__driver_id'))
+            )
+            expired += pending.update(status='cancelled', updated_at=now)
+            bookings += Booking.objects.filter(trip_id__in=ids, status='confirmed').update(
+                status='completed', updated_at=now
+            )
+            # The expired bookings no longer hold seats
+            completed += Trip.objects.filter(id__in=ids, status='active').update(
+                status='completed', booked_seats=held_seats_expression(), updated_at=now
+            )
+            publish_bookings({**booking, 'status': 'cancelled'} for booking in released)
+            publish_trips(Trip.objects.filter(id__in=ids).values(*TRIP_FIELDS))
+    return {'trips_completed': completed, 'bookings_completed': bookings, 'bookings_expired': expired}
+
+
+def sweep_trip_statuses(batch_size=1000, now=None):
+    # planned -> active at departure, active -> completed at arrival (with the
+    # confirmed bookings; pending ones are cancelled). Returns counts and
+    # per-phase timings in seconds.
+    now = now or timezone.now()
+    stats = {}
+    for phase in (start_departed_trips, complete_arrived_trips):
+        started = time.monotonic()
+        stats.update(phase(now, batch_size))
+        stats[f'{phase.__name__}_seconds'] = time.monotonic() - started
+    if stats['trips_started'] or stats['trips_completed']:
+        # The UPDATEs above send no signals
+        invalidate_trip_listings()
+    return stats
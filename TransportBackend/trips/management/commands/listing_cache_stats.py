@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from transport_app.listing_cache import cache_metrics, reset_cache_metrics
+
+
+class Command(BaseCommand):
+    help = "Show the hit ratio of the trip and community listing caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them")
+
+    def handle(self, *args, **options):
+        for namespace, metrics in cache_metrics().items():
+            self.stdout.write(
+                f"{namespace:<12} {metrics['hits']:>8} hits {metrics['misses']:>8} misses "
+                f"hit ratio {metrics['hit_ratio']:.1%}"
+            )
+        if options['reset']:
+            reset_cache_metrics()
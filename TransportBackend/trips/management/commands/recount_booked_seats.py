@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = "Recompute Trip.booked_seats from the bookings table and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report trips whose counter is out of sync")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        drifted = (
+            Trip.objects.with_held_seats()
+            .exclude(booked_seats=F('held_seats'))
+            .values_list('id', 'booked_seats', 'held_seats')
+        )
+
+        total = 0
+        batch = []
+        for trip_id, booked_seats, held_seats in drifted.iterator(chunk_size=batch_size):
+            self.stdout.write(f"Trip {trip_id}: booked_seats {booked_seats} -> {held_seats}")
+            batch.append(trip_id)
+            if len(batch) >= batch_size:
+                total += self._repair(batch, dry_run)
+                batch = []
+        if batch:
+            total += self._repair(batch, dry_run)
+
+        verb = "out of sync" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{total} trips {verb}"))
+
+    def _repair(self, trip_ids, dry_run):
+        if not dry_run:
+            Trip.objects.filter(id__in=trip_ids).recount_booked_seats()
+        return len(trip_ids)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from trips.lifecycle import sweep_trip_statuses
+
+
+class Command(BaseCommand):
+    help = ("Move trips from planned to active to completed (and their confirmed bookings to completed, "
+            "pending ones to cancelled) based on departure and arrival times, in bounded batches")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping every --interval seconds")
+        parser.add_argument('--interval', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            stats = sweep_trip_statuses(batch_size=options['batch_size'])
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"{stats['trips_started']} trips started ({stats['start_departed_trips_seconds']:.2f}s), "
+                f"{stats['trips_completed']} trips and {stats['bookings_completed']} bookings completed, "
+                f"{stats['bookings_expired']} pending bookings cancelled "
+                f"({stats['complete_arrived_trips_seconds']:.2f}s), total {elapsed:.2f}s"
+            ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_booked_seats(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    Booking = apps.get_model('trips', 'Booking')
+    held = Booking.objects.filter(
+        trip=OuterRef('pk'),
+        status__in=('pending', 'confirmed', 'completed')
+    ).values('trip').annotate(total=Sum('seats_booked')).values('total')
+    Trip.objects.update(booked_seats=Coalesce(Subquery(held), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='booked_seats',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_booked_seats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'departure_time'], name='trip_status_departure_idx'),
+        ),
+    ]
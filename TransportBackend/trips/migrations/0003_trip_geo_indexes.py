@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_trip_booked_seats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'departure_latitude', 'departure_longitude'], name='trip_departure_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'arrival_latitude', 'arrival_longitude'], name='trip_arrival_geo_idx'),
+        ),
+    ]
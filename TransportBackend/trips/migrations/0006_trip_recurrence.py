@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:44
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef
+import django.db.models.deletion
+
+
+def remove_duplicate_trips(apps, schema_editor):
+    # Trips created twice before the unique constraint existed. In each group
+    # the copies without bookings (ratings need one) are deleted; copies that
+    # have bookings must be merged by hand before migrating.
+    Trip = apps.get_model('trips', 'Trip')
+    Booking = apps.get_model('trips', 'Booking')
+    groups = (
+        Trip.objects.values('driver_id', 'vehicle_id', 'departure_time')
+        .annotate(copies=Count('id')).filter(copies__gt=1).order_by()
+    )
+    conflicts = []
+    for group in list(groups):
+        trips = list(
+            Trip.objects.filter(
+                driver_id=group['driver_id'], vehicle_id=group['vehicle_id'],
+                departure_time=group['departure_time']
+            ).annotate(booked=Exists(Booking.objects.filter(trip=OuterRef('pk'))))
+            .order_by('-booked', 'id')
+        )
+        kept, copies = trips[0], trips[1:]
+        Trip.objects.filter(id__in=[trip.id for trip in copies if not trip.booked]).delete()
+        booked = [trip.id for trip in copies if trip.booked]
+        if booked:
+            conflicts.append(f"trip {kept.id} duplicated by {', '.join(map(str, booked))}")
+    if conflicts:
+        raise RuntimeError(
+            "Duplicate trips (same driver, vehicle and departure) with bookings, merge them first: "
+            + '; '.join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='trips.trip'),
+        ),
+        migrations.RunPython(remove_duplicate_trips, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.UniqueConstraint(fields=('driver', 'vehicle', 'departure_time'), name='trip_unique_driver_vehicle_departure'),
+        ),
+    ]
@@ -1,7 +1,111 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from communities.models import Community
+from transport_app.listing_cache import invalidate
+from .events import BOOKING_FIELDS, TRIP_FIELDS, publish_bookings, publish_trips
+
+
+class TripQuerySet(models.QuerySet):
+    def available(self):
+        return self.filter(status='planned', booked_seats__lt=F('available_seats'))
+
+    def reserve_seats(self, seats):
+        # Conditional increment: matches no row once the trip cannot hold the extra seats
+        return self.filter(
+            status='planned',
+            booked_seats__lte=F('available_seats') - seats
+        ).update(booked_seats=F('booked_seats') + seats)
+
+    def release_seats(self, seats):
+        return self.update(booked_seats=F('booked_seats') - seats)
+
+    def with_listing_data(self, user):
+        # Everything TripSerializer reads, loaded with a fixed number of queries per page
+        queryset = self.select_related('driver', 'vehicle', 'community__creator')
+        if user.is_authenticated:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'bookings',
+                    queryset=Booking.objects.filter(passenger=user),
+                    to_attr='user_bookings'
+                )
+            )
+        return queryset
+
+    def with_held_seats(self):
+        # Seats actually held by bookings, recomputed from the bookings table
+        return self.annotate(held_seats=held_seats_expression())
+
+    def recount_booked_seats(self):
+        repaired = self.update(booked_seats=held_seats_expression())
+        invalidate_trip_listings()
+        return repaired
+
+    def cancel(self):
+        # Cancel the planned trips with their pending and confirmed bookings,
+        # a fixed number of UPDATEs for any number of trips. Must run inside a
+        # transaction: the trips stay locked until their bookings are released.
+        ids = list(self.select_for_update().filter(status='planned').values_list('id', flat=True))
+        if not ids:
+            return 0
+        now = timezone.now()
+        bookings = Booking.objects.filter(trip_id__in=ids, status__in=('pending', 'confirmed'))
+        released = list(bookings.values(*BOOKING_FIELDS, 'passenger_id', driver_id=F('trip__driver_id')))
+        bookings.update(status='cancelled', updated_at=now)
+        cancelled = Trip.objects.filter(id__in=ids).update(
+            status='cancelled', booked_seats=held_seats_expression(), updated_at=now
+        )
+        transaction.on_commit(invalidate_trip_listings)
+        publish_bookings({**booking, 'status': 'cancelled'} for booking in released)
+        publish_trips(Trip.objects.filter(id__in=ids).values(*TRIP_FIELDS))
+        return cancelled
+
+
+class BookingQuerySet(models.QuerySet):
+    def confirm(self):
+        # Seats were held when the bookings were made, booked_seats is unchanged.
+        # Must run inside a transaction.
+        pending = list(
+            self.select_for_update(of=('self',)).filter(status='pending')
+            .values(*BOOKING_FIELDS, 'passenger_id', driver_id=F('trip__driver_id'))
+        )
+        confirmed = Booking.objects.filter(id__in=[booking['id'] for booking in pending]).update(
+            status='confirmed', updated_at=timezone.now()
+        )
+        publish_bookings({**booking, 'status': 'confirmed'} for booking in pending)
+        return confirmed
+
+
+def with_trip(queryset, user, full=False):
+    # Load the trip of bookings/ratings for TripSerializer (full) or TripSummarySerializer
+    if full:
+        return queryset.prefetch_related(Prefetch('trip', queryset=Trip.objects.with_listing_data(user)))
+    return queryset.select_related('trip__driver', 'trip__vehicle')
+
+
+def trip_listing_scopes(community_id=None):
+    # Cache scopes of a trip listing (see transport_app.listing_cache)
+    return ['trips', f'trips:community:{community_id}' if community_id else 'trips:any']
+
+
+def invalidate_trip_listings(*community_ids):
+    # Trips of these communities changed; without ids every trip listing is dropped
+    if not community_ids:
+        invalidate('trips')
+        return
+    invalidate('trips:any', *{f'trips:community:{community_id}' for community_id in community_ids})
+
+
+def held_seats_expression():
+    held = Booking.objects.filter(
+        trip=OuterRef('pk'),
+        status__in=Booking.SEAT_HOLDING_STATUSES
+    ).values('trip').annotate(total=Sum('seats_booked')).values('total')
+    return Coalesce(Subquery(held), 0)
 
 
 class Trip(models.Model):
@@ -28,28 +132,52 @@ class Trip(models.Model):
     estimated_arrival_time = models.DateTimeField()
 
     available_seats = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(8)])
+    # Seats held by pending/confirmed/completed bookings, kept in sync by the booking views
+    booked_seats = models.PositiveIntegerField(default=0)
     price_per_seat = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
 
     description = models.TextField(blank=True)
     recurring = models.BooleanField(default=False)
-    recurring_days = models.CharField(max_length=20, blank=True)  # JSON string for days
+    recurring_days = models.CharField(max_length=20, blank=True)  # JSON list of weekdays, 0 = Monday
+    # Recurring trip this one was materialized from
+    template = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='occurrences')
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='planned')
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TripQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Idempotency key for bulk imports and recurring trip materialization
+            models.UniqueConstraint(fields=['driver', 'vehicle', 'departure_time'],
+                                    name='trip_unique_driver_vehicle_departure'),
+        ]
+        indexes = [
+            models.Index(fields=['departure_time'], name='trip_departure_idx'),
+            models.Index(fields=['status', 'departure_time'], name='trip_status_departure_idx'),
+            models.Index(fields=['status', 'estimated_arrival_time'], name='trip_status_arrival_idx'),
+            models.Index(fields=['community', 'departure_time'], name='trip_community_departure_idx'),
+            models.Index(fields=['driver', 'departure_time'], name='trip_driver_departure_idx'),
+            models.Index(fields=['status', 'departure_latitude', 'departure_longitude'],
+                         name='trip_departure_geo_idx'),
+            models.Index(fields=['status', 'arrival_latitude', 'arrival_longitude'],
+                         name='trip_arrival_geo_idx'),
+        ]
+
     def __str__(self):
         return f"{self.departure_location} → {self.arrival_location} ({self.departure_time})"
 
     @property
     def remaining_seats(self):
-        booked_seats = self.bookings.filter(status='confirmed').count()
-        return self.available_seats - booked_seats
+        return self.available_seats - self.booked_seats
 
     @property
     def is_full(self):
-        return self.remaining_seats <= 0
+        return self.booked_seats >= self.available_seats
 
 
 class Booking(models.Model):
@@ -59,6 +187,8 @@ class Booking(models.Model):
         ('cancelled', 'Annulé'),
         ('completed', 'Terminé'),
     )
+    # Statuses whose seats count towards Trip.booked_seats
+    SEAT_HOLDING_STATUSES = ('pending', 'confirmed', 'completed')
 
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='bookings')
     passenger = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bookings')
@@ -72,8 +202,14 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         unique_together = ('trip', 'passenger')
+        indexes = [
+            models.Index(fields=['passenger', 'status'], name='booking_passenger_status_idx'),
+            models.Index(fields=['trip', 'created_at'], name='booking_trip_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.passenger.username} - {self.trip} ({self.status})"
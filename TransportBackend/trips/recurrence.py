@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from communities.models import Membership
+from users.models import Vehicle
+from .models import Trip, invalidate_trip_listings
+
+# Fields copied from a recurring trip onto each dated occurrence
+COPIED_FIELDS = (
+    'driver_id', 'community_id', 'vehicle_id',
+    'departure_location', 'departure_latitude', 'departure_longitude',
+    'arrival_location', 'arrival_latitude', 'arrival_longitude',
+    'available_seats', 'price_per_seat', 'description',
+)
+
+
+def parse_recurring_days(value):
+    # "[0,2,4]" (JSON) or "0,2,4", weekdays with 0 = Monday
+    value = (value or '').strip()
+    if not value:
+        return []
+    try:
+        days = json.loads(value) if value.startswith('[') else [int(day) for day in value.split(',')]
+    except (TypeError, ValueError):
+        raise ValueError("Jours de récurrence invalides.")
+    if not all(isinstance(day, int) and 0 <= day <= 6 for day in days):
+        raise ValueError("Les jours de récurrence doivent être compris entre 0 (lundi) et 6 (dimanche).")
+    return sorted(set(days))
+
+
+def occurrences(template, start, end):
+    # Departure/arrival datetimes of template between start and end. The local
+    # wall-clock time is kept, so a 08:00 trip stays at 08:00 across DST changes.
+    try:
+        days = parse_recurring_days(template.recurring_days)
+    except ValueError:
+        return
+    local_departure = timezone.localtime(template.departure_time)
+    days = days or [local_departure.weekday()]
+    duration = template.estimated_arrival_time - template.departure_time
+
+    day = max(timezone.localtime(start).date(), local_departure.date() + timedelta(days=1))
+    while day <= timezone.localtime(end).date():
+        if day.weekday() in days:
+            departure = timezone.make_aware(datetime.combine(day, local_departure.time().replace(tzinfo=None)))
+            if start <= departure <= end:
+                yield departure, departure + duration
+        day += timedelta(days=1)
+
+
+def allowed_templates(templates):
+    # Vehicle ownership and community membership checked with one query each for the whole batch
+    vehicle_owners = dict(
+        Vehicle.objects.filter(id__in={t.vehicle_id for t in templates}, is_active=True)
+        .values_list('id', 'owner_id')
+    )
+    memberships = set(
+        Membership.objects.filter(
+            user_id__in={t.driver_id for t in templates},
+            community_id__in={t.community_id for t in templates},
+            is_active=True
+        ).values_list('user_id', 'community_id')
+    )
+    return [
+        t for t in templates
+        if vehicle_owners.get(t.vehicle_id) == t.driver_id and (t.driver_id, t.community_id) in memberships
+    ]
+
+
+def materialize_recurring_trips(horizon_days=28, batch_size=1000, dry_run=False, now=None):
+    # Expand every planned recurring trip into dated trips up to horizon_days ahead.
+    # Idempotent: occurrences that already exist hit the (driver, vehicle, departure_time)
+    # unique constraint and are skipped by the database.
+    now = now or timezone.now()
+    end = now + timedelta(days=horizon_days)
+    stats = {'templates': 0, 'rejected': 0, 'generated': 0}
+
+    templates = (
+        Trip.objects.filter(recurring=True, template__isnull=True)
+        .exclude(status='cancelled')
+        .filter(departure_time__lte=end)
+        .order_by('pk')
+    )
+    batch = []
+    pending = []
+
+    def flush_templates():
+        allowed = allowed_templates(batch)
+        stats['templates'] += len(batch)
+        stats['rejected'] += len(batch) - len(allowed)
+        for template in allowed:
+            for departure, arrival in occurrences(template, now, end):
+                pending.append(Trip(
+                    template_id=template.pk,
+                    departure_time=departure,
+                    estimated_arrival_time=arrival,
+                    **{field: getattr(template, field) for field in COPIED_FIELDS}
+                ))
+        batch.clear()
+
+    def flush_trips():
+        stats['generated'] += len(pending)
+        if not dry_run:
+            Trip.objects.bulk_create(pending, batch_size=batch_size, ignore_conflicts=True)
+            invalidate_trip_listings(*{trip.community_id for trip in pending})
+        pending.clear()
+
+    for template in templates.iterator(chunk_size=batch_size):
+        batch.append(template)
+        if len(batch) >= batch_size:
+            flush_templates()
+        if len(pending) >= batch_size:
+            flush_trips()
+    if batch:
+        flush_templates()
+    if pending:
+        flush_trips()
+    return stats
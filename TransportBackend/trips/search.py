@@ -0,0 +1,60 @@
+from .geo import haversine_km, within_box
+from .models import Trip
+
+
+def search_candidates(params):
+    # Bounding-box prefilter on the indexed coordinate columns
+    origin = (params['origin_lat'], params['origin_lng'])
+    queryset = Trip.objects.filter(status='planned').filter(
+        within_box('departure', *origin, params['origin_radius'])
+    )
+    if 'destination_lat' in params:
+        destination = (params['destination_lat'], params['destination_lng'])
+        queryset = queryset.filter(within_box('arrival', *destination, params['destination_radius']))
+    if params.get('date'):
+        queryset = queryset.filter(departure_time__date=params['date'])
+    if params.get('community'):
+        queryset = queryset.filter(community_id=params['community'])
+
+    return queryset.values_list(
+        'id', 'departure_latitude', 'departure_longitude',
+        'arrival_latitude', 'arrival_longitude'
+    )
+
+
+def rank_candidates(candidates, params):
+    # Exact distances for the box candidates only, ranked by combined detour.
+    # Returns (detour_km, trip_id, departure_km, arrival_km) tuples.
+    origin = (params['origin_lat'], params['origin_lng'])
+    origin_radius = params['origin_radius']
+    destination = None
+    if 'destination_lat' in params:
+        destination = (params['destination_lat'], params['destination_lng'])
+    destination_radius = params['destination_radius']
+
+    ranked = []
+    for trip_id, dep_lat, dep_lng, arr_lat, arr_lng in candidates:
+        departure_km = haversine_km(*origin, float(dep_lat), float(dep_lng))
+        if departure_km > origin_radius:
+            continue
+        arrival_km = None
+        if destination:
+            arrival_km = haversine_km(*destination, float(arr_lat), float(arr_lng))
+            if arrival_km > destination_radius:
+                continue
+        ranked.append((departure_km + (arrival_km or 0), trip_id, departure_km, arrival_km))
+
+    ranked.sort()
+    return ranked
+
+
+def with_distances(trips, ranked):
+    # trips: {id: Trip}; returns them in ranked order with their distances set
+    results = []
+    for detour_km, trip_id, departure_km, arrival_km in ranked:
+        trip = trips[trip_id]
+        trip.departure_distance_km = round(departure_km, 3)
+        trip.arrival_distance_km = round(arrival_km, 3) if arrival_km is not None else None
+        trip.detour_km = round(detour_km, 3)
+        results.append(trip)
+    return results
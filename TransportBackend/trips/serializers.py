@@ -1,10 +1,30 @@
 from rest_framework import serializers
 from .models import Trip, Booking
-from users.serializers import UserSerializer, VehicleSerializer
+from .recurrence import parse_recurring_days
+from users.serializers import (
+    UserSerializer,
+    UserSummarySerializer,
+    VehicleSerializer,
+    VehicleSummarySerializer
+)
+from communities.memberships import membership_roles
 from communities.serializers import CommunitySerializer
+from transport_app.serializers import ExpandableFieldsMixin, TimedSerializerMixin
 
 
-class TripSerializer(serializers.ModelSerializer):
+DUPLICATE_DEPARTURE_ERROR = "Vous avez déjà un trajet avec ce véhicule à cette heure de départ."
+
+
+def check_unique_departure(driver_id, vehicle_id, departure_time, exclude_id=None):
+    # Same rule as the trip_unique_driver_vehicle_departure constraint, reported as a 400
+    duplicates = Trip.objects.filter(driver_id=driver_id, vehicle_id=vehicle_id, departure_time=departure_time)
+    if exclude_id is not None:
+        duplicates = duplicates.exclude(id=exclude_id)
+    if duplicates.exists():
+        raise serializers.ValidationError({'departure_time': DUPLICATE_DEPARTURE_ERROR})
+
+
+class TripSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     driver = UserSerializer(read_only=True)
     vehicle = VehicleSerializer(read_only=True)
     community = CommunitySerializer(read_only=True)
@@ -23,21 +43,70 @@ class TripSerializer(serializers.ModelSerializer):
                   'status', 'is_full', 'is_driver', 'user_booking', 'created_at')
         read_only_fields = ('id', 'driver', 'created_at')
 
+    def validate(self, attrs):
+        if self.instance is not None and 'departure_time' in attrs:
+            check_unique_departure(
+                self.instance.driver_id, self.instance.vehicle_id, attrs['departure_time'], self.instance.id
+            )
+        return attrs
+
     def get_is_driver(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.driver == request.user
+            return obj.driver_id == request.user.id
         return False
 
     def get_user_booking(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            booking = obj.bookings.filter(passenger=request.user).first()
-            return BookingSerializer(booking).data if booking else None
+            # Prefetched by TripQuerySet.with_listing_data on list querysets
+            if hasattr(obj, 'user_bookings'):
+                booking = obj.user_bookings[0] if obj.user_bookings else None
+            else:
+                booking = obj.bookings.filter(passenger=request.user).first()
+            return UserBookingSerializer(booking).data if booking else None
         return None
 
 
-class TripCreateSerializer(serializers.ModelSerializer):
+class TripSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    driver = UserSummarySerializer(read_only=True)
+    vehicle = VehicleSummarySerializer(read_only=True)
+    remaining_seats = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Trip
+        fields = ('id', 'driver', 'vehicle', 'departure_location', 'arrival_location',
+                  'departure_time', 'estimated_arrival_time', 'available_seats',
+                  'remaining_seats', 'price_per_seat', 'status')
+        read_only_fields = fields
+
+
+class TripSearchResultSerializer(TripSerializer):
+    departure_distance_km = serializers.FloatField(read_only=True)
+    arrival_distance_km = serializers.FloatField(read_only=True)
+    detour_km = serializers.FloatField(read_only=True)
+
+    class Meta(TripSerializer.Meta):
+        fields = TripSerializer.Meta.fields + ('departure_distance_km', 'arrival_distance_km', 'detour_km')
+
+
+class TripSearchSerializer(serializers.Serializer):
+    origin_lat = serializers.FloatField(min_value=-90, max_value=90)
+    origin_lng = serializers.FloatField(min_value=-180, max_value=180)
+    origin_radius = serializers.FloatField(min_value=0.1, max_value=100, default=5)
+    destination_lat = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    destination_lng = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    destination_radius = serializers.FloatField(min_value=0.1, max_value=100, default=5)
+    date = serializers.DateField(required=False)
+    community = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if ('destination_lat' in attrs) != ('destination_lng' in attrs):
+            raise serializers.ValidationError("La destination doit avoir une latitude et une longitude.")
+        return attrs
+
+
+class TripCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     vehicle_id = serializers.IntegerField(write_only=True)
     community_id = serializers.IntegerField(write_only=True)
 
@@ -50,6 +119,12 @@ class TripCreateSerializer(serializers.ModelSerializer):
                   'description', 'recurring', 'recurring_days')
 
     def validate_vehicle_id(self, value):
+        # Bulk imports preload the user's vehicle ids once for the whole batch
+        if 'owned_vehicle_ids' in self.context:
+            if value not in self.context['owned_vehicle_ids']:
+                raise serializers.ValidationError("Véhicule non trouvé ou non autorisé.")
+            return value
+
         from users.models import Vehicle
         try:
             vehicle = Vehicle.objects.get(id=value, owner=self.context['request'].user)
@@ -58,23 +133,46 @@ class TripCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Véhicule non trouvé ou non autorisé.")
 
     def validate_community_id(self, value):
-        from communities.models import Community, Membership
-        try:
-            community = Community.objects.get(id=value)
-            # Check if user is member of the community
-            if not Membership.objects.filter(
-                    user=self.context['request'].user,
-                    community=community
-            ).exists():
-                raise serializers.ValidationError("Vous devez être membre de cette communauté.")
+        # The request's membership map is shared by every item of a bulk import
+        if value in membership_roles(self.context.get('request')):
             return value
-        except Community.DoesNotExist:
+
+        from communities.models import Community
+        if not Community.objects.filter(id=value).exists():
             raise serializers.ValidationError("Communauté non trouvée.")
+        raise serializers.ValidationError("Vous devez être membre de cette communauté.")
+
+    def validate_recurring_days(self, value):
+        try:
+            parse_recurring_days(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+    def validate(self, attrs):
+        # Bulk imports skip the trips they already created instead
+        if 'owned_vehicle_ids' not in self.context:
+            check_unique_departure(
+                self.context['request'].user.id, attrs['vehicle_id'], attrs['departure_time']
+            )
+        return attrs
+
+
+class UserBookingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # The current user's booking as embedded in a trip, without the trip itself
+
+    class Meta:
+        model = Booking
+        fields = ('id', 'seats_booked', 'pickup_location', 'dropoff_location',
+                  'status', 'message', 'created_at', 'updated_at')
+        read_only_fields = fields
 
 
-class BookingSerializer(serializers.ModelSerializer):
-    passenger = UserSerializer(read_only=True)
-    trip = TripSerializer(read_only=True)
+class BookingSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'trip': (TripSummarySerializer, TripSerializer),
+        'passenger': (UserSummarySerializer, UserSerializer),
+    }
 
     class Meta:
         model = Booking
@@ -83,7 +181,7 @@ class BookingSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'passenger', 'created_at', 'updated_at')
 
 
-class BookingCreateSerializer(serializers.ModelSerializer):
+class BookingCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ('seats_booked', 'pickup_location', 'dropoff_location', 'message')
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .events import booking_event, publish_bookings, publish_trip_seats, publish_trips, trip_event
+from .models import Trip, Booking, invalidate_trip_listings
+
+
+@receiver([post_save, post_delete], sender=Trip)
+def trip_changed(sender, instance, **kwargs):
+    invalidate_trip_listings(instance.community_id)
+    if kwargs['signal'] is post_delete:
+        publish_trips([{'id': instance.pk, 'deleted': True}])
+    elif not kwargs['created']:
+        publish_trips([trip_event(instance)])
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    # Bookings move the trip's remaining seats
+    if Booking.trip.is_cached(instance):
+        trip = {'community_id': instance.trip.community_id, 'driver_id': instance.trip.driver_id}
+    else:
+        trip = Trip.objects.filter(pk=instance.trip_id).values('community_id', 'driver_id').first()
+    if trip is None:
+        return
+    invalidate_trip_listings(trip['community_id'])
+    if kwargs['signal'] is post_save:
+        publish_bookings([booking_event(instance, trip['driver_id'])])
+        if kwargs['created'] or instance.status == 'cancelled':
+            publish_trip_seats([instance.trip_id])
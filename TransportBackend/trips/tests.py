@@ -0,0 +1,418 @@
+import json
+import re
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from benchmarks.synthetic import Generator
+from communities.models import Community, CommunityDailyStats, Membership
+from communities.views import CommunityMembersView, member_stats
+from ratings.views import UserRatingsView
+from users.models import User, Vehicle
+from users.tokens import UserRefreshToken
+from .lifecycle import sweep_trip_statuses
+from .models import Booking, Trip
+from .views import MyTripsView, TripListCreateView, book_trip
+
+
+USER_SUMMARY_FIELDS = {'id', 'username', 'first_name', 'last_name', 'profile_picture'}
+
+
+def create_user(name, **fields):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, password='password', first_name=name, last_name='Test',
+        **fields
+    )
+
+
+class TripAPITestCase(TestCase):
+    # 24 upcoming trips in one community, seen by a passenger who booked every other one
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.passenger = create_user('passenger')
+        cls.drivers = [create_user(f'driver{index}', user_type='driver') for index in range(4)]
+        community = Community.objects.create(
+            name='Bureau', description='Trajets du bureau', community_type='work', location='Paris',
+            creator=cls.drivers[0]
+        )
+        for user in [cls.passenger, *cls.drivers]:
+            Membership.objects.create(user=user, community=community)
+        vehicles = [
+            Vehicle.objects.create(owner=driver, brand='Renault', model='Clio', year=2020, color='bleu',
+                                   license_plate=f'AA-{index:03d}-AA')
+            for index, driver in enumerate(cls.drivers)
+        ]
+        start = timezone.now() + timedelta(days=1)
+        cls.trips = []
+        for index in range(24):
+            departure = start + timedelta(hours=index)
+            cls.trips.append(Trip.objects.create(
+                driver=cls.drivers[index % 4], vehicle=vehicles[index % 4], community=community,
+                departure_location='Paris', arrival_location='Lyon', departure_time=departure,
+                estimated_arrival_time=departure + timedelta(hours=4), available_seats=4
+            ))
+        # The passenger books every other trip; other passengers fill the first one
+        for trip in cls.trips[::2]:
+            Booking.objects.create(trip=trip, passenger=cls.passenger)
+        cls.busy_trip, cls.quiet_trip = cls.trips[0], cls.trips[1]
+        for index in range(3):
+            Booking.objects.create(trip=cls.busy_trip, passenger=create_user(f'other{index}'))
+        Trip.objects.recount_booked_seats()
+
+    def setUp(self):
+        self.client = APIClient()
+        token = UserRefreshToken.for_user(self.passenger).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+
+@override_settings(LISTING_CACHE_TIMEOUT=0)
+class TripQueryCountTests(TripAPITestCase):
+    # The number of queries of the trip endpoints must not grow with the
+    # number of trips on the page or of bookings on a trip
+
+    def assert_same_queries(self, reference_path, path):
+        # path runs exactly as many queries as reference_path
+        with CaptureQueriesContext(connection) as reference:
+            reference_data = self.get(reference_path)
+        with self.assertNumQueries(len(reference)):
+            data = self.get(path)
+        return reference_data, data
+
+    def assert_page_sizes(self, path, small, large):
+        separator = '&' if '?' in path else '?'
+        small_page, large_page = self.assert_same_queries(
+            f'{path}{separator}page_size={small}', f'{path}{separator}page_size={large}'
+        )
+        self.assertEqual(len(small_page['results']), small)
+        self.assertEqual(len(large_page['results']), large)
+
+    def test_trip_list(self):
+        self.assert_page_sizes('/api/trips/', 5, 20)
+
+    def test_trip_list_of_community(self):
+        self.assert_page_sizes(f'/api/trips/?community={self.busy_trip.community_id}', 5, 20)
+
+    def test_my_trips(self):
+        self.assert_page_sizes('/api/trips/my-trips/', 3, 12)
+
+    def test_trip_detail(self):
+        # A trip booked by the user and full of other passengers costs the same
+        # as one nobody booked
+        quiet, busy = self.assert_same_queries(
+            f'/api/trips/{self.quiet_trip.pk}/', f'/api/trips/{self.busy_trip.pk}/'
+        )
+        self.assertIsNone(quiet['user_booking'])
+        self.assertIsNotNone(busy['user_booking'])
+        self.assertEqual(busy['remaining_seats'], 0)
+
+
+
+@override_settings(LISTING_CACHE_TIMEOUT=60)
+class TripListingCacheTests(TripAPITestCase):
+
+    def remaining_seats(self):
+        results = self.get(f'/api/trips/?community={self.quiet_trip.community_id}')['results']
+        return {trip['id']: trip['remaining_seats'] for trip in results}[self.quiet_trip.pk]
+
+    def test_not_cached_without_a_shared_cache(self):
+        # A booking made by another worker bumps the listing versions in that
+        # worker's local memory only: this one must not serve its own copy
+        self.assertEqual(self.remaining_seats(), 4)
+        Trip.objects.filter(pk=self.quiet_trip.pk).update(booked_seats=3)
+        self.assertEqual(self.remaining_seats(), 1)
+
+class BookingShapeTests(TripAPITestCase):
+    # Bookings embed compact trip and user summaries unless ?expand= asks for more
+
+    def setUp(self):
+        super().setUp()
+        token = UserRefreshToken.for_user(self.busy_trip.driver).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_compact_by_default(self):
+        path = f'/api/trips/{self.busy_trip.pk}/bookings/'
+        response = self.client.get(path)
+        bookings = response.json()['results']
+        self.assertEqual(len(bookings), 4)
+        for booking in bookings:
+            self.assertEqual(set(booking['trip']), {
+                'id', 'driver', 'vehicle', 'departure_location', 'arrival_location', 'departure_time',
+                'estimated_arrival_time', 'available_seats', 'remaining_seats', 'price_per_seat', 'status',
+            })
+            self.assertEqual(set(booking['trip']['driver']), USER_SUMMARY_FIELDS)
+            self.assertEqual(set(booking['trip']['vehicle']), {'id', 'brand', 'model', 'color'})
+            self.assertEqual(set(booking['passenger']), USER_SUMMARY_FIELDS)
+
+        expanded = self.client.get(f'{path}?expand=trip')
+        trip = expanded.json()['results'][0]['trip']
+        self.assertIn('community', trip)
+        self.assertIn('email', trip['driver'])
+        self.assertLess(len(response.content), len(expanded.content))
+
+
+class BookingConcurrencyTests(TransactionTestCase):
+    # Many passengers booking the last seats at the same time, each on its own
+    # thread and database connection. SQLite refuses concurrent writers
+    # ("database table is locked"), so there the locked requests are retried
+    # until they get an answer.
+    passenger_count = 20
+    seats = 8
+
+    def setUp(self):
+        self.driver = create_user('driver', user_type='driver')
+        self.passengers = [create_user(f'passenger{index}') for index in range(self.passenger_count)]
+        community = Community.objects.create(
+            name='Bureau', description='Trajets du bureau', community_type='work', location='Paris',
+            creator=self.driver
+        )
+        vehicle = Vehicle.objects.create(owner=self.driver, brand='Renault', model='Clio', year=2020,
+                                         color='bleu', license_plate='AA-001-AA', seats=self.seats)
+        departure = timezone.now() + timedelta(days=1)
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle=vehicle, community=community,
+            departure_location='Paris', arrival_location='Lyon', departure_time=departure,
+            estimated_arrival_time=departure + timedelta(hours=4), available_seats=self.seats
+        )
+
+    def book_concurrently(self, seats_per_booking):
+        factory = APIRequestFactory()
+        barrier = threading.Barrier(len(self.passengers))
+        results = []
+        lock = threading.Lock()
+
+        def book(passenger):
+            barrier.wait()
+            while True:
+                request = factory.post(
+                    f'/api/trips/{self.trip.pk}/book/', {'seats_booked': seats_per_booking}, format='json'
+                )
+                force_authenticate(request, user=passenger)
+                try:
+                    outcome = book_trip(request, pk=self.trip.pk).status_code
+                except OperationalError as exc:
+                    if connection.vendor == 'sqlite' and 'locked' in str(exc):
+                        continue
+                    outcome = exc
+                except Exception as exc:
+                    outcome = exc
+                break
+            connection.close()
+            with lock:
+                results.append(outcome)
+
+        threads = [threading.Thread(target=book, args=(passenger,)) for passenger in self.passengers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def assert_not_overbooked(self, results, seats_per_booking):
+        self.trip.refresh_from_db()
+        held = Booking.objects.filter(
+            trip=self.trip, status__in=Booking.SEAT_HOLDING_STATUSES
+        ).aggregate(total=Sum('seats_booked'))['total'] or 0
+        self.assertLessEqual(held, self.trip.available_seats)
+        self.assertEqual(held, self.trip.booked_seats)
+        # The trip fills up and every other request is turned away cleanly
+        self.assertEqual(held, self.seats - self.seats % seats_per_booking)
+        if connection.vendor == 'sqlite':
+            # A retry after a booking committed gets "already booked"
+            self.assertLessEqual(set(results), {201, 400, 409})
+        else:
+            self.assertEqual(results.count(201) * seats_per_booking, held)
+            self.assertEqual(set(results), {201, 409})
+
+    def test_single_seat_bookings(self):
+        results = self.book_concurrently(1)
+        self.assert_not_overbooked(results, 1)
+
+    def test_multi_seat_bookings(self):
+        # 3 seats at a time cannot fill 8 seats exactly: the last 2 stay free
+        results = self.book_concurrently(3)
+        self.assert_not_overbooked(results, 3)
+
+
+class TripLifecycleTests(TripAPITestCase):
+
+    def test_completing_a_trip_expires_its_pending_bookings(self):
+        confirmed, pending = create_user('confirmed'), create_user('pending')
+        Booking.objects.create(trip=self.quiet_trip, passenger=confirmed, status='confirmed')
+        Booking.objects.create(trip=self.quiet_trip, passenger=pending, seats_booked=2)
+        Trip.objects.filter(pk=self.quiet_trip.pk).recount_booked_seats()
+
+        arrived = self.quiet_trip.estimated_arrival_time + timedelta(minutes=1)
+        Trip.objects.filter(pk=self.quiet_trip.pk).update(status='active')
+        sweep_trip_statuses(now=arrived)
+
+        statuses = dict(self.quiet_trip.bookings.values_list('passenger_id', 'status'))
+        self.assertEqual(statuses, {confirmed.pk: 'completed', pending.pk: 'cancelled'})
+        self.quiet_trip.refresh_from_db()
+        self.assertEqual(self.quiet_trip.status, 'completed')
+        self.assertEqual(self.quiet_trip.booked_seats, 1)
+
+
+@skipUnless(connection.vendor in ('mysql', 'postgresql', 'sqlite'), "EXPLAIN output not parsed for this engine")
+class QueryPlanTests(TestCase):
+    # EXPLAIN the querysets behind the hot list endpoints: none of them may fall
+    # back to a full table scan. On near-empty tables the planner legitimately
+    # prefers scans, hence a small synthetic data set.
+
+    @classmethod
+    def setUpTestData(cls):
+        Generator(users=200, communities=10, trips=1000, log=lambda message: None).run()
+        # The busiest passenger, community, driver and rated user, so no filter matches nothing
+        cls.user = User.objects.annotate(count=Count('bookings')).order_by('-count', 'pk').first()
+        cls.community = Community.objects.order_by('-member_count', 'pk').first()
+        cls.driver = User.objects.annotate(count=Count('driven_trips')).order_by('-count', 'pk').first()
+        cls.rated_user = User.objects.annotate(count=Count('received_ratings')).order_by('-count', 'pk').first()
+
+    def cases(self):
+        user, community = self.user, self.community
+        page = slice(0, 20)
+        now = timezone.now()
+
+        yield 'trip-list', self.view_queryset(TripListCreateView, '/api/trips/')[page]
+        yield 'trip-list community', self.view_queryset(
+            TripListCreateView, f'/api/trips/?community={community.pk}')[page]
+        yield 'trip-list available_only', self.view_queryset(
+            TripListCreateView, '/api/trips/?available_only=true')[page]
+        for trip_type in ('driver', 'passenger', 'all'):
+            yield f'my-trips type={trip_type}', self.view_queryset(
+                MyTripsView, f'/api/trips/my-trips/?type={trip_type}')[page]
+        yield 'community-members', self.view_queryset(
+            CommunityMembersView, f'/api/communities/{community.pk}/members/', pk=community.pk)[page]
+        for rating_type in ('all', 'driver'):
+            yield f'user-ratings type={rating_type}', self.view_queryset(
+                UserRatingsView, f'/api/ratings/user/{user.pk}/?type={rating_type}', user_id=user.pk)[page]
+
+        # Batch selection of the lifecycle sweeper
+        yield 'sweeper departed trips', Trip.objects.filter(
+            status='planned', departure_time__lte=now).order_by('departure_time', 'id').values('id')[:1000]
+        yield 'sweeper arrived trips', Trip.objects.filter(
+            status='active', estimated_arrival_time__lte=now).order_by('estimated_arrival_time', 'id').values('id')[:1000]
+
+        # community_stats
+        yield 'community-stats members', member_stats(community.pk, user)
+        yield 'community-stats rollup', CommunityDailyStats.objects.filter(
+            community_id=community.pk, date__gte=(now - timedelta(days=30)).date())
+
+    def view_queryset(self, view_class, path, **kwargs):
+        return self.view(view_class, path, self.user, **kwargs).get_queryset()
+
+    def page_queryset(self, view_class, path, user, **kwargs):
+        # Queryset of one page of a keyset paginated view, as its paginator runs it
+        view = self.view(view_class, path, user, **kwargs)
+        return view.paginator, view.paginator.page_queryset(view.get_queryset(), view.request)
+
+    def view(self, view_class, path, user, **kwargs):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        view = view_class()
+        view.setup(request, **kwargs)
+        view.request = view.initialize_request(request, **kwargs)
+        view.format_kwarg = None
+        return view
+
+    def test_no_full_table_scan(self):
+        for label, queryset in self.cases():
+            with self.subTest(label):
+                plan = self.explain(queryset)
+                self.assertEqual(full_scans(plan), set(), f"{label}\n{plan}")
+
+    def test_deep_cursor_runs_like_the_first_page(self):
+        # A cursor on the last pages of a feed runs the first page's query plus
+        # the keyset range: no OFFSET, same index, so page 5000 costs what page 1 does
+        feeds = [
+            ('trip-list', TripListCreateView, '/api/trips/?page_size=3', self.user, {}),
+            ('my-trips', MyTripsView, '/api/trips/my-trips/?type=all&page_size=3', self.driver, {}),
+            ('user-ratings', UserRatingsView, f'/api/ratings/user/{self.rated_user.pk}/?page_size=3', self.user,
+             {'user_id': self.rated_user.pk}),
+        ]
+        for label, view_class, path, user, kwargs in feeds:
+            with self.subTest(label):
+                paginator, first_page = self.page_queryset(view_class, path, user, **kwargs)
+                ordered = self.view(view_class, path, user, **kwargs).get_queryset().order_by(
+                    *paginator.order_by(paginator.descending))
+                total = ordered.count()
+                self.assertGreater(total, 4 * paginator.page_size, "not enough rows for a deep page")
+                deep_row = ordered[total - paginator.page_size - 1]
+                deep_link = paginator.build_link(paginator.position(deep_row), backwards=False)
+                deep_paginator, deep_page = self.page_queryset(
+                    view_class, deep_link.split('testserver', 1)[-1], user, **kwargs)
+
+                self.assertEqual(deep_paginator.current_position[1], deep_row.pk)
+                self.assertEqual(len(list(deep_page)), paginator.page_size)
+                self.assertEqual(sql_shape(deep_page), sql_shape(first_page))
+                first_plan, deep_plan = self.explain(first_page), self.explain(deep_page)
+                self.assertEqual(full_scans(deep_plan), set(), deep_plan)
+                self.assertEqual(plan_indexes(deep_plan), plan_indexes(first_plan), f"{first_plan}\n{deep_plan}")
+
+    def explain(self, queryset):
+        if connection.vendor == 'mysql':
+            return queryset.explain(format='json')
+        return queryset.explain()
+
+
+def sql_shape(queryset):
+    # Tables, columns, ORDER BY and LIMIT of a query, without its WHERE clause
+    sql = str(queryset.query)
+    head, tail = sql.rsplit(' ORDER BY ', 1)
+    return head.split(' WHERE ')[0], tail
+
+
+def full_scans(plan):
+    if connection.vendor == 'mysql':
+        return set(_mysql_full_scans(json.loads(plan)))
+    if connection.vendor == 'postgresql':
+        return {line.split(' on ')[1].split()[0] for line in plan.splitlines() if 'Seq Scan on' in line}
+    tables = set()
+    for line in plan.splitlines():
+        detail = line.split(' ', 3)[-1]
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT ROW' not in detail:
+            tables.add(detail.split()[1])
+    return tables
+
+
+def plan_indexes(plan):
+    if connection.vendor == 'mysql':
+        return set(_mysql_keys(json.loads(plan)))
+    if connection.vendor == 'postgresql':
+        return set(re.findall(r'Index (?:Only )?Scan (?:Backward )?using (\S+)', plan)
+                   + re.findall(r'Bitmap Index Scan on (\S+)', plan))
+    return set(re.findall(r'USING (?:COVERING )?INDEX (\S+)', plan))
+
+
+def _mysql_keys(node):
+    if isinstance(node, dict):
+        if node.get('key'):
+            yield node['key']
+        for value in node.values():
+            yield from _mysql_keys(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _mysql_keys(value)
+
+
+def _mysql_full_scans(node):
+    if isinstance(node, dict):
+        if node.get('access_type') == 'ALL':
+            yield node.get('table_name', '?')
+        for value in node.values():
+            yield from _mysql_full_scans(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _mysql_full_scans(value)
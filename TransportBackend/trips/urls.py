@@ -1,12 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+if settings.ASYNC_READ_VIEWS:
+    trip_search = async_views.search_trips
+    my_trips = async_views.list_my_trips
+else:
+    trip_search = views.TripSearchView.as_view()
+    my_trips = views.MyTripsView.as_view()
 
 urlpatterns = [
     path('', views.TripListCreateView.as_view(), name='trip-list'),
+    path('search/', trip_search, name='trip-search'),
+    path('bulk/', views.TripBulkCreateView.as_view(), name='trip-bulk-create'),
     path('<int:pk>/', views.TripDetailView.as_view(), name='trip-detail'),
     path('<int:pk>/book/', views.book_trip, name='book-trip'),
     path('bookings/<int:pk>/confirm/', views.confirm_booking, name='confirm-booking'),
     path('bookings/<int:pk>/cancel/', views.cancel_booking, name='cancel-booking'),
-    path('my-trips/', views.MyTripsView.as_view(), name='my-trips'),
+    path('my-trips/', my_trips, name='my-trips'),
+    path('events/', async_views.trip_events, name='trip-events'),
     path('<int:pk>/bookings/', views.TripBookingsView.as_view(), name='trip-bookings'),
 ]
@@ -1,22 +1,62 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.utils import timezone
-from .models import Trip, Booking
+from .models import Trip, Booking, with_trip, trip_listing_scopes, invalidate_trip_listings
+from .search import search_candidates, rank_candidates, with_distances
 from .serializers import (
+    DUPLICATE_DEPARTURE_ERROR,
     TripSerializer,
+    TripSearchSerializer,
+    TripSearchResultSerializer,
     TripCreateSerializer,
     BookingSerializer,
-    BookingCreateSerializer
+    BookingCreateSerializer,
+    UserBookingSerializer
 )
 from users.models import Vehicle
 from communities.models import Community
+from communities.memberships import add_membership, membership_roles, strip_membership
+from transport_app.listing_cache import CachedListMixin
+from transport_app.serializers import expanded_fields
+from transport_app.pagination import (
+    DepartureKeysetPagination,
+    RecentDepartureKeysetPagination,
+    CreatedKeysetPagination
+)
 
 
-class TripListCreateView(generics.ListCreateAPIView):
+class TripListCreateView(CachedListMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DepartureKeysetPagination
+    cache_namespace = 'trips'
+    cache_params = ('community', 'departure', 'arrival', 'date', 'available_only',
+                    'cursor', 'page_size', 'count')
+
+    def get_cache_scopes(self, params):
+        return trip_listing_scopes(params.get('community'))
+
+    def strip_user_fields(self, results):
+        for trip in results:
+            trip['is_driver'] = False
+            trip['user_booking'] = None
+            strip_membership(trip['community'])
+
+    def add_user_fields(self, results):
+        user = self.request.user
+        roles = membership_roles(self.request)
+        bookings = {}
+        for booking in Booking.objects.filter(passenger=user, trip_id__in=[trip['id'] for trip in results]):
+            bookings.setdefault(booking.trip_id, booking)
+        for trip in results:
+            booking = bookings.get(trip['id'])
+            trip['is_driver'] = trip['driver']['id'] == user.id
+            trip['user_booking'] = UserBookingSerializer(booking).data if booking else None
+            add_membership(trip['community'], roles)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -24,7 +64,7 @@ class TripListCreateView(generics.ListCreateAPIView):
         return TripSerializer
 
     def get_queryset(self):
-        queryset = Trip.objects.select_related('driver', 'vehicle', 'community').all()
+        queryset = Trip.objects.with_listing_data(self.request.user)
 
         # Filters
         community_id = self.request.query_params.get('community', None)
@@ -46,13 +86,7 @@ class TripListCreateView(generics.ListCreateAPIView):
             queryset = queryset.filter(departure_time__date=date)
 
         if available_only.lower() == 'true':
-            queryset = queryset.filter(status='planned')
-            # Filter trips with available seats
-            available_trips = []
-            for trip in queryset:
-                if trip.remaining_seats > 0:
-                    available_trips.append(trip.id)
-            queryset = queryset.filter(id__in=available_trips)
+            queryset = queryset.available()
 
         return queryset.order_by('departure_time')
 
@@ -65,18 +99,105 @@ class TripListCreateView(generics.ListCreateAPIView):
             id=serializer.validated_data['community_id']
         )
 
-        serializer.save(
-            driver=self.request.user,
-            vehicle=vehicle,
-            community=community
+        try:
+            with transaction.atomic():
+                serializer.save(
+                    driver=self.request.user,
+                    vehicle=vehicle,
+                    community=community
+                )
+        except IntegrityError:
+            # The same trip posted twice at the same time
+            raise ValidationError({'departure_time': DUPLICATE_DEPARTURE_ERROR})
+
+
+class TripBulkCreateView(generics.GenericAPIView):
+    serializer_class = TripCreateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_trips = 1000
+
+    def get_serializer_context(self):
+        # Vehicle checks for the whole batch come from one query; memberships use the request's map
+        context = super().get_serializer_context()
+        context['owned_vehicle_ids'] = set(
+            Vehicle.objects.filter(owner=self.request.user).values_list('id', flat=True)
+        )
+        return context
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {'error': 'Une liste de trajets est attendue'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.max_trips:
+            return Response(
+                {'error': f'Au maximum {self.max_trips} trajets par requête'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        trips = {}
+        for row in serializer.validated_data:
+            trip = Trip(driver=request.user, **row)
+            trips.setdefault((trip.vehicle_id, trip.departure_time), trip)
+
+        # Trips already imported are skipped, which makes retrying a batch safe
+        existing = set(Trip.objects.filter(
+            driver=request.user,
+            departure_time__in={departure for _, departure in trips}
+        ).values_list('vehicle_id', 'departure_time'))
+        new_trips = [trip for key, trip in trips.items() if key not in existing]
+        Trip.objects.bulk_create(new_trips, batch_size=500, ignore_conflicts=True)
+        # bulk_create sends no post_save
+        invalidate_trip_listings(*{trip.community_id for trip in new_trips})
+
+        return Response(
+            {'created': len(new_trips), 'skipped': len(request.data) - len(new_trips)},
+            status=status.HTTP_201_CREATED
         )
 
 
+class TripSearchView(generics.ListAPIView):
+    serializer_class = TripSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        params = TripSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        ranked = rank_candidates(search_candidates(params.validated_data).iterator(), params.validated_data)
+        page = self.paginate_queryset(ranked)
+        serializer = self.get_serializer(self.load_trips(page if page is not None else ranked), many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def load_trips(self, ranked):
+        # Only the trips on the requested page are fully loaded and serialized
+        trips = Trip.objects.with_listing_data(self.request.user).in_bulk(
+            [trip_id for _, trip_id, _, _ in ranked]
+        )
+        return with_distances(trips, ranked)
+
+
 class TripDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Trip.objects.all()
     serializer_class = TripSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return Trip.objects.with_listing_data(self.request.user)
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'departure_time': DUPLICATE_DEPARTURE_ERROR})
+
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             # Only trip driver can modify/delete
@@ -91,7 +212,7 @@ def book_trip(request, pk):
     user = request.user
 
     # Check if user is the driver
-    if trip.driver == user:
+    if trip.driver_id == user.id:
         return Response(
             {'error': 'Vous ne pouvez pas réserver votre propre trajet'},
             status=status.HTTP_400_BAD_REQUEST
@@ -116,36 +237,60 @@ def book_trip(request, pk):
         context={'trip': trip}
     )
 
-    if serializer.is_valid():
-        booking = serializer.save(trip=trip, passenger=user)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    seats = serializer.validated_data.get('seats_booked', 1)
+    try:
+        with transaction.atomic():
+            # The conditional UPDATE locks the trip row, so concurrent bookings
+            # for the same trip are serialized and can never exceed its capacity
+            if not Trip.objects.filter(pk=trip.pk).reserve_seats(seats):
+                trip.refresh_from_db(fields=['booked_seats', 'status'])
+                return Response(
+                    {
+                        'error': 'Il ne reste plus assez de places sur ce trajet',
+                        'remaining_seats': max(trip.remaining_seats, 0),
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+            booking = serializer.save(trip=trip, passenger=user)
+    except IntegrityError:
+        # A concurrent request from the same passenger won the unique (trip, passenger) race
         return Response(
-            BookingSerializer(booking).data,
-            status=status.HTTP_201_CREATED
+            {'error': 'Vous avez déjà réservé ce trajet'},
+            status=status.HTTP_409_CONFLICT
         )
 
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    trip.refresh_from_db(fields=['booked_seats'])
+    return Response(
+        BookingSerializer(booking).data,
+        status=status.HTTP_201_CREATED
+    )
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def confirm_booking(request, pk):
-    booking = get_object_or_404(Booking, pk=pk)
-
-    # Check if user is the trip driver
-    if booking.trip.driver != request.user:
-        return Response(
-            {'error': 'Seul le conducteur peut confirmer les réservations'},
-            status=status.HTTP_403_FORBIDDEN
-        )
-
-    if booking.status != 'pending':
-        return Response(
-            {'error': 'Cette réservation ne peut pas être confirmée'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
-    booking.status = 'confirmed'
-    booking.save()
+    with transaction.atomic():
+        booking = get_object_or_404(Booking.objects.select_for_update(), pk=pk)
+
+        # Check if user is the trip driver
+        if booking.trip.driver_id != request.user.id:
+            return Response(
+                {'error': 'Seul le conducteur peut confirmer les réservations'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if booking.status != 'pending':
+            return Response(
+                {'error': 'Cette réservation ne peut pas être confirmée'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Seats were already held when the booking was made, booked_seats is unchanged
+        booking.status = 'confirmed'
+        booking.save()
 
     return Response(BookingSerializer(booking).data)
 
@@ -153,23 +298,28 @@ def confirm_booking(request, pk):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def cancel_booking(request, pk):
-    booking = get_object_or_404(Booking, pk=pk)
+    with transaction.atomic():
+        # Lock the booking so two concurrent cancellations release its seats only once
+        booking = get_object_or_404(Booking.objects.select_for_update(), pk=pk)
 
-    # Check if user is the passenger or driver
-    if booking.passenger != request.user and booking.trip.driver != request.user:
-        return Response(
-            {'error': 'Non autorisé'},
-            status=status.HTTP_403_FORBIDDEN
-        )
+        # Check if user is the passenger or driver
+        if booking.passenger_id != request.user.id and booking.trip.driver_id != request.user.id:
+            return Response(
+                {'error': 'Non autorisé'},
+                status=status.HTTP_403_FORBIDDEN
+            )
 
-    if booking.status in ['cancelled', 'completed']:
-        return Response(
-            {'error': 'Cette réservation ne peut pas être annulée'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        if booking.status in ['cancelled', 'completed']:
+            return Response(
+                {'error': 'Cette réservation ne peut pas être annulée'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        booking.status = 'cancelled'
+        booking.save()
+        Trip.objects.filter(pk=booking.trip_id).release_seats(booking.seats_booked)
 
-    booking.status = 'cancelled'
-    booking.save()
+    booking.trip.refresh_from_db(fields=['booked_seats'])
 
     return Response(BookingSerializer(booking).data)
 
@@ -177,33 +327,45 @@ def cancel_booking(request, pk):
 class MyTripsView(generics.ListAPIView):
     serializer_class = TripSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RecentDepartureKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
         trip_type = self.request.query_params.get('type', 'all')
+        booked_trips = []
+        if trip_type != 'driver':
+            # A passenger has few bookings: materializing their trip ids keeps both
+            # branches of the OR below on an index instead of a dependent subquery
+            booked_trips = list(booked_trip_ids(user))
+        return my_trips(user, trip_type, booked_trips)
+
+
+def booked_trip_ids(user):
+    return Booking.objects.filter(
+        passenger=user,
+        status__in=['confirmed', 'pending']
+    ).values_list('trip_id', flat=True)
+
+
+def my_trips(user, trip_type, booked_trips):
+    trips = Trip.objects.with_listing_data(user)
+
+    if trip_type == 'driver':
+        return trips.filter(driver=user).order_by('-departure_time')
 
-        if trip_type == 'driver':
-            return Trip.objects.filter(driver=user).order_by('-departure_time')
-        elif trip_type == 'passenger':
-            booked_trips = Booking.objects.filter(
-                passenger=user,
-                status__in=['confirmed', 'pending']
-            ).values_list('trip_id', flat=True)
-            return Trip.objects.filter(id__in=booked_trips).order_by('-departure_time')
-        else:
-            # All trips (as driver or passenger)
-            booked_trips = Booking.objects.filter(
-                passenger=user,
-                status__in=['confirmed', 'pending']
-            ).values_list('trip_id', flat=True)
-            return Trip.objects.filter(
-                Q(driver=user) | Q(id__in=booked_trips)
-            ).order_by('-departure_time')
+    if trip_type == 'passenger':
+        return trips.filter(id__in=booked_trips).order_by('-departure_time')
+    else:
+        # All trips (as driver or passenger)
+        return trips.filter(
+            Q(driver=user) | Q(id__in=booked_trips)
+        ).order_by('-departure_time')
 
 
 class TripBookingsView(generics.ListAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedKeysetPagination
 
     def get_queryset(self):
         trip_id = self.kwargs['pk']
@@ -213,4 +375,7 @@ class TripBookingsView(generics.ListAPIView):
         if trip.driver != self.request.user:
             return Booking.objects.none()
 
-        return Booking.objects.filter(trip=trip).order_by('-created_at')
+        bookings = Booking.objects.filter(trip=trip).select_related('passenger')
+        return with_trip(
+            bookings, self.request.user, full='trip' in expanded_fields(self.request)
+        ).order_by('-created_at')
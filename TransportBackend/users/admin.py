@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from transport_app.admin_tools import LargeTableAdmin
 from .models import User, Vehicle
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(LargeTableAdmin, BaseUserAdmin):
     list_display = ('email', 'username', 'first_name', 'last_name', 'user_type', 'is_verified', 'date_joined')
     list_filter = ('user_type', 'is_verified', 'is_staff', 'is_active')
     search_fields = ('email', 'username', 'first_name', 'last_name')
@@ -18,8 +19,11 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(Vehicle)
-class VehicleAdmin(admin.ModelAdmin):
+class VehicleAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('license_plate', 'brand', 'model', 'owner', 'seats', 'is_active')
-    list_filter = ('brand', 'is_active')
+    # Brands are searched: a brand filter runs SELECT DISTINCT over the whole table
+    list_filter = ('is_active',)
+    list_select_related = ('owner',)
     search_fields = ('license_plate', 'brand', 'model', 'owner__email')
     ordering = ('-created_at',)
+    autocomplete_fields = ('owner',)
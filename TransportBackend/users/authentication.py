@@ -0,0 +1,33 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .principals import TOKEN_VERSION_CLAIM, from_claims, is_revoked
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    # Builds request.user from the signed claims without a query. Fields
+    # outside the claims (email, names...) are loaded on first access.
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            # Issued before token versions existed: checked against the database
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Le jeton ne contient pas d'identifiant utilisateur")
+        if not validated_token.get('is_active') or is_revoked(user_id, validated_token[TOKEN_VERSION_CLAIM]):
+            raise AuthenticationFailed('Session expirée, veuillez vous reconnecter.', code='token_revoked')
+        return from_claims(validated_token)
+
+
+class QueryTokenAuthentication(ClaimsJWTAuthentication):
+    # For EventSource, which cannot send an Authorization header: the access
+    # token comes in the `token` query parameter
+    def authenticate(self, request):
+        raw_token = request.query_params.get('token')
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token.encode())
+        return self.get_user(validated_token), validated_token
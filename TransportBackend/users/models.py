@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+
+from .principals import revoke_tokens, users
 
 
 class User(AbstractUser):
@@ -16,6 +18,9 @@ class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
     is_verified = models.BooleanField(default=False)
+    # Signed into tokens and bumped when the password or the active status
+    # changes, which revokes every token issued before
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -25,6 +30,44 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_is_active = user.__dict__.get('is_active')
+        return user
+
+    def save(self, *args, **kwargs):
+        if self.credentials_changed():
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'token_version' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'token_version']
+            user_id, version = self.pk, self.token_version
+            transaction.on_commit(lambda: revoke_tokens(user_id, version))
+        super().save(*args, **kwargs)
+        self._loaded_is_active = self.is_active
+        # Any saved field may be cached by the claims authentication
+        user_id = self.pk
+        transaction.on_commit(lambda: users.discard(user_id))
+
+    def credentials_changed(self):
+        if self._state.adding:
+            return False
+        # set_password() keeps the raw password until the next save
+        if self._password is not None:
+            return True
+        loaded = getattr(self, '_loaded_is_active', None)
+        return loaded is not None and loaded != self.is_active
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Users authenticated from token claims (users.principals) only carry
+        # the claimed fields: reading any other one loads them all at once
+        loader = self.__dict__.pop('_deferred_loader', None)
+        if loader is not None and fields is not None:
+            loader(self)
+            return
+        super().refresh_from_db(using=using, fields=fields)
+
 
 class Vehicle(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vehicles')
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from transport_app import shared_cache
+
+# Claims signed into tokens by users.tokens.UserRefreshToken. A user built from
+# them needs no query; the other fields are loaded on first access.
+TOKEN_VERSION_CLAIM = 'tv'
+CLAIMED_FIELDS = ('is_active', 'user_type')
+
+
+class ProcessCache:
+    # Small per-process LRU, each entry kept for the number of seconds in the
+    # given setting
+    def __init__(self, timeout_setting):
+        self.timeout_setting = timeout_setting
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + getattr(settings, self.timeout_setting), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Fully loaded users, by id
+users = ProcessCache('AUTH_USER_CACHE_TIMEOUT')
+# (token_version, is_active) read from the database, by user id, when the
+# cache is not shared
+token_states = ProcessCache('AUTH_TOKEN_CHECK_SECONDS')
+
+
+def _version_key(user_id):
+    return f'auth:token_version:{user_id}'
+
+
+def revoke_tokens(user_id, version):
+    # Tokens signed with an older version are refused. The shared cache only
+    # has to remember it while such access tokens can still be valid.
+    users.discard(user_id)
+    token_states.discard(user_id)
+    cache.set(_version_key(user_id), version,
+              timeout=int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+
+
+def token_state(user_id):
+    return (
+        get_user_model()._base_manager.using('default').filter(pk=user_id)
+        .values_list('token_version', 'is_active')[:1]
+    )
+
+
+def is_revoked(user_id, version):
+    if not shared_cache.is_shared():
+        # No shared cache (REDIS_URL): the primary database is the only record
+        # every process sees, read at most every AUTH_TOKEN_CHECK_SECONDS per user
+        row = token_states.get(user_id)
+        if row is None:
+            row = next(iter(token_state(user_id)), ())
+            token_states.set(user_id, row)
+        return not row or row[0] != version or not row[1]
+    current = cache.get(_version_key(user_id))
+    if current is not None:
+        return current != version
+    # Nothing revoked recently; a user loaded by this process may still know better
+    user = users.get(user_id)
+    return user is not None and (user.token_version != version or not user.is_active)
+
+
+def from_claims(token):
+    User = get_user_model()
+    values = {
+        'id': token[api_settings.USER_ID_CLAIM],
+        'token_version': token[TOKEN_VERSION_CLAIM],
+        **{field: token[field] for field in CLAIMED_FIELDS},
+    }
+    # from_db() takes the values in field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    user = User.from_db(router.db_for_read(User), names, [values[name] for name in names])
+    user._deferred_loader = load_fields
+    return user
+
+
+def load_fields(user):
+    # Complete a user built from claims, from the process cache when possible
+    User = type(user)
+    loaded = users.get(user.pk)
+    if loaded is None or loaded.token_version != user.token_version:
+        loaded = User._base_manager.using(user._state.db).filter(pk=user.pk).first()
+        if loaded is not None:
+            users.set(loaded.pk, loaded)
+    if loaded is None or loaded.token_version != user.token_version or not loaded.is_active:
+        raise AuthenticationFailed('Session expirée, veuillez vous reconnecter.', code='token_revoked')
+    for field in User._meta.concrete_fields:
+        user.__dict__.setdefault(field.attname, loaded.__dict__[field.attname])
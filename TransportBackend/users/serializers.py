@@ -1,9 +1,15 @@
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from transport_app.serializers import TimedSerializerMixin
 from .models import User, Vehicle
+from .principals import TOKEN_VERSION_CLAIM
+from .tokens import token_pair
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
 
@@ -26,7 +32,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
@@ -35,7 +41,14 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'is_verified', 'created_at')
 
 
-class VehicleSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name', 'profile_picture')
+        read_only_fields = fields
+
+
+class VehicleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Vehicle
         fields = ('id', 'brand', 'model', 'year', 'color', 'license_plate',
@@ -43,6 +56,13 @@ class VehicleSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at')
 
 
+class VehicleSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Vehicle
+        fields = ('id', 'brand', 'model', 'color')
+        read_only_fields = fields
+
+
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField()
@@ -61,3 +81,20 @@ class LoginSerializer(serializers.Serializer):
             return attrs
         else:
             raise serializers.ValidationError('Email et mot de passe requis.')
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    # Re-issues tokens from the current user row, so a refresh token signed
+    # before a password or status change is refused and claims stay fresh
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.get(jwt_settings.USER_ID_CLAIM), is_active=True).first()
+        if user is None or refresh.get(TOKEN_VERSION_CLAIM, user.token_version) != user.token_version:
+            raise AuthenticationFailed('Session expirée, veuillez vous reconnecter.', code='token_revoked')
+        tokens = token_pair(user)
+        if not jwt_settings.ROTATE_REFRESH_TOKENS:
+            del tokens['refresh']
+        return tokens
@@ -0,0 +1,52 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import User
+from .principals import token_states, users
+from .tokens import UserRefreshToken
+
+
+class TokenRevocationTests(TestCase):
+    # Without a shared cache (the local memory cache of the tests) revocations
+    # are read from the database, at most every AUTH_TOKEN_CHECK_SECONDS
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password', first_name='User', last_name='Test'
+        )
+
+    def setUp(self):
+        users.clear()
+        token_states.clear()
+        self.client = APIClient()
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def token_checks(self, expected_status):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/auth/vehicles/')
+        self.assertEqual(response.status_code, expected_status, response.content)
+        return sum('token_version' in query['sql'] for query in queries)
+
+    def test_token_version_read_once_per_interval(self):
+        self.assertEqual(self.token_checks(200), 1)
+        self.assertEqual(self.token_checks(200), 0)
+
+    def test_revoked_in_another_process(self):
+        self.token_checks(200)
+        # Another process changed the password: nothing reaches this one
+        User.objects.filter(pk=self.user.pk).update(token_version=1)
+        self.assertEqual(self.token_checks(200), 0)
+        # Once the interval has passed
+        token_states.clear()
+        self.assertEqual(self.token_checks(401), 1)
+
+    def test_revoked_in_this_process(self):
+        self.token_checks(200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('changed')
+            self.user.save()
+        self.assertEqual(self.token_checks(401), 1)
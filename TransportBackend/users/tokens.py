@@ -0,0 +1,20 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .principals import CLAIMED_FIELDS, TOKEN_VERSION_CLAIM
+
+
+class UserRefreshToken(RefreshToken):
+    # Carries the claims users.authentication trusts instead of loading the
+    # user; the access token derived from it copies them
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        for field in CLAIMED_FIELDS:
+            token[field] = getattr(user, field)
+        return token
+
+
+def token_pair(user):
+    refresh = UserRefreshToken.for_user(user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
@@ -8,6 +8,9 @@ export const api = axios.create({
     headers: {
         "Content-Type": "application/json",
     },
+    // Sends the API's cookies cross-origin, among them the replica pin that
+    // keeps reads on the primary right after a write
+    withCredentials: true,
 })
 
 // Request interceptor to add auth token